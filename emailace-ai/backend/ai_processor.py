@@ -1,35 +1,81 @@
-import re
-import json
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-from typing import Dict, List, Tuple
-from knowledge_base import knowledge_base
+import os
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from knowledge_base import get_knowledge_base
+from model_registry import model_registry
+from result_cache import AnalysisCache
+from keyword_matcher import KeywordMatcher, KeywordHits, merge_hits
+from entity_extractor import EntityExtractor
+from inference_backends import PYTORCH, get_backend, load_pipeline
+from text_preprocessing import clean_email_body, token_budget, fit_to_token_budget, chunk_by_tokens
+
+# Correct public model id for SST-2 finetuned DistilBERT
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+SUMMARIZATION_MODEL = "t5-small"
+
+# Bump when keyword lists or analysis logic change so cached results are invalidated
+ANALYSIS_VERSION = "5"
+
+def load_sentiment_pipeline(backend: str = PYTORCH):
+    """Load the DistilBERT sentiment pipeline; returns (pipeline, backend it runs on)"""
+    return load_pipeline(
+        "sentiment-analysis",
+        SENTIMENT_MODEL,
+        backend,
+        return_all_scores=True
+    )
+
+def load_summarization_pipeline(backend: str = PYTORCH):
+    """Load the T5-small summarization pipeline; returns (pipeline, backend it runs on)"""
+    return load_pipeline(
+        "summarization",
+        SUMMARIZATION_MODEL,
+        backend,
+        max_length=100,
+        min_length=30
+    )
+
+# Knowledge base categories searched for each detected issue type
+ISSUE_CATEGORIES = {
+    "server": ["technical_issues"],
+    "api": ["technical_issues"],
+    "payment": ["billing"],
+    "account": ["account"],
+    "feature": ["product"],
+}
+
+# Pipelines are loaded on first use (or by the warm-up task in main.py)
+BACKEND = get_backend()
+
+def _load_registered(name: str, model_id: str, load: Callable[[str], Tuple[Any, str]]) -> Any:
+    """Load a pipeline on BACKEND and version it by the backend it actually runs on"""
+    pipeline, backend = load(BACKEND)
+    # Cached results must not claim a backend that fell back to another
+    model_registry.set_version(name, f"{model_id}@{backend}")
+    return pipeline
+
+model_registry.register(
+    "sentiment", partial(_load_registered, "sentiment", SENTIMENT_MODEL, load_sentiment_pipeline),
+    version=f"{SENTIMENT_MODEL}@{BACKEND}"
+)
+model_registry.register(
+    "summarizer", partial(_load_registered, "summarizer", SUMMARIZATION_MODEL, load_summarization_pipeline),
+    version=f"{SUMMARIZATION_MODEL}@{BACKEND}"
+)
 
 class AIProcessor:
     def __init__(self):
-        # Initialize NLP pipelines with safe fallbacks
-        self.sentiment_analyzer = None
-        self.summarizer = None
-
-        try:
-            # Correct public model id for SST-2 finetuned DistilBERT
-            self.sentiment_analyzer = pipeline(
-                "sentiment-analysis",
-                model="distilbert-base-uncased-finetuned-sst-2-english",
-                return_all_scores=True
-            )
-        except Exception as e:
-            print(f"Sentiment pipeline load error: {e}")
-
-        try:
-            # T5-small summarizer
-            self.summarizer = pipeline(
-                "summarization",
-                model="t5-small",
-                max_length=100,
-                min_length=30
-            )
-        except Exception as e:
-            print(f"Summarization pipeline load error: {e}")
+        # Mini-batch size used by the batched inference path
+        self.batch_size = int(os.getenv("AI_BATCH_SIZE", "16"))
+        
+        # Long emails are summarized in up to this many chunks (1 = truncate only)
+        self.summary_max_chunks = max(1, int(os.getenv("AI_SUMMARY_MAX_CHUNKS", "4")))
+        
+        # Cache of analysis results keyed by email content and model versions
+        self.cache = AnalysisCache(
+            max_size=int(os.getenv("AI_CACHE_SIZE", "1024")),
+            db_path=os.getenv("AI_CACHE_DB") or None
+        )
         
         # Urgency keywords
         self.urgency_keywords = [
@@ -37,49 +83,133 @@ class AIProcessor:
             "deadline", "important", "priority", "rush", "quick"
         ]
         
-        # Entity patterns
+        # Sentiment keywords for the heuristic fallback
+        self.positive_keywords = ["great", "good", "awesome", "thanks", "thank you", "love", "happy"]
+        self.negative_keywords = ["bad", "issue", "problem", "not working", "hate", "angry", "sad", "sorry"]
+        
+        # Issue type indicators used to enhance replies
+        self.issue_indicators = {
+            "server": ["server", "down", "outage", "downtime", "not working"],
+            "payment": ["payment", "billing", "charge", "refund", "money"],
+            "account": ["login", "password", "access", "account", "sign in"],
+            "api": ["api", "integration", "endpoint", "developer", "code"],
+            "feature": ["feature", "request", "enhancement", "improvement", "suggestion"]
+        }
+        
+        # All keyword lists compiled into one matcher that scans text once
+        keyword_categories = {
+            "urgency": self.urgency_keywords,
+            "positive": self.positive_keywords,
+            "negative": self.negative_keywords,
+            "escalation": ["urgent", "critical"],
+            "question": ["question"]
+        }
+        for issue_type, keywords in self.issue_indicators.items():
+            keyword_categories[f"issue:{issue_type}"] = keywords
+        self.keyword_matcher = KeywordMatcher(
+            keyword_categories,
+            word_boundaries=os.getenv("AI_KEYWORD_WORD_BOUNDARIES", "false").lower() == "true"
+        )
+        
+        # Entity patterns (earlier entries win where matches compete); a group marks the value to keep
         self.entity_patterns = {
             "email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            "phone": r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
-            "url": r'https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?)?'
+            "url": r'https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?)?',
+            # Digits joined by dashes are dates or phone numbers, not order IDs
+            "order_id": r'(?i:\border\s*(?:#|no\.?|number|id)?\s*:?\s*)(?!\d+(?:-\d+)+\b)([A-Z0-9][A-Z0-9-]{3,})\b',
+            "ticket": r'(?i:\b(?:ticket|case|incident)\s*(?:#|no\.?|number|id)?\s*:?\s*)([A-Z]*-?\d{3,})\b',
+            "date": r'\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4}|(?i:(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?(?:,?\s+\d{4})?))\b',
+            "phone": r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'
         }
+        
+        # All entity patterns compiled into one alternation; register more types here
+        self.entity_extractor = EntityExtractor(self.entity_patterns)
+
+    @property
+    def sentiment_analyzer(self):
+        """Sentiment pipeline, loaded on first use (None if unavailable)"""
+        return model_registry.get("sentiment")
+
+    @property
+    def summarizer(self):
+        """Summarization pipeline, loaded on first use (None if unavailable)"""
+        return model_registry.get("summarizer")
     
     def analyze_sentiment(self, text: str) -> str:
         """Analyze sentiment of email text"""
-        try:
-            if self.sentiment_analyzer is None:
-                # Simple heuristic fallback
-                text_lower = text.lower()
-                positive_words = ["great", "good", "awesome", "thanks", "thank you", "love", "happy"]
-                negative_words = ["bad", "issue", "problem", "not working", "hate", "angry", "sad", "sorry"]
-                pos_hits = sum(1 for w in positive_words if w in text_lower)
-                neg_hits = sum(1 for w in negative_words if w in text_lower)
-                if pos_hits > neg_hits:
-                    return 'positive'
-                if neg_hits > pos_hits:
-                    return 'negative'
-                return 'neutral'
-
-            result = self.sentiment_analyzer(text[:512])  # Limit text length
-            scores = result[0]
-
-            # Find the highest scoring sentiment
-            max_score = max(scores, key=lambda x: x['score'])
-
-            if max_score['label'] == 'POSITIVE':
-                return 'positive'
-            elif max_score['label'] == 'NEGATIVE':
-                return 'negative'
-            else:
-                return 'neutral'
-        except Exception as e:
-            print(f"Sentiment analysis error: {e}")
+        return self.analyze_sentiments([text])[0]
+
+    def find_keywords(self, text: str) -> KeywordHits:
+        """Find all known keywords in the text, grouped by category"""
+        return self.keyword_matcher.find(text)
+
+    def analyze_sentiments(self, texts: List[str], hits: Optional[List[KeywordHits]] = None) -> List[str]:
+        """Analyze sentiment of many email texts in length-bucketed mini-batches"""
+        return self._analyze_sentiments(texts, hits)[0]
+
+    def _analyze_sentiments(self, texts: List[str], hits: Optional[List[KeywordHits]] = None) -> Tuple[List[str], Set[int]]:
+        """Sentiments, plus the indices that got the neutral fallback because their mini-batch failed"""
+        if self.sentiment_analyzer is None:
+            if hits is None:
+                hits = [self.find_keywords(text) for text in texts]
+            return [self._heuristic_sentiment(text, text_hits) for text, text_hits in zip(texts, hits)], set()
+
+        # Drop quoted replies and signatures, then fit the model's token budget
+        analyzer = self.sentiment_analyzer
+        tokenizer = getattr(analyzer, "tokenizer", None)
+        budget = token_budget(tokenizer)
+        prepared = [fit_to_token_budget(clean_email_body(text), tokenizer, budget) for text in texts]
+
+        sentiments = ['neutral'] * len(texts)
+        failed = set()
+        for batch in self._length_buckets(prepared):
+            try:
+                results = analyzer(
+                    [prepared[i] for i in batch],
+                    batch_size=len(batch),
+                    truncation=True
+                )
+                for i, scores in zip(batch, results):
+                    sentiments[i] = self._label_from_scores(scores)
+            except Exception as e:
+                print(f"Sentiment analysis error: {e}")
+                failed.update(batch)
+
+        return sentiments, failed
+
+    def _heuristic_sentiment(self, text: str, hits: Optional[KeywordHits] = None) -> str:
+        """Simple keyword heuristic used when the sentiment model is unavailable"""
+        if hits is None:
+            hits = self.find_keywords(text)
+        pos_hits = len(hits.get("positive", ()))
+        neg_hits = len(hits.get("negative", ()))
+        if pos_hits > neg_hits:
+            return 'positive'
+        if neg_hits > pos_hits:
+            return 'negative'
+        return 'neutral'
+
+    def _label_from_scores(self, scores: List[Dict]) -> str:
+        """Map the highest scoring pipeline label to a sentiment"""
+        max_score = max(scores, key=lambda x: x['score'])
+
+        if max_score['label'] == 'POSITIVE':
+            return 'positive'
+        elif max_score['label'] == 'NEGATIVE':
+            return 'negative'
+        else:
             return 'neutral'
+
+    def _length_buckets(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into mini-batches of similar length to minimise padding"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        return [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
     
-    def detect_urgency(self, text: str) -> Tuple[str, bool]:
+    def detect_urgency(self, text: str, hits: Optional[KeywordHits] = None) -> Tuple[str, bool]:
         """Detect urgency level and flag"""
-        text_lower = text.lower()
-        urgency_count = sum(1 for keyword in self.urgency_keywords if keyword in text_lower)
+        if hits is None:
+            hits = self.find_keywords(text)
+        urgency_count = len(hits.get("urgency", ()))
         
         if urgency_count >= 2:
             return "urgent", True
@@ -90,39 +220,105 @@ class AIProcessor:
     
     def extract_entities(self, text: str) -> Dict[str, List[str]]:
         """Extract entities using regex patterns"""
-        entities = {}
-        
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = re.findall(pattern, text)
-            if matches:
-                entities[entity_type] = list(set(matches))  # Remove duplicates
-        
-        return entities
+        return self.entity_extractor.extract(text)
     
     def generate_summary(self, text: str) -> str:
         """Generate summary of email text"""
-        try:
-            if len(text) < 100:
-                return text
-            
-            # Limit text for summarization
-            text_for_summary = text[:1000]
-            if self.summarizer is None:
-                # Fallback: return a truncated excerpt
-                return text_for_summary[:200] + ("..." if len(text_for_summary) > 200 else "")
-
-            summary = self.summarizer(text_for_summary, max_length=100, min_length=30)
-
-            return summary[0]['summary_text']
-        except Exception as e:
-            print(f"Summarization error: {e}")
-            return text[:200] + "..." if len(text) > 200 else text
+        return self.generate_summaries([text])[0]
+
+    def generate_summaries(self, texts: List[str]) -> List[str]:
+        """Generate summaries for many email texts in length-bucketed mini-batches"""
+        return self._generate_summaries(texts)[0]
+
+    def _generate_summaries(self, texts: List[str]) -> Tuple[List[str], Set[int]]:
+        """Summaries, plus the indices that got an excerpt because a summarizer mini-batch failed"""
+        # Quoted replies and signatures are never summarized
+        texts = [clean_email_body(text) for text in texts]
+
+        # Short texts are returned as-is and never reach the model
+        summaries = list(texts)
+        failed = set()
+        pending = [i for i, text in enumerate(texts) if len(text) >= 100]
+        if not pending:
+            return summaries, failed
+
+        summarizer = self.summarizer
+        if summarizer is None:
+            # Fallback: return a truncated excerpt
+            for i in pending:
+                text = texts[i][:1000]
+                summaries[i] = text[:200] + ("..." if len(text) > 200 else "")
+            return summaries, failed
+
+        # Leave room for the "summarize: " prefix T5 adds
+        tokenizer = getattr(summarizer, "tokenizer", None)
+        budget = token_budget(tokenizer, reserved=8)
+
+        # Map: each email is split into chunks that fit the token budget
+        chunks, owners = [], []
+        for i in pending:
+            parts = chunk_by_tokens(texts[i], tokenizer, budget, self.summary_max_chunks)
+            chunks.extend(parts)
+            owners.extend([i] * len(parts))
+
+        partials: Dict[int, List[str]] = {}
+        chunk_summaries, failed_chunks = self._summarize(chunks)
+        for i, summary in zip(owners, chunk_summaries):
+            partials.setdefault(i, []).append(summary)
+        failed.update(owners[j] for j in failed_chunks)
+
+        # Reduce: chunk summaries of long emails are summarized once more
+        reduce_ids = []
+        for i in pending:
+            if len(partials[i]) == 1:
+                summaries[i] = partials[i][0]
+            else:
+                reduce_ids.append(i)
+
+        if reduce_ids:
+            combined = [fit_to_token_budget(" ".join(partials[i]), tokenizer, budget) for i in reduce_ids]
+            reduced, failed_reduce = self._summarize(combined)
+            for i, summary in zip(reduce_ids, reduced):
+                summaries[i] = summary
+            failed.update(reduce_ids[j] for j in failed_reduce)
+
+        return summaries, failed
+
+    def _summarize(self, texts: List[str]) -> Tuple[List[str], Set[int]]:
+        """Run the summarizer over texts that already fit its token budget; failed ones keep an excerpt"""
+        summaries = [text[:200] + "..." if len(text) > 200 else text for text in texts]
+        failed = set()
+
+        for batch in self._length_buckets(texts):
+            try:
+                results = self.summarizer(
+                    [texts[i] for i in batch],
+                    max_length=100,
+                    min_length=30,
+                    batch_size=len(batch),
+                    truncation=True
+                )
+                for i, summary in zip(batch, results):
+                    summaries[i] = summary['summary_text']
+            except Exception as e:
+                print(f"Summarization error: {e}")
+                failed.update(batch)
+
+        return summaries, failed
     
-    def generate_draft_reply(self, email_subject: str, email_body: str, sentiment: str) -> str:
+    def generate_draft_reply(self, email_subject: str, email_body: str, sentiment: str,
+                             context: Optional[str] = None, body_hits: Optional[KeywordHits] = None,
+                             subject_hits: Optional[KeywordHits] = None) -> str:
         """Generate a context-aware draft reply using RAG"""
+        # Batch callers pass in the keyword hits and context they already have
+        if body_hits is None:
+            body_hits = self.find_keywords(email_body)
+        if subject_hits is None:
+            subject_hits = self.find_keywords(email_subject)
+        
         # Get relevant context from knowledge base
-        query = f"{email_subject} {email_body}"
-        context = knowledge_base.get_context_for_query(query, max_context_length=800)
+        if context is None:
+            context = self.get_kb_contexts([email_subject], [email_body], hits=[merge_hits(body_hits, subject_hits)])[0]
         
         # Base templates with RAG-enhanced responses
         templates = {
@@ -149,28 +345,19 @@ class AIProcessor:
         base_reply = random.choice(template)
         
         # Enhance with context-aware information
-        enhanced_reply = self._enhance_with_context(base_reply, context, email_subject, email_body, sentiment)
+        enhanced_reply = self._enhance_with_context(
+            base_reply, context, email_subject, email_body, sentiment, body_hits, subject_hits
+        )
         
         return enhanced_reply
     
-    def _enhance_with_context(self, base_reply: str, context: str, subject: str, body: str, sentiment: str) -> str:
+    def _enhance_with_context(self, base_reply: str, context: str, subject: str, body: str, sentiment: str,
+                              body_hits: KeywordHits, subject_hits: KeywordHits) -> str:
         """Enhance reply with context from knowledge base"""
         # Check for specific issue types and provide relevant guidance
-        issue_indicators = {
-            "server": ["server", "down", "outage", "downtime", "not working"],
-            "payment": ["payment", "billing", "charge", "refund", "money"],
-            "account": ["login", "password", "access", "account", "sign in"],
-            "api": ["api", "integration", "endpoint", "developer", "code"],
-            "feature": ["feature", "request", "enhancement", "improvement", "suggestion"]
-        }
-        
-        detected_issues = []
-        body_lower = body.lower()
-        subject_lower = subject.lower()
+        hits = merge_hits(body_hits, subject_hits)
         
-        for issue_type, keywords in issue_indicators.items():
-            if any(keyword in body_lower or keyword in subject_lower for keyword in keywords):
-                detected_issues.append(issue_type)
+        detected_issues = self._detect_issues(hits)
         
         # Build enhanced response
         enhanced_reply = base_reply
@@ -185,13 +372,13 @@ class AIProcessor:
             enhanced_reply += f"\n\nHere's what I can help you with:\n{context[:500]}..."
         
         # Add urgency handling
-        if "urgent" in subject_lower or "urgent" in body_lower or "critical" in body_lower:
+        if "urgent" in hits.get("escalation", ()) or "critical" in body_hits.get("escalation", ()):
             enhanced_reply += "\n\nI'm prioritizing this issue and will provide updates every 30 minutes until resolved."
         
         # Add next steps
         if sentiment == "negative":
             enhanced_reply += "\n\nI'll personally follow up on this to ensure we resolve it to your satisfaction."
-        elif "?" in body or "question" in subject_lower:
+        elif "?" in body or "question" in subject_hits:
             enhanced_reply += "\n\nI'll research this thoroughly and provide you with a detailed response within 24 hours."
         
         # Professional closing
@@ -199,30 +386,123 @@ class AIProcessor:
         
         return enhanced_reply
     
-    def process_email(self, email_text: str, email_subject: str = "") -> Dict:
-        """Process email with all AI features"""
-        # Analyze sentiment
-        sentiment = self.analyze_sentiment(email_text)
-        
-        # Detect urgency
-        priority, is_urgent = self.detect_urgency(email_text + " " + email_subject)
-        
-        # Extract entities
-        entities = self.extract_entities(email_text)
+    def _detect_issues(self, hits: KeywordHits) -> List[str]:
+        """Issue types (server, payment, ...) mentioned in the keyword hits"""
+        return [
+            issue_type for issue_type in self.issue_indicators
+            if f"issue:{issue_type}" in hits
+        ]
+    
+    def get_kb_contexts(self, subjects: List[str], bodies: List[str],
+                        hits: Optional[List[KeywordHits]] = None) -> List[str]:
+        """Knowledge base context per email, searching only the categories of its detected issues"""
+        if hits is None:
+            hits = [merge_hits(self.find_keywords(body), self.find_keywords(subject)) for subject, body in zip(subjects, bodies)]
         
-        # Generate summary
-        summary = self.generate_summary(email_text)
+        # Quoted replies and signatures would steer retrieval towards the earlier thread
+        bodies = [clean_email_body(body) for body in bodies]
+        queries = [f"{subject} {body}" for subject, body in zip(subjects, bodies)]
+        categories = []
+        for email_hits in hits:
+            issues = self._detect_issues(email_hits)
+            categories.append(sorted({c for issue in issues for c in ISSUE_CATEGORIES.get(issue, [])}) or None)
         
-        # Generate draft reply
-        draft_reply = self.generate_draft_reply(email_subject, email_text, sentiment)
+        # One snapshot for the batch, even if the knowledge base is reloaded meanwhile
+        knowledge_base = get_knowledge_base()
+        contexts = knowledge_base.get_context_for_queries(queries, max_context_length=800, categories=categories)
         
-        return {
-            "sentiment": sentiment,
-            "priority": priority,
-            "is_urgent": is_urgent,
-            "entities": entities,
-            "summary": summary,
-            "draft_reply": draft_reply
-        }
+        # Fall back to the whole knowledge base when the matching partitions have nothing relevant
+        retry = [i for i, context in enumerate(contexts) if categories[i] and "No relevant information found" in context]
+        if retry:
+            fallback = knowledge_base.get_context_for_queries([queries[i] for i in retry], max_context_length=800)
+            for i, context in zip(retry, fallback):
+                contexts[i] = context
+        return contexts
+    
+    def process_email(self, email_text: str, email_subject: str = "") -> Dict:
+        """Process email with all AI features"""
+        return self.process_emails([{"body": email_text, "subject": email_subject}])[0]
+
+    def process_emails(self, batch: List[Dict[str, str]]) -> List[Dict]:
+        """Process a list of emails ({"body", "subject"}) with all AI features, preserving input order"""
+        bodies = [email.get("body") or "" for email in batch]
+        subjects = [email.get("subject") or "" for email in batch]
+
+        # Reuse cached analyses for emails whose content has not changed
+        versions = self._model_versions()
+        keys = [AnalysisCache.make_key(subject, body, versions) for subject, body in zip(subjects, bodies)]
+        analyses = [self.cache.get(key) for key in keys]
+
+        # Only the new text counts: a quoted "refund" or a signature must not add issues or raise priority
+        cleaned = [clean_email_body(body) for body in bodies]
+
+        # One keyword scan per text, shared by analysis, retrieval and the draft reply
+        body_hits = [self.find_keywords(body) for body in cleaned]
+        subject_hits = [self.find_keywords(subject) for subject in subjects]
+
+        misses = [i for i, analysis in enumerate(analyses) if analysis is None]
+        if misses:
+            fresh, degraded = self._analyze_emails(
+                [cleaned[i] for i in misses],
+                [subjects[i] for i in misses],
+                [body_hits[i] for i in misses],
+                [subject_hits[i] for i in misses]
+            )
+            for j, (i, analysis) in enumerate(zip(misses, fresh)):
+                # Fallbacks from a failed model batch would otherwise be cached under the model's version
+                if j not in degraded:
+                    self.cache.set(keys[i], analysis)
+                analyses[i] = analysis
 
+        # Retrieve knowledge base context for the whole batch with one encode
+        contexts = self.get_kb_contexts(
+            subjects, cleaned, hits=[merge_hits(body_hit, subject_hit) for body_hit, subject_hit in zip(body_hits, subject_hits)]
+        )
 
+        results = []
+        for i, (body, subject, analysis, context) in enumerate(zip(cleaned, subjects, analyses, contexts)):
+            # Draft replies depend on the knowledge base, so they are not cached
+            analysis["draft_reply"] = self.generate_draft_reply(
+                subject, body, analysis["sentiment"], context=context,
+                body_hits=body_hits[i], subject_hits=subject_hits[i]
+            )
+            results.append(analysis)
+
+        return results
+
+    def _analyze_emails(self, bodies: List[str], subjects: List[str], body_hits: List[KeywordHits],
+                        subject_hits: List[KeywordHits]) -> Tuple[List[Dict], Set[int]]:
+        """Run sentiment, urgency, entity and summary analysis over a batch of cleaned bodies; also returns the degraded indices"""
+
+        # Model-backed steps run over the whole batch at once
+        sentiments, failed_sentiments = self._analyze_sentiments(bodies, hits=body_hits)
+        summaries, failed_summaries = self._generate_summaries(bodies)
+
+        analyses = []
+        for i, (body, subject) in enumerate(zip(bodies, subjects)):
+            # Detect urgency
+            priority, is_urgent = self.detect_urgency(
+                body + " " + subject,
+                hits=merge_hits(body_hits[i], subject_hits[i])
+            )
+
+            analyses.append({
+                "sentiment": sentiments[i],
+                "priority": priority,
+                "is_urgent": is_urgent,
+                "entities": self.extract_entities(body),
+                "summary": summaries[i]
+            })
+
+        return analyses, failed_sentiments | failed_summaries
+
+    def _model_versions(self) -> List[str]:
+        """Identify the models (or fallbacks) that produce analysis results"""
+        versions = [ANALYSIS_VERSION]
+        versions.append("keywords:word" if self.keyword_matcher.word_boundaries else "keywords:substring")
+        for name in ("sentiment", "summarizer"):
+            if model_registry.get(name) is not None:
+                versions.append(model_registry.version(name))
+            else:
+                versions.append(f"{name}:fallback")
+        return versions
@@ -0,0 +1,597 @@
+"""
+Async Email Transport for EmailAce AI
+asyncio IMAP and SMTP clients so mail sync and sending never block the event loop
+"""
+
+import asyncio
+import base64
+import inspect
+import os
+import re
+import ssl
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from email_service import (
+    EMAIL_FETCH_CHUNK_SIZE, EMAIL_MAX_BODY_BYTES, HEADER_FETCH_ITEMS,
+    EmailConfig, EmailService, get_email_config
+)
+from imap_parsing import chunked, message_set
+
+# Seconds any single mail server exchange may take before the connection is dropped
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "30"))
+
+_LITERAL = re.compile(rb'\{(\d+)\}\r\n$')
+_RESPONSE_CODE = re.compile(rb'\[(UIDVALIDITY|UIDNEXT) (\d+)\]')
+
+class MailProtocolError(Exception):
+    """A mail server refused a command or replied with something unexpected"""
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class AsyncIMAPClient:
+    """IMAP4rev1 client over asyncio streams: tagged commands, literals and pipelining"""
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True, timeout: float = EMAIL_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tag = 0
+        # One exchange at a time; a pipeline counts as one exchange
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.use_ssl else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout
+        )
+        greeting = await asyncio.wait_for(self._reader.readline(), self.timeout)
+        if not greeting.startswith((b'* OK', b'* PREAUTH')):
+            await self.close()
+            raise MailProtocolError(f"unexpected IMAP greeting: {greeting!r}")
+
+    async def login(self, username: str, password: str):
+        await self.command('LOGIN', _quote(username), _quote(password))
+
+    async def command(self, name: str, *args: str) -> List[Tuple[bytes, List[Any]]]:
+        """Run one command and return its untagged responses; raises on NO/BAD"""
+        statuses, untagged = await self.pipeline([(name, *args)])
+        if statuses[0][0] != b'OK':
+            raise MailProtocolError(f"{name} failed: {statuses[0][1].decode(errors='ignore')}")
+        return untagged
+
+    async def pipeline(self, commands: List[Tuple[str, ...]]):
+        """Send commands back to back, then collect ([(status, text) per command], [(kind, pieces) untagged])"""
+        if not self.connected:
+            raise MailProtocolError("not connected")
+
+        async with self._lock:
+            tags = []
+            for command in commands:
+                self._tag += 1
+                tag = f"A{self._tag:04d}".encode()
+                tags.append(tag)
+                self._writer.write(tag + b' ' + ' '.join(command).encode() + b'\r\n')
+
+            statuses: Dict[bytes, Tuple[bytes, bytes]] = {}
+            untagged = []
+            try:
+                await asyncio.wait_for(self._writer.drain(), self.timeout)
+                while len(statuses) < len(tags):
+                    pieces = await asyncio.wait_for(self._read_response(), self.timeout)
+                    first = pieces[0][0] if isinstance(pieces[0], tuple) else pieces[0]
+                    tag, _, rest = first.partition(b' ')
+                    if tag == b'*':
+                        untagged.append(self._untagged(pieces))
+                    elif tag in tags:
+                        status, _, text = rest.partition(b' ')
+                        statuses[tag] = (status.upper(), text)
+            except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+                # The stream is out of step with the commands; it can't be reused
+                await self.close()
+                raise
+        return [statuses[tag] for tag in tags], untagged
+
+    async def _read_response(self, line: Optional[bytes] = None) -> List[Any]:
+        """One server response, with literals as imaplib-style (prefix, literal) tuples"""
+        pieces = []
+        while True:
+            line = line if line is not None else await self._reader.readline()
+            if not line:
+                raise ConnectionError("IMAP server closed the connection")
+            match = _LITERAL.search(line)
+            if not match:
+                pieces.append(line.rstrip(b'\r\n'))
+                return pieces
+            literal = await self._reader.readexactly(int(match.group(1)))
+            pieces.append((line.rstrip(b'\r\n'), literal))
+            line = None
+
+    @staticmethod
+    def _untagged(pieces: List[Any]) -> Tuple[bytes, List[Any]]:
+        """(kind, pieces) with "* " stripped; "* 5 FETCH (...)" becomes b'5 (...)' like imaplib"""
+        first = pieces[0][0] if isinstance(pieces[0], tuple) else pieces[0]
+        words = first[2:].split(b' ', 2)
+        if words[0].isdigit() and len(words) > 1:
+            kind = words[1].upper()
+            stripped = words[0] + (b' ' + words[2] if len(words) > 2 else b'')
+        else:
+            kind = words[0].upper()
+            stripped = b' '.join(words[1:])
+        head = (stripped, pieces[0][1]) if isinstance(pieces[0], tuple) else stripped
+        return kind, [head] + pieces[1:]
+
+    async def select(self, folder: str = "INBOX") -> Dict[str, int]:
+        """Select a folder and return its UIDVALIDITY, UIDNEXT and message count"""
+        mailbox = {}
+        for kind, pieces in await self.command('SELECT', _quote(folder)):
+            line = pieces[0] if isinstance(pieces[0], bytes) else pieces[0][0]
+            if kind == b'EXISTS':
+                mailbox['exists'] = int(line)
+            for code, value in _RESPONSE_CODE.findall(line):
+                mailbox[code.decode().lower()] = int(value)
+        return mailbox
+
+    async def uid_search(self, criteria: str) -> List[str]:
+        uids = []
+        for kind, pieces in await self.command('UID', 'SEARCH', criteria):
+            if kind == b'SEARCH':
+                uids.extend(uid.decode() for uid in pieces[0].split())
+        return uids
+
+    async def uid_fetch(self, requests: List[Tuple[str, str]]) -> Tuple[List[bytes], List[Any]]:
+        """Pipelined UID FETCHes of (message set, items); returns per-request status and all FETCH data"""
+        statuses, untagged = await self.pipeline([('UID', 'FETCH', uids, items) for uids, items in requests])
+        data = [piece for kind, pieces in untagged if kind == b'FETCH' for piece in pieces]
+        return [status for status, _ in statuses], data
+
+    async def capabilities(self) -> set:
+        caps = set()
+        for kind, pieces in await self.command('CAPABILITY'):
+            if kind == b'CAPABILITY':
+                caps.update(cap.decode().upper() for cap in pieces[0].split())
+        return caps
+
+    async def idle(self, seconds: float) -> List[Tuple[bytes, List[Any]]]:
+        """IDLE (RFC 2177) until the server reports new mail or seconds pass; returns the untagged updates"""
+        if not self.connected:
+            raise MailProtocolError("not connected")
+
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            self._tag += 1
+            tag = f"A{self._tag:04d}".encode()
+            self._writer.write(tag + b' IDLE\r\n')
+            updates = []
+            try:
+                await asyncio.wait_for(self._writer.drain(), self.timeout)
+                while True:
+                    pieces = await asyncio.wait_for(self._read_response(), self.timeout)
+                    first = pieces[0][0] if isinstance(pieces[0], tuple) else pieces[0]
+                    if first.startswith(b'+'):
+                        break
+                    if first.startswith(tag + b' '):
+                        raise MailProtocolError(f"IDLE refused: {first.decode(errors='ignore')}")
+                    updates.append(self._untagged(pieces))
+
+                deadline = loop.time() + seconds
+                while not any(kind == b'EXISTS' for kind, _ in updates):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        # readline is safe to cancel: nothing is consumed until a whole line arrived
+                        line = await asyncio.wait_for(self._reader.readline(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if not line:
+                        raise ConnectionError("IMAP server closed the connection")
+                    updates.append(self._untagged(await self._read_response(line)))
+
+                self._writer.write(b'DONE\r\n')
+                await asyncio.wait_for(self._writer.drain(), self.timeout)
+                while True:
+                    pieces = await asyncio.wait_for(self._read_response(), self.timeout)
+                    first = pieces[0][0] if isinstance(pieces[0], tuple) else pieces[0]
+                    if first.startswith(tag + b' '):
+                        break
+                    updates.append(self._untagged(pieces))
+            except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+                # Possibly still idling; the connection can't take other commands
+                await self.close()
+                raise
+        return updates
+
+    async def noop(self):
+        await self.command('NOOP')
+
+    async def logout(self):
+        try:
+            await self.command('LOGOUT')
+        except Exception:
+            pass
+        await self.close()
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await asyncio.wait_for(self._writer.wait_closed(), self.timeout)
+            except Exception:
+                pass
+            self._writer = None
+
+class AsyncSMTPClient:
+    """SMTP client over asyncio streams (implicit TLS on 465, STARTTLS otherwise, PIPELINING when offered)"""
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True, timeout: float = EMAIL_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.extensions: Dict[str, str] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        implicit_tls = self.use_ssl and self.port == 465
+        context = ssl.create_default_context() if implicit_tls else None
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout
+        )
+        await self._expect(220)
+        await self._ehlo()
+
+        if self.use_ssl and not implicit_tls:
+            if "starttls" not in self.extensions:
+                await self.close()
+                raise MailProtocolError(f"{self.host} does not offer STARTTLS")
+            await self.command("STARTTLS", 220)
+            await asyncio.wait_for(
+                self._writer.start_tls(ssl.create_default_context(), server_hostname=self.host), self.timeout
+            )
+            # Capabilities may change once the channel is encrypted
+            await self._ehlo()
+
+    async def login(self, username: str, password: str):
+        credentials = base64.b64encode(f"\0{username}\0{password}".encode()).decode()
+        await self.command(f"AUTH PLAIN {credentials}", 235)
+
+    async def command(self, line: str, *expected: int) -> Tuple[int, List[bytes]]:
+        async with self._lock:
+            self._writer.write(line.encode() + b'\r\n')
+            return await self._expect(*expected)
+
+    async def sendmail(self, from_addr: str, to_addrs: List[str], message: str):
+        """MAIL/RCPT/DATA, sent as one batch when the server supports PIPELINING"""
+        envelope = [f"MAIL FROM:<{from_addr}>"] + [f"RCPT TO:<{to}>" for to in to_addrs] + ["DATA"]
+
+        # CRLF line endings and dot-stuffing
+        lines = message.replace('\r\n', '\n').split('\n')
+        data = '\r\n'.join('.' + line if line.startswith('.') else line for line in lines)
+
+        async with self._lock:
+            replies = []
+            if "pipelining" in self.extensions:
+                self._writer.write(''.join(line + '\r\n' for line in envelope).encode())
+                for _ in envelope:
+                    replies.append((await self._expect())[0])
+            else:
+                for line in envelope:
+                    self._writer.write(line.encode() + b'\r\n')
+                    replies.append((await self._expect())[0])
+                    if replies[0] != 250:
+                        break
+
+            # Like smtplib, refused recipients only fail the send when none is accepted (DATA is then refused)
+            if len(replies) < len(envelope) or replies[-1] != 354:
+                # Abandon the transaction so the session stays usable
+                self._writer.write(b'RSET\r\n')
+                await self._expect()
+                raise MailProtocolError(f"SMTP refused the message (replies {replies})")
+
+            self._writer.write(data.encode('utf-8') + b'\r\n.\r\n')
+            await self._expect(250)
+
+    async def noop(self):
+        await self.command("NOOP", 250)
+
+    async def quit(self):
+        try:
+            await self.command("QUIT", 221)
+        except Exception:
+            pass
+        await self.close()
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await asyncio.wait_for(self._writer.wait_closed(), self.timeout)
+            except Exception:
+                pass
+            self._writer = None
+
+    async def _ehlo(self):
+        async with self._lock:
+            self._writer.write(b'EHLO ' + (os.getenv("HOSTNAME") or "emailace").encode() + b'\r\n')
+            _, lines = await self._expect(250)
+        self.extensions = {}
+        for line in lines[1:]:
+            keyword, _, params = line.decode(errors='ignore').partition(' ')
+            self.extensions[keyword.lower()] = params
+
+    async def _expect(self, *expected: int) -> Tuple[int, List[bytes]]:
+        """Read one (possibly multi-line) reply; raises unless its code is expected (any code if none given)"""
+        lines = []
+        try:
+            while True:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+                if not line:
+                    raise ConnectionError("SMTP server closed the connection")
+                lines.append(line[4:].rstrip(b'\r\n'))
+                if line[3:4] != b'-':
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.CancelledError):
+            # A reply may be left half read; the session can't be reused
+            await self.close()
+            raise
+
+        code = int(line[:3])
+        if expected and code not in expected:
+            raise MailProtocolError(f"SMTP {code}: {b' '.join(lines).decode(errors='ignore')}")
+        return code, lines
+
+async def open_imap(config: EmailConfig, timeout: float = EMAIL_TIMEOUT) -> AsyncIMAPClient:
+    """Connected, logged-in IMAP client"""
+    client = AsyncIMAPClient(config.imap_server, config.imap_port, config.use_ssl, timeout)
+    try:
+        await client.connect()
+        await client.login(config.username, config.password)
+    except BaseException:
+        await client.close()
+        raise
+    return client
+
+async def open_smtp(config: EmailConfig, timeout: float = EMAIL_TIMEOUT) -> AsyncSMTPClient:
+    """Connected, authenticated SMTP client"""
+    client = AsyncSMTPClient(config.smtp_server, config.smtp_port, config.use_ssl, timeout)
+    try:
+        await client.connect()
+        await client.login(config.username, config.password)
+    except BaseException:
+        await client.close()
+        raise
+    return client
+
+class AsyncEmailService(EmailService):
+    """EmailService whose I/O methods are coroutines; parsing runs in worker threads"""
+
+    def __init__(self, config: EmailConfig, timeout: float = EMAIL_TIMEOUT):
+        super().__init__(config)
+        self.timeout = timeout
+
+    async def connect_imap(self) -> bool:
+        """Connect to IMAP server"""
+        try:
+            self.imap_connection = await open_imap(self.config, self.timeout)
+            return True
+        except Exception as e:
+            print(f"IMAP connection failed: {e!r}")
+            return False
+
+    async def connect_smtp(self) -> bool:
+        """Connect to SMTP server"""
+        try:
+            self.smtp_connection = await open_smtp(self.config, self.timeout)
+            return True
+        except Exception as e:
+            print(f"SMTP connection failed: {e!r}")
+            return False
+
+    async def disconnect(self):
+        """Disconnect from email servers"""
+        if self.imap_connection:
+            await self.imap_connection.logout()
+            self.imap_connection = None
+
+        if self.smtp_connection:
+            await self.smtp_connection.quit()
+            self.smtp_connection = None
+
+    async def _ensure_imap(self) -> bool:
+        if self.imap_connection and self.imap_connection.connected:
+            return True
+        return await self.connect_imap()
+
+    async def select_folder(self, folder: str = "INBOX") -> Dict[str, int]:
+        """Select a folder and return its UIDVALIDITY and UIDNEXT"""
+        return await self.imap_connection.select(folder)
+
+    async def search_emails(self,
+                            folder: str = "INBOX",
+                            search_criteria: str = "ALL",
+                            since_days: int = 7) -> List[str]:
+        """Search for emails matching criteria (returns UIDs)"""
+        if not await self._ensure_imap():
+            return []
+
+        try:
+            await self.select_folder(folder)
+            return await self._uid_search(self._sync_criteria(0, since_days))
+        except Exception as e:
+            print(f"Email search failed: {e}")
+            return []
+
+    async def _uid_search(self, criteria: str) -> List[str]:
+        return await self.imap_connection.uid_search(self._search_query(criteria))
+
+    async def fetch_email(self, email_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a specific email by UID"""
+        if not await self._ensure_imap():
+            return None
+
+        try:
+            email_id = email_id.decode() if isinstance(email_id, bytes) else str(email_id)
+            statuses, msg_data = await self.imap_connection.uid_fetch([(email_id, '(RFC822)')])
+            literal = next((piece[1] for piece in msg_data if isinstance(piece, tuple)), None)
+            if statuses[0] != b'OK' or literal is None:
+                return None
+            return await asyncio.to_thread(self._parse_email, email_id, literal)
+        except Exception as e:
+            print(f"Email fetch failed: {e}")
+            return None
+
+    async def fetch_headers(self, email_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Fetch the pre-screen headers of all messages in one pipelined round trip"""
+        if not await self._ensure_imap():
+            return []
+
+        try:
+            headers, _ = await self._fetch_header_chunks(list(email_ids))
+            return headers
+        except Exception as e:
+            print(f"Email header fetch failed: {e}")
+            return []
+
+    async def _fetch_header_chunks(self, uids: List[Any]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Headers of every chunk that succeeded, and the first UID of the first chunk that didn't"""
+        chunks = list(chunked(uids, EMAIL_FETCH_CHUNK_SIZE))
+        statuses, msg_data = await self.imap_connection.uid_fetch(
+            [(message_set(chunk), HEADER_FETCH_ITEMS) for chunk in chunks]
+        )
+        headers = await asyncio.to_thread(self._parse_headers, msg_data)
+
+        failed = [int(chunk[0]) for chunk, status in zip(chunks, statuses) if status != b'OK']
+        if failed:
+            print(f"Email header fetch failed for {len(failed)} chunk(s)")
+            headers = [header for header in headers if int(header['id']) < failed[0]]
+        return headers, failed[0] if failed else None
+
+    async def fetch_bodies(self, headers: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Fetch the text/plain part of each message in one pipelined round trip; failed ones are left out"""
+        requests = [
+            (section, chunk)
+            for section, group in self._body_sections(headers).items()
+            for chunk in chunked(group, EMAIL_FETCH_CHUNK_SIZE)
+        ]
+        if not requests:
+            return {}
+
+        try:
+            statuses, msg_data = await self.imap_connection.uid_fetch([
+                (message_set(header['id'] for header in chunk), f'(BODY.PEEK[{section}]<0.{EMAIL_MAX_BODY_BYTES}>)')
+                for section, chunk in requests
+            ])
+        except Exception as e:
+            print(f"Email body fetch failed: {e}")
+            return {}
+
+        def parse():
+            bodies = {}
+            for (section, chunk), status in zip(requests, statuses):
+                if status != b'OK':
+                    print(f"Email body fetch failed: {status.decode(errors='ignore')}")
+                    continue
+                bodies.update(self._parse_bodies(msg_data, chunk, section))
+            return bodies
+
+        return await asyncio.to_thread(parse)
+
+    async def fetch_emails(self,
+                           folder: str = "INBOX",
+                           since_days: int = 7,
+                           limit: int = 50,
+                           screen: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """Fetch multiple emails: headers first, then text bodies only for messages that are kept"""
+        email_ids = await self.search_emails(folder, since_days=since_days)
+
+        if not email_ids:
+            return []
+
+        emails, _ = await self._download(await self.fetch_headers(email_ids[:limit]), screen)
+        return emails
+
+    async def sync_folder(self,
+                          folder: str = "INBOX",
+                          uid_validity: Optional[int] = None,
+                          last_uid: int = 0,
+                          since_days: int = 7,
+                          limit: int = 50,
+                          screen: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
+        """Fetch mail that arrived after last_uid; returns the emails and the folder's new high-water mark"""
+        if not await self._ensure_imap():
+            return None
+
+        try:
+            mailbox = await self.select_folder(folder)
+            current_validity = mailbox.get('uidvalidity')
+            if uid_validity is None or current_validity != uid_validity:
+                last_uid = 0
+            uids = await self._uid_search(self._sync_criteria(last_uid, since_days))
+            batch, high_water, more = self._plan_sync(uids, last_uid, mailbox, limit)
+
+            headers, failed_from = await self._fetch_header_chunks(batch) if batch else ([], None)
+            if failed_from is not None:
+                # Don't move the mark past mail that wasn't fetched
+                high_water = failed_from - 1
+                more = True
+
+            emails, body_failed_from = await self._download(headers, screen)
+            if body_failed_from is not None:
+                emails, high_water, more = self._stop_before(emails, body_failed_from, high_water)
+        except Exception as e:
+            print(f"Email sync failed: {e}")
+            return None
+
+        return {
+            'uid_validity': current_validity,
+            'last_uid': high_water,
+            'more': more,
+            'emails': emails
+        }
+
+    async def _download(self, headers: List[Dict[str, Any]], screen=None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Drop duplicate and screened-out headers, then fetch the text bodies of the rest"""
+        emails = self._screen(headers)
+        if screen and emails:
+            # The screen may be a coroutine so it can query the database off the event loop
+            emails = screen(emails)
+            if inspect.isawaitable(emails):
+                emails = await emails
+        return self._attach_bodies(emails, await self.fetch_bodies(emails))
+
+    async def send_email(self,
+                         to_email: str,
+                         subject: str,
+                         body: str,
+                         reply_to: Optional[str] = None) -> bool:
+        """Send an email"""
+        if not (self.smtp_connection and self.smtp_connection.connected):
+            if not await self.connect_smtp():
+                return False
+
+        try:
+            text = self._build_message(to_email, subject, body, reply_to)
+            await self.smtp_connection.sendmail(self.config.username, [to_email], text)
+            return True
+        except Exception as e:
+            print(f"Email send failed: {e}")
+            return False
+
+def get_async_email_service(provider: str = "gmail") -> AsyncEmailService:
+    """Get non-blocking email service for specified provider, backed by the shared connection pools"""
+    from mail_pool import PooledEmailService, mail_pools
+    return PooledEmailService(get_email_config(provider), mail_pools)
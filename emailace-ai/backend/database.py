@@ -1,8 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Text, DateTime, Boolean, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-import os
 
 # Database URL
 DATABASE_URL = "sqlite:///./emailace.db"
@@ -32,10 +31,36 @@ class Email(Base):
     is_urgent = Column(Boolean, default=False)
     summary = Column(Text, nullable=True)
     entities = Column(Text, nullable=True)  # JSON string of extracted entities
+    message_id = Column(String, unique=True, index=True, nullable=True)  # RFC 5322 Message-ID of synced mail
+    analyzed_at = Column(DateTime, nullable=True)  # when the AI results were saved; NULL until analysed
+
+# Sync high-water mark per mailbox folder
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    __table_args__ = (UniqueConstraint("account", "folder"),)
+    
+    id = Column(Integer, primary_key=True)
+    account = Column(String, nullable=False)
+    folder = Column(String, nullable=False)
+    uid_validity = Column(Integer, nullable=True)  # UIDs are only comparable while this is unchanged
+    last_uid = Column(Integer, default=0)          # highest UID already synced
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # Create tables
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    
+    # create_all doesn't add columns to existing tables
+    columns = {column["name"] for column in inspect(engine).get_columns("emails")}
+    if "message_id" not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE emails ADD COLUMN message_id VARCHAR"))
+            connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_emails_message_id ON emails (message_id)"))
+    if "analyzed_at" not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE emails ADD COLUMN analyzed_at DATETIME"))
+            # Rows that already carry a summary were analysed when they were stored
+            connection.execute(text("UPDATE emails SET analyzed_at = date WHERE summary IS NOT NULL"))
 
 # Dependency to get DB session
 def get_db():
@@ -0,0 +1,283 @@
+"""
+Durable Priority Queue for EmailAce AI
+SQLite-backed email task queue shared by every worker process, with leased claims
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from priority_queue import EmailTask, Priority, parse_priority
+from queue_policy import create_policy
+
+# Task states
+QUEUED = "queued"
+LEASED = "leased"
+PROCESSED = "processed"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_tasks (
+    email_id INTEGER PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    created_ts REAL NOT NULL,
+    state TEXT NOT NULL,
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    max_retries INTEGER NOT NULL DEFAULT 3,
+    lease_owner TEXT,
+    lease_expires REAL,
+    not_before REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_email_tasks_ready ON email_tasks (state, priority, created_ts);
+CREATE INDEX IF NOT EXISTS idx_email_tasks_lease ON email_tasks (state, lease_expires);
+"""
+
+TASK_COLUMNS = "email_id, priority, created_at, retry_count, max_retries"
+
+class SQLiteEmailQueue:
+    """EmailPriorityQueue interface over an SQLite table in WAL mode"""
+
+    def __init__(self, db_path: str, lease_seconds: float = 300.0, policy=None):
+        if sqlite3.sqlite_version_info < (3, 35, 0):
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} lacks UPDATE ... RETURNING (needs 3.35+)")
+
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        # Decides which priority level each claimed slot goes to
+        self.policy = policy or create_policy()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        # Autocommit; multi-statement changes open their own BEGIN IMMEDIATE transaction
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(email_tasks)")}
+        if "not_before" not in columns:
+            self._db.execute("ALTER TABLE email_tasks ADD COLUMN not_before REAL NOT NULL DEFAULT 0")
+
+    def __len__(self) -> int:
+        return self._scalar("SELECT COUNT(*) FROM email_tasks WHERE state = ?", (QUEUED,))
+
+    def __contains__(self, email_id: int) -> bool:
+        return bool(self._scalar(
+            "SELECT COUNT(*) FROM email_tasks WHERE email_id = ? AND state = ?", (email_id, QUEUED)
+        ))
+
+    def add_email(self, email_id: int, priority: str, created_at: datetime = None) -> bool:
+        """Add email to priority queue; re-adding a queued email only ever raises its priority"""
+        if created_at is None:
+            created_at = datetime.now()
+        priority_enum = parse_priority(priority)
+
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO email_tasks (email_id, priority, created_at, created_ts, state) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (email_id) DO UPDATE SET priority = excluded.priority "
+                "WHERE state = 'queued' AND priority > excluded.priority",
+                (email_id, priority_enum.value, created_at.isoformat(), created_at.timestamp(), QUEUED)
+            )
+            return cursor.rowcount > 0
+
+    def update_priority(self, email_id: int, priority: str) -> bool:
+        """Change the priority of a queued email"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE email_tasks SET priority = ? WHERE email_id = ? AND state = ?",
+                (parse_priority(priority).value, email_id, QUEUED)
+            )
+            return cursor.rowcount > 0
+
+    def remove(self, email_id: int) -> Optional[EmailTask]:
+        """Remove a queued email"""
+        with self._lock:
+            row = self._db.execute(
+                f"DELETE FROM email_tasks WHERE email_id = ? AND state = ? RETURNING {TASK_COLUMNS}",
+                (email_id, QUEUED)
+            ).fetchone()
+            return self._task(row) if row else None
+
+    def get_next_email(self) -> Optional[EmailTask]:
+        """Claim the next email to process (highest priority)"""
+        tasks = self.claim_batch(1)
+        return tasks[0] if tasks else None
+
+    def claim_batch(self, count: int, lease_seconds: Optional[float] = None) -> List[EmailTask]:
+        """Atomically lease up to count tasks in scheduling order; unacknowledged leases expire"""
+        now = time.time()
+        expires = now + (lease_seconds or self.lease_seconds)
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_leases(now)
+                heads, counts = self._heads(now)
+                order = self.policy.plan(heads, counts, count, now)
+
+                # One UPDATE ... RETURNING per level the policy picked
+                claimed: Dict[Priority, List[tuple]] = {}
+                for priority in dict.fromkeys(order):
+                    rows = self._db.execute(
+                        "UPDATE email_tasks SET state = ?, lease_owner = ?, lease_expires = ? "
+                        "WHERE email_id IN ("
+                        "  SELECT email_id FROM email_tasks WHERE state = ? AND priority = ? AND not_before <= ? "
+                        "  ORDER BY created_ts, email_id LIMIT ?"
+                        f") RETURNING {TASK_COLUMNS}, created_ts",
+                        (LEASED, self.owner, expires, QUEUED, priority.value, now, order.count(priority))
+                    ).fetchall()
+                    # RETURNING order is unspecified
+                    claimed[priority] = iter(sorted(rows, key=lambda row: (row[5], row[0])))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        tasks = []
+        for priority in order:
+            row = next(claimed[priority], None)
+            if row is not None:
+                tasks.append(self._task(row))
+        return tasks
+
+    def _heads(self, now: float):
+        """Oldest creation time and size of each level's eligible tasks"""
+        rows = self._db.execute(
+            "SELECT priority, MIN(created_ts), COUNT(*) FROM email_tasks "
+            "WHERE state = ? AND not_before <= ? GROUP BY priority",
+            (QUEUED, now)
+        ).fetchall()
+        heads = {Priority(priority): oldest for priority, oldest, _ in rows}
+        counts = {Priority(priority): size for priority, _, size in rows}
+        return heads, counts
+
+    def _expire_leases(self, now: float):
+        """Requeue tasks whose lease ran out, counting it as a failed attempt"""
+        self._db.execute(
+            "UPDATE email_tasks SET state = CASE WHEN retry_count + 1 >= max_retries THEN ? ELSE ? END, "
+            "retry_count = retry_count + 1, lease_owner = NULL, lease_expires = NULL "
+            "WHERE state = ? AND lease_expires < ?",
+            (FAILED, QUEUED, LEASED, now)
+        )
+
+    def peek(self, priority: Optional[Priority] = None) -> Optional[EmailTask]:
+        """Next email overall (or of one priority) without claiming it"""
+        now = time.time()
+        with self._lock:
+            if priority is None:
+                heads, _ = self._heads(now)
+                priority = self.policy.choose(heads, now)
+                if priority is None:
+                    return None
+            row = self._db.execute(
+                f"SELECT {TASK_COLUMNS} FROM email_tasks WHERE state = ? AND priority = ? AND not_before <= ? "
+                "ORDER BY created_ts, email_id LIMIT 1",
+                (QUEUED, priority.value, now)
+            ).fetchone()
+        return self._task(row) if row else None
+
+    def mark_processed(self, email_id: int) -> bool:
+        """Mark email as successfully processed"""
+        with self._lock:
+            self._upsert_state(email_id, PROCESSED)
+        return True
+
+    def mark_failed(self, email_id: int, retry: bool = True) -> bool:
+        """Mark email as failed, optionally retry"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT retry_count, max_retries FROM email_tasks WHERE email_id = ? AND state IN (?, ?)",
+                    (email_id, QUEUED, LEASED)
+                ).fetchone()
+                if retry and row and row[0] + 1 < row[1]:
+                    # Back off, then rejoin at the original priority
+                    eligible_at = time.time() + self.policy.retry_delay(row[0] + 1)
+                    self._db.execute(
+                        "UPDATE email_tasks SET state = ?, retry_count = retry_count + 1, not_before = ?, "
+                        "lease_owner = NULL, lease_expires = NULL WHERE email_id = ?",
+                        (QUEUED, eligible_at, email_id)
+                    )
+                else:
+                    self._upsert_state(email_id, FAILED)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return True
+
+    def _upsert_state(self, email_id: int, state: str):
+        """Record a terminal state, also for emails that were never queued"""
+        now = datetime.now()
+        self._db.execute(
+            "INSERT INTO email_tasks (email_id, priority, created_at, created_ts, state) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (email_id) DO UPDATE SET state = excluded.state, lease_owner = NULL, lease_expires = NULL",
+            (email_id, Priority.LOW.value, now.isoformat(), now.timestamp(), state)
+        )
+
+    def get_queue_status(self) -> Dict[str, Any]:
+        """Get current queue status (one scan of the state/priority index)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT state, priority, not_before > ?, COUNT(*) FROM email_tasks GROUP BY 1, 2, 3",
+                (time.time(),)
+            ).fetchall()
+
+        queued = {priority: 0 for priority in Priority}
+        by_state: Dict[str, int] = {}
+        retrying = 0
+        for state, priority, backing_off, count in rows:
+            if state == QUEUED and backing_off:
+                retrying += count
+            elif state == QUEUED:
+                queued[Priority(priority)] += count
+            else:
+                by_state[state] = by_state.get(state, 0) + count
+
+        return {
+            "total_pending": sum(queued.values()),
+            "urgent": queued[Priority.URGENT],
+            "high": queued[Priority.HIGH],
+            "normal": queued[Priority.NORMAL],
+            "low": queued[Priority.LOW],
+            "in_progress": by_state.get(LEASED, 0),
+            "retrying": retrying,
+            "processed": by_state.get(PROCESSED, 0),
+            "failed": by_state.get(FAILED, 0)
+        }
+
+    def clear_processed(self):
+        """Forget processed and failed emails"""
+        with self._lock:
+            self._db.execute("DELETE FROM email_tasks WHERE state IN (?, ?)", (PROCESSED, FAILED))
+
+    def get_urgent_emails(self, limit: Optional[int] = None) -> List[EmailTask]:
+        """Get urgent emails in the queue, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {TASK_COLUMNS} FROM email_tasks WHERE state = ? AND priority = ? "
+                "ORDER BY created_ts, email_id LIMIT ?",
+                (QUEUED, Priority.URGENT.value, -1 if limit is None else limit)
+            ).fetchall()
+        return [self._task(row) for row in rows]
+
+    def _scalar(self, query: str, params: tuple) -> int:
+        with self._lock:
+            return self._db.execute(query, params).fetchone()[0]
+
+    @staticmethod
+    def _task(row: tuple) -> EmailTask:
+        """EmailTask from a (email_id, priority, created_at, retry_count, max_retries, ...) row"""
+        return EmailTask(
+            email_id=row[0],
+            priority=Priority(row[1]),
+            created_at=datetime.fromisoformat(row[2]),
+            retry_count=row[3],
+            max_retries=row[4]
+        )
@@ -5,16 +5,27 @@ Handles email retrieval from various providers (Gmail, IMAP, Outlook)
 
 import imaplib
 import email
-import json
 import re
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import smtplib
 import os
 from dataclasses import dataclass
 
+from imap_parsing import PRESCREEN_HEADERS, chunked, decode_part, find_text_part, message_set, parse_fetch_response
+
+# Messages per FETCH command in bulk fetches
+EMAIL_FETCH_CHUNK_SIZE = int(os.getenv("EMAIL_FETCH_CHUNK_SIZE", "100"))
+# Bytes of each text/plain part to download (partial FETCH)
+EMAIL_MAX_BODY_BYTES = int(os.getenv("EMAIL_MAX_BODY_BYTES", "65536"))
+
+# Only mail whose subject mentions one of these is synced
+SUPPORT_KEYWORDS = ["support", "query", "request", "help", "issue", "problem"]
+
+HEADER_FETCH_ITEMS = f'(BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({PRESCREEN_HEADERS})])'
+
 @dataclass
 class EmailConfig:
     """Email configuration for different providers"""
@@ -97,78 +108,177 @@ class EmailService:
             except:
                 pass
     
+    def select_folder(self, folder: str = "INBOX") -> Dict[str, int]:
+        """Select a folder and return its UIDVALIDITY and UIDNEXT"""
+        status, _ = self.imap_connection.select(folder)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"cannot select {folder}")
+        
+        mailbox = {}
+        for code in ('UIDVALIDITY', 'UIDNEXT'):
+            _, data = self.imap_connection.response(code)
+            if data and data[-1]:
+                mailbox[code.lower()] = int(data[-1])
+        return mailbox
+    
     def search_emails(self, 
                      folder: str = "INBOX",
                      search_criteria: str = "ALL",
                      since_days: int = 7) -> List[str]:
-        """Search for emails matching criteria"""
+        """Search for emails matching criteria (returns UIDs)"""
         if not self.imap_connection:
             if not self.connect_imap():
                 return []
         
         try:
             # Select folder
-            self.imap_connection.select(folder)
+            self.select_folder(folder)
             
             # Calculate date for search
             since_date = (datetime.now() - timedelta(days=since_days)).strftime("%d-%b-%Y")
-            search_query = f"(SINCE {since_date})"
-            
-            # Add support-related keywords to search
-            support_keywords = ["support", "query", "request", "help", "issue", "problem"]
-            keyword_query = " OR ".join([f'SUBJECT "{keyword}"' for keyword in support_keywords])
-            search_query = f"({search_query}) AND ({keyword_query})"
-            
-            # Search for emails
-            status, messages = self.imap_connection.search(None, search_query)
-            
-            if status == 'OK':
-                return messages[0].split()
-            else:
-                return []
+            return self._uid_search(f"SINCE {since_date}")
                 
         except Exception as e:
             print(f"Email search failed: {e}")
             return []
     
+    def _uid_search(self, criteria: str) -> List[str]:
+        """UID SEARCH restricted to support-related subjects"""
+        status, messages = self.imap_connection.uid('SEARCH', self._search_query(criteria))
+        if status != 'OK' or not messages or not messages[0]:
+            return []
+        return [uid.decode() for uid in messages[0].split()]
+    
+    @staticmethod
+    def _search_query(criteria: str) -> str:
+        # IMAP OR is a prefix operator over exactly two keys
+        keyword_query = f'SUBJECT "{SUPPORT_KEYWORDS[-1]}"'
+        for keyword in reversed(SUPPORT_KEYWORDS[:-1]):
+            keyword_query = f'OR SUBJECT "{keyword}" {keyword_query}'
+        return f'{criteria} ({keyword_query})'
+    
     def fetch_email(self, email_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch a specific email by ID"""
+        """Fetch a specific email by UID"""
         if not self.imap_connection:
             if not self.connect_imap():
                 return None
         
         try:
             # Fetch email
-            status, msg_data = self.imap_connection.fetch(email_id, '(RFC822)')
+            email_id = email_id.decode() if isinstance(email_id, bytes) else str(email_id)
+            status, msg_data = self.imap_connection.uid('FETCH', email_id, '(RFC822)')
             
-            if status != 'OK':
+            if status != 'OK' or not msg_data or not isinstance(msg_data[0], tuple):
                 return None
             
-            # Parse email
-            raw_email = msg_data[0][1]
-            email_message = email.message_from_bytes(raw_email)
-            
-            # Extract email data
-            email_data = {
-                'id': email_id.decode(),
-                'sender': self._extract_sender(email_message),
-                'subject': self._extract_subject(email_message),
-                'body': self._extract_body(email_message),
-                'date': self._extract_date(email_message),
-                'raw_message': raw_email.decode('utf-8', errors='ignore')
-            }
-            
-            return email_data
+            return self._parse_email(email_id, msg_data[0][1])
             
         except Exception as e:
             print(f"Email fetch failed: {e}")
             return None
     
+    def _parse_email(self, email_id: str, raw_email: bytes) -> Dict[str, Any]:
+        """Email data from a full RFC822 message"""
+        email_message = email.message_from_bytes(raw_email)
+        return {
+            'id': email_id,
+            'sender': self._extract_sender(email_message),
+            'subject': self._extract_subject(email_message),
+            'body': self._extract_body(email_message),
+            'date': self._extract_date(email_message),
+            'message_id': (email_message.get('Message-ID') or '').strip(),
+            'raw_message': raw_email.decode('utf-8', errors='ignore')
+        }
+    
+    def fetch_headers(self, email_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Fetch only the headers used for de-duplication, plus the MIME structure, in bulk"""
+        if not self.imap_connection:
+            if not self.connect_imap():
+                return []
+        
+        headers = []
+        for chunk in chunked(list(email_ids), EMAIL_FETCH_CHUNK_SIZE):
+            try:
+                headers.extend(self._fetch_header_chunk(chunk))
+            except Exception as e:
+                print(f"Email header fetch failed: {e}")
+        
+        return headers
+    
+    def _fetch_header_chunk(self, uids: List[Any]) -> List[Dict[str, Any]]:
+        status, msg_data = self.imap_connection.uid('FETCH', message_set(uids), HEADER_FETCH_ITEMS)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"UID FETCH returned {status}")
+        return self._parse_headers(msg_data)
+    
+    def _parse_headers(self, msg_data: List[Any]) -> List[Dict[str, Any]]:
+        """Header dicts (ordered by UID) from a header pre-screen FETCH response"""
+        headers = []
+        # UID FETCH responses always carry the UID item
+        for fields in sorted(parse_fetch_response(msg_data).values(), key=lambda fields: fields.get('UID', 0)):
+            if 'UID' not in fields:
+                continue
+            header_bytes = next((value for key, value in fields.items() if key.startswith('BODY[HEADER')), b'')
+            email_message = email.message_from_bytes(bytes(header_bytes or b''))
+            headers.append({
+                'id': str(fields['UID']),
+                'sender': self._extract_sender(email_message),
+                'subject': self._extract_subject(email_message),
+                'date': self._extract_date(email_message),
+                'message_id': (email_message.get('Message-ID') or '').strip(),
+                'text_part': find_text_part(fields.get('BODYSTRUCTURE'))
+            })
+        return headers
+    
+    def fetch_bodies(self, headers: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Fetch the text/plain part of each message, one UID FETCH per MIME section and chunk; failed ones are left out"""
+        bodies = {}
+        for section, group in self._body_sections(headers).items():
+            for chunk in chunked(group, EMAIL_FETCH_CHUNK_SIZE):
+                try:
+                    status, msg_data = self.imap_connection.uid(
+                        'FETCH',
+                        message_set(header['id'] for header in chunk),
+                        f'(BODY.PEEK[{section}]<0.{EMAIL_MAX_BODY_BYTES}>)'
+                    )
+                    if status != 'OK':
+                        continue
+                except Exception as e:
+                    print(f"Email body fetch failed: {e}")
+                    continue
+                
+                bodies.update(self._parse_bodies(msg_data, chunk, section))
+        
+        return bodies
+    
+    @staticmethod
+    def _body_sections(headers: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Messages grouped by the MIME section of their text/plain part"""
+        by_section: Dict[str, List[Dict[str, Any]]] = {}
+        for header in headers:
+            if header.get('text_part'):
+                by_section.setdefault(header['text_part'][0], []).append(header)
+        return by_section
+    
+    @staticmethod
+    def _parse_bodies(msg_data: List[Any], chunk: List[Dict[str, Any]], section: str) -> Dict[str, str]:
+        """Decoded text bodies by UID from a partial BODY[section] FETCH response"""
+        parts = {str(fields.get('UID')): fields for fields in parse_fetch_response(msg_data).values()}
+        bodies = {}
+        for header in chunk:
+            data = parts.get(header['id'], {}).get(f'BODY[{section}]')
+            if data is None:
+                continue
+            _, encoding, charset = header['text_part']
+            bodies[header['id']] = decode_part(bytes(data or b''), encoding, charset)
+        return bodies
+    
     def fetch_emails(self, 
                     folder: str = "INBOX",
                     since_days: int = 7,
-                    limit: int = 50) -> List[Dict[str, Any]]:
-        """Fetch multiple emails"""
+                    limit: int = 50,
+                    screen: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """Fetch multiple emails: headers first, then text bodies only for messages that are kept"""
         email_ids = self.search_emails(folder, since_days=since_days)
         
         if not email_ids:
@@ -177,14 +287,116 @@ class EmailService:
         # Limit results
         email_ids = email_ids[:limit]
         
+        emails, _ = self._download(self.fetch_headers(email_ids), screen)
+        return emails
+    
+    def sync_folder(self,
+                    folder: str = "INBOX",
+                    uid_validity: Optional[int] = None,
+                    last_uid: int = 0,
+                    since_days: int = 7,
+                    limit: int = 50,
+                    screen: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
+        """Fetch mail that arrived after last_uid; returns the emails and the folder's new high-water mark"""
+        if not self.imap_connection:
+            if not self.connect_imap():
+                return None
+        
+        try:
+            mailbox = self.select_folder(folder)
+            current_validity = mailbox.get('uidvalidity')
+            
+            if uid_validity is None or current_validity != uid_validity:
+                last_uid = 0
+            uids = self._uid_search(self._sync_criteria(last_uid, since_days))
+        except Exception as e:
+            print(f"Email sync search failed: {e}")
+            return None
+        
+        batch, high_water, more = self._plan_sync(uids, last_uid, mailbox, limit)
+        
+        headers = []
+        for chunk in chunked(batch, EMAIL_FETCH_CHUNK_SIZE):
+            try:
+                headers.extend(self._fetch_header_chunk(chunk))
+            except Exception as e:
+                # Don't move the mark past mail that wasn't fetched
+                print(f"Email header fetch failed: {e}")
+                high_water = chunk[0] - 1
+                more = True
+                break
+        
+        emails, failed_from = self._download(headers, screen)
+        if failed_from is not None:
+            emails, high_water, more = self._stop_before(emails, failed_from, high_water)
+        
+        return {
+            'uid_validity': current_validity,
+            'last_uid': high_water,
+            'more': more,
+            'emails': emails
+        }
+    
+    @staticmethod
+    def _sync_criteria(last_uid: int, since_days: int) -> str:
+        """Search key for mail after last_uid (0 = first sync or the server renumbered the folder)"""
+        if last_uid:
+            return f"UID {last_uid + 1}:*"
+        since_date = (datetime.now() - timedelta(days=since_days)).strftime("%d-%b-%Y")
+        return f"SINCE {since_date}"
+    
+    @staticmethod
+    def _plan_sync(uids: List[Any], last_uid: int, mailbox: Dict[str, int], limit: int):
+        """UIDs to fetch now, the high-water mark once they are stored, and whether more are waiting"""
+        # "n:*" still matches the newest message when nothing is newer than n
+        uids = sorted(int(uid) for uid in uids if int(uid) > last_uid)
+        batch = uids[:limit]
+        if len(uids) > limit:
+            # The rest is picked up by the next sync
+            return batch, batch[-1], True
+        return batch, max([last_uid, mailbox.get('uidnext', 1) - 1] + batch), False
+    
+    @staticmethod
+    def _stop_before(emails: List[Dict[str, Any]], failed_uid: int, high_water: int):
+        """Keep only mail below a UID whose body wasn't fetched, so the next sync starts there"""
+        emails = [email_data for email_data in emails if int(email_data['id']) < failed_uid]
+        return emails, min(high_water, failed_uid - 1), True
+    
+    def _download(self, headers: List[Dict[str, Any]], screen=None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Drop duplicate and screened-out headers, then fetch the text bodies of the rest"""
+        emails = self._screen(headers, screen)
+        return self._attach_bodies(emails, self.fetch_bodies(emails))
+    
+    @staticmethod
+    def _screen(headers: List[Dict[str, Any]], screen=None) -> List[Dict[str, Any]]:
         emails = []
-        for email_id in email_ids:
-            email_data = self.fetch_email(email_id)
-            if email_data:
-                emails.append(email_data)
+        seen_message_ids = set()
+        for header in headers:
+            message_id = header['message_id']
+            if message_id and message_id in seen_message_ids:
+                continue
+            seen_message_ids.add(message_id)
+            emails.append(header)
         
+        # Pre-screen on headers so known mail never has its body downloaded
+        if screen and emails:
+            emails = screen(emails)
         return emails
     
+    @staticmethod
+    def _attach_bodies(emails: List[Dict[str, Any]], bodies: Dict[str, str]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Emails with their text bodies, and the lowest UID whose body fetch failed (those are dropped)"""
+        kept, failed = [], []
+        for email_data in emails:
+            text_part = email_data.pop('text_part', None)
+            if text_part and email_data['id'] not in bodies:
+                failed.append(int(email_data['id']))
+                continue
+            # No text/plain part (e.g. HTML only): nothing to fetch
+            email_data['body'] = bodies.get(email_data['id'], '')
+            kept.append(email_data)
+        return kept, min(failed) if failed else None
+    
     def send_email(self, 
                   to_email: str,
                   subject: str,
@@ -196,20 +408,8 @@ class EmailService:
                 return False
         
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.config.username
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            if reply_to:
-                msg['Reply-To'] = reply_to
-            
-            # Add body
-            msg.attach(MIMEText(body, 'plain'))
-            
             # Send email
-            text = msg.as_string()
+            text = self._build_message(to_email, subject, body, reply_to)
             self.smtp_connection.sendmail(
                 self.config.username, 
                 to_email, 
@@ -222,6 +422,19 @@ class EmailService:
             print(f"Email send failed: {e}")
             return False
     
+    def _build_message(self, to_email: str, subject: str, body: str, reply_to: Optional[str] = None) -> str:
+        """Plain-text reply as an RFC 5322 message string"""
+        msg = MIMEMultipart()
+        msg['From'] = self.config.username
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        if reply_to:
+            msg['Reply-To'] = reply_to
+        
+        msg.attach(MIMEText(body, 'plain'))
+        return msg.as_string()
+    
     def _extract_sender(self, email_message) -> str:
         """Extract sender email address"""
         sender = email_message.get('From', '')
@@ -291,8 +504,8 @@ OUTLOOK_CONFIG = EmailConfig(
     use_ssl=True
 )
 
-def get_email_service(provider: str = "gmail") -> EmailService:
-    """Get email service for specified provider"""
+def get_email_config(provider: str = "gmail") -> EmailConfig:
+    """Provider configuration with credentials from the environment"""
     if provider.lower() == "gmail":
         config = GMAIL_CONFIG
         config.username = os.getenv("GMAIL_USERNAME", "")
@@ -304,7 +517,11 @@ def get_email_service(provider: str = "gmail") -> EmailService:
     else:
         raise ValueError(f"Unsupported email provider: {provider}")
     
-    return EmailService(config)
+    return config
+
+def get_email_service(provider: str = "gmail") -> EmailService:
+    """Get email service for specified provider"""
+    return EmailService(get_email_config(provider))
 
 
 
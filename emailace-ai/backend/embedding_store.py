@@ -0,0 +1,100 @@
+"""
+Embedding Store for EmailAce AI
+Persists knowledge base vectors as a memory-mappable .npy file plus a JSON sidecar
+"""
+
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+def content_hash(text: str) -> str:
+    """Stable hash of the text an embedding was computed from"""
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+def rows_fingerprint(hashes: List[str]) -> str:
+    """Hash of an ordered list of content hashes, identifying one layout of stored rows"""
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()
+
+class EmbeddingStore:
+    """On-disk float32 vectors keyed by content hash, valid for one embedding model"""
+
+    def __init__(self, path: str, model_name: str):
+        # path is a prefix: metadata goes to <path>.json, vectors to <path>.<digest>.npy
+        self.path = path
+        self.model_name = model_name
+
+    @property
+    def metadata_path(self) -> str:
+        return f"{self.path}.json"
+
+    def load(self) -> Tuple[List[str], Optional[np.ndarray]]:
+        """Load content hashes and a read-only memory map of their vectors"""
+        if not os.path.exists(self.metadata_path):
+            return [], None
+
+        try:
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+
+            if metadata.get("model") != self.model_name:
+                print(f"Embedding store {self.path} was built with {metadata.get('model')}, ignoring it")
+                return [], None
+
+            # Pages are shared between every process that maps the same file
+            vectors_path = os.path.join(os.path.dirname(self.metadata_path), metadata["vectors"])
+            vectors = np.load(vectors_path, mmap_mode="r")
+            hashes = metadata["hashes"]
+            if vectors.dtype != np.float32 or vectors.ndim != 2 or len(vectors) != len(hashes):
+                print(f"Embedding store {self.path} is inconsistent, ignoring it")
+                return [], None
+
+            return hashes, vectors
+
+        except Exception as e:
+            print(f"Failed to load embedding store: {e}")
+            return [], None
+
+    def save(self, hashes: List[str], vectors: np.ndarray):
+        """Write a new vectors file, then switch the metadata to it in one atomic rename"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # A fresh file name per content, so processes mapping the old file are unaffected
+            generation = rows_fingerprint(hashes)[:16]
+            vectors_path = f"{self.path}.{generation}.npy"
+            with open(f"{vectors_path}.tmp", 'wb') as f:
+                np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+
+            previous = self._current_vectors_file()
+            with open(f"{self.metadata_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({
+                    "model": self.model_name,
+                    "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+                    "vectors": os.path.basename(vectors_path),
+                    "hashes": hashes
+                }, f)
+            os.replace(f"{self.metadata_path}.tmp", self.metadata_path)
+
+            # Existing memory maps keep the old data alive until they are closed
+            if previous and previous != os.path.basename(vectors_path):
+                try:
+                    os.remove(os.path.join(os.path.dirname(self.metadata_path), previous))
+                except OSError:
+                    pass
+
+        except Exception as e:
+            print(f"Failed to save embedding store: {e}")
+
+    def _current_vectors_file(self) -> Optional[str]:
+        """Name of the vectors file the metadata currently points to"""
+        try:
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("vectors")
+        except Exception:
+            return None
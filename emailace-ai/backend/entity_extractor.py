@@ -0,0 +1,80 @@
+"""
+Entity Extractor for EmailAce AI
+Extracts every registered entity type in a single regex pass over the text
+"""
+
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+class EntityExtractor:
+    """Registry of entity patterns compiled into one named-group alternation"""
+
+    def __init__(self, patterns: Optional[Dict[str, str]] = None):
+        self._patterns: Dict[str, str] = {}
+        self._compiled: Optional[Pattern] = None
+        # Per type, the group holding the entity value in the combined pattern
+        self._value_groups: Dict[str, int] = {}
+
+        for entity_type, pattern in (patterns or {}).items():
+            self.register(entity_type, pattern)
+
+    def register(self, entity_type: str, pattern: str):
+        """Register (or replace) an entity type
+
+        Patterns must not define named groups. One unnamed group may mark the value to return
+        (e.g. only the ID after "Order #"); without one the whole match is returned.
+        """
+        if not entity_type.isidentifier():
+            raise ValueError(f"Invalid entity type name: {entity_type}")
+
+        try:
+            own = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern for entity type '{entity_type}': {e}")
+        if own.groupindex or own.groups > 1:
+            raise ValueError(f"Pattern for entity type '{entity_type}' may only define one unnamed group")
+
+        patterns = dict(self._patterns)
+        patterns[entity_type] = pattern
+        self._patterns = patterns
+        self._compiled, self._value_groups = self._compile(patterns)
+
+    def unregister(self, entity_type: str):
+        """Remove an entity type"""
+        patterns = dict(self._patterns)
+        patterns.pop(entity_type, None)
+        self._patterns = patterns
+        self._compiled, self._value_groups = self._compile(patterns) if patterns else (None, {})
+
+    @property
+    def entity_types(self) -> List[str]:
+        """Registered entity types, in matching precedence order"""
+        return list(self._patterns)
+
+    @staticmethod
+    def _compile(patterns: Dict[str, str]) -> Tuple[Pattern, Dict[str, int]]:
+        """Combine all patterns into one alternation with a named group per type"""
+        compiled = re.compile("|".join(
+            f"(?P<{entity_type}>{pattern})" for entity_type, pattern in patterns.items()
+        ))
+
+        # A type's own group (if any) directly follows its named group
+        value_groups = {}
+        for entity_type, pattern in patterns.items():
+            index = compiled.groupindex[entity_type]
+            value_groups[entity_type] = index + 1 if re.compile(pattern).groups else index
+        return compiled, value_groups
+
+    def extract(self, text: str) -> Dict[str, List[str]]:
+        """Extract entities, grouped by type, in order of first appearance"""
+        compiled = self._compiled
+        if compiled is None:
+            return {}
+
+        # Matches never overlap: where types compete, the earliest registered wins
+        found: Dict[str, Dict[str, None]] = {}
+        for match in compiled.finditer(text):
+            entity_type = match.lastgroup
+            found.setdefault(entity_type, {})[match.group(self._value_groups[entity_type])] = None
+
+        return {entity_type: list(values) for entity_type, values in found.items()}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Export and verify optimized inference backends for EmailAce AI
+Builds the int8 / ONNX models once and checks them against the PyTorch labels
+"""
+
+import argparse
+import sys
+import time
+
+from inference_backends import PYTORCH, INT8, ONNX
+from ai_processor import load_sentiment_pipeline, load_summarization_pipeline
+
+# Representative support emails used for the parity check
+PARITY_TEXTS = [
+    "Hi team, our production server has been down for the past 2 hours. This is critical and affecting all our customers. We need immediate assistance.",
+    "I just wanted to take a moment to express my gratitude for the outstanding service your team provided last week. The project was delivered on time.",
+    "A new security update is available for your software. This update addresses critical vulnerabilities and should be installed within the next 48 hours.",
+    "Hi there, I'd like to schedule a meeting to discuss our upcoming collaboration project. I'm available on Tuesday and Thursday between 2-4 PM.",
+    "I'm very disappointed with the quality of the product I received. It doesn't match the description on your website and arrived damaged.",
+    "Please be advised that we will be implementing new workplace policies starting next month. All employees must review the new handbook by Friday.",
+    "My payment failed three times and I was still charged. I want a refund immediately, this is unacceptable.",
+    "I can't log in to my account after the password reset. Could you help me regain access?",
+    "Your API keeps returning 500 errors on the orders endpoint since this morning. Our integration is completely blocked.",
+    "Thanks so much for adding the export feature, it works great and saves us hours every week!",
+]
+
+def _labels(analyzer, texts):
+    """Top sentiment label per text"""
+    results = analyzer(texts, batch_size=len(texts), truncation=True)
+    return [max(scores, key=lambda x: x["score"])["label"] for scores in results]
+
+def _overlap(reference: str, candidate: str) -> float:
+    """Unigram F1 between two summaries"""
+    ref, cand = set(reference.lower().split()), set(candidate.lower().split())
+    if not ref or not cand:
+        return 0.0
+    common = len(ref & cand)
+    if not common:
+        return 0.0
+    precision, recall = common / len(cand), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+def _timed(func, *args, **kwargs):
+    """Run a function and return (result, seconds per text)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) / len(PARITY_TEXTS)
+
+def check_parity(backend: str, threshold: float) -> bool:
+    """Export the backend (if needed) and compare it with eager PyTorch"""
+    if backend == ONNX:
+        try:
+            import optimum.onnxruntime  # noqa: F401
+        except ImportError:
+            print("❌ ONNX backend needs: pip install optimum[onnxruntime]")
+            return False
+
+    print(f"🔄 Loading {PYTORCH} and {backend} pipelines...")
+    reference_sentiment, _ = load_sentiment_pipeline(PYTORCH)
+    candidate_sentiment, sentiment_backend = load_sentiment_pipeline(backend)
+    reference_summarizer, _ = load_summarization_pipeline(PYTORCH)
+    candidate_summarizer, summarizer_backend = load_summarization_pipeline(backend)
+    if sentiment_backend != backend or summarizer_backend != backend:
+        print(f"❌ {backend} pipelines fell back to {sentiment_backend}/{summarizer_backend}; nothing to compare")
+        return False
+
+    # Warm both paths once so timings exclude lazy initialisation
+    _labels(reference_sentiment, PARITY_TEXTS[:1])
+    _labels(candidate_sentiment, PARITY_TEXTS[:1])
+
+    reference_labels, reference_time = _timed(_labels, reference_sentiment, PARITY_TEXTS)
+    candidate_labels, candidate_time = _timed(_labels, candidate_sentiment, PARITY_TEXTS)
+    agreement = sum(a == b for a, b in zip(reference_labels, candidate_labels)) / len(PARITY_TEXTS)
+
+    summary_kwargs = {"max_length": 100, "min_length": 30, "truncation": True}
+    reference_summaries, reference_sum_time = _timed(reference_summarizer, PARITY_TEXTS, **summary_kwargs)
+    candidate_summaries, candidate_sum_time = _timed(candidate_summarizer, PARITY_TEXTS, **summary_kwargs)
+    overlap = sum(
+        _overlap(a["summary_text"], b["summary_text"])
+        for a, b in zip(reference_summaries, candidate_summaries)
+    ) / len(PARITY_TEXTS)
+
+    print(f"📊 Sentiment label agreement: {agreement:.0%} "
+          f"({reference_time * 1000:.1f} ms → {candidate_time * 1000:.1f} ms per email)")
+    print(f"📊 Summary word overlap: {overlap:.0%} "
+          f"({reference_sum_time * 1000:.1f} ms → {candidate_sum_time * 1000:.1f} ms per email)")
+
+    for text, expected, actual in zip(PARITY_TEXTS, reference_labels, candidate_labels):
+        if expected != actual:
+            print(f"   ⚠️  {expected} → {actual}: {text[:60]}...")
+
+    if agreement < threshold:
+        print(f"❌ {backend} backend is below the {threshold:.0%} parity threshold")
+        return False
+
+    print(f"✅ {backend} backend matches PyTorch labels; set AI_INFERENCE_BACKEND={backend}")
+    return True
+
+def main():
+    """Export a backend and run the accuracy parity check"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=[INT8, ONNX], default=ONNX)
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="minimum sentiment label agreement with PyTorch")
+    args = parser.parse_args()
+
+    if not check_parity(args.backend, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+IMAP Response Parsing for EmailAce AI
+Parses FETCH responses and BODYSTRUCTURE so only headers and text parts need to be downloaded
+"""
+
+import base64
+import quopri
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Header fields fetched to pre-screen messages before downloading any body
+PRESCREEN_HEADERS = "FROM SUBJECT DATE MESSAGE-ID"
+
+class Literal(bytes):
+    """A {n}-prefixed literal from an IMAP response"""
+
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}|([^\s()"\[]+(?:\[[^\]]*\](?:<\d+>)?)?))')
+
+def message_set(ids: Iterable[Union[int, bytes, str]]) -> str:
+    """Compress message numbers / UIDs into an IMAP set such as "1:5,8,10:12" """
+    numbers = sorted({int(i) for i in ids})
+    ranges = []
+    start = prev = None
+    for number in numbers:
+        if start is None:
+            start = prev = number
+        elif number == prev + 1:
+            prev = number
+        else:
+            ranges.append(f"{start}:{prev}" if prev != start else str(start))
+            start = prev = number
+    if start is not None:
+        ranges.append(f"{start}:{prev}" if prev != start else str(start))
+    return ",".join(ranges)
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _parse(data: bytes, literals: List[bytes], pos: int = 0) -> Tuple[List[Any], int]:
+    """Parse a parenthesized IMAP list starting after its "(" """
+    items: List[Any] = []
+    while pos < len(data):
+        match = _TOKEN.match(data, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        open_paren, close_paren, quoted, literal, atom = match.groups()
+        if open_paren:
+            value, pos = _parse(data, literals, pos)
+            items.append(value)
+        elif close_paren:
+            return items, pos
+        elif quoted is not None:
+            items.append(re.sub(rb'\\(.)', rb'\1', quoted).decode("utf-8", errors="ignore"))
+        elif literal is not None:
+            items.append(Literal(literals.pop(0)) if literals else Literal(b""))
+        elif atom.upper() == b"NIL":
+            items.append(None)
+        elif atom.isdigit():
+            items.append(int(atom))
+        else:
+            items.append(atom.decode("utf-8", errors="ignore"))
+    return items, pos
+
+def parse_fetch_response(response: List[Any]) -> Dict[int, Dict[str, Any]]:
+    """Turn imaplib FETCH output into {message number: {ITEM: value}}"""
+    messages: Dict[int, Dict[str, Any]] = {}
+    buffer, literals = b"", []
+
+    def flush():
+        nonlocal buffer, literals
+        match = re.match(rb'\s*(\d+)\s+\(', buffer)
+        if match:
+            items, _ = _parse(buffer, literals, match.end())
+            fields = messages.setdefault(int(match.group(1)), {})
+            for key, value in zip(items[::2], items[1::2]):
+                # Partial fetches come back as BODY[1]<0>
+                fields[re.sub(r'<\d+>$', '', str(key)).upper()] = value
+        buffer, literals = b"", []
+
+    for part in response:
+        if isinstance(part, tuple):
+            # (b'1 (... BODY[...] {123}', b'<123 bytes>')
+            if buffer and re.match(rb'\s*\d+\s+\(', part[0]):
+                flush()
+            buffer += part[0]
+            literals.append(part[1])
+        elif isinstance(part, bytes):
+            if re.match(rb'\s*\d+\s+\(', part) and buffer:
+                flush()
+            buffer += part
+    if buffer:
+        flush()
+    return messages
+
+def find_text_part(structure: Any, section: str = "") -> Optional[Tuple[str, str, str]]:
+    """(section, transfer encoding, charset) of the first non-attachment text/plain part"""
+    if not isinstance(structure, list) or not structure:
+        return None
+
+    # multipart: (part part ... "SUBTYPE" ...)
+    if isinstance(structure[0], list):
+        for index, part in enumerate(structure, start=1):
+            if not isinstance(part, list):
+                break
+            found = find_text_part(part, f"{section}.{index}" if section else str(index))
+            if found:
+                return found
+        return None
+
+    media_type = str(structure[0] or "").lower()
+    subtype = str(structure[1] or "").lower() if len(structure) > 1 else ""
+    if media_type != "text" or subtype != "plain":
+        return None
+
+    # body-type-text: type subtype params id desc encoding size lines [md5 disposition ...]
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+        return None
+
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = "utf-8"
+    for key, value in zip(params[::2], params[1::2]):
+        if str(key).lower() == "charset" and value:
+            charset = str(value)
+    encoding = str(structure[5] or "7bit").lower() if len(structure) > 5 else "7bit"
+    # A non-multipart message's body is part 1
+    return section or "1", encoding, charset
+
+def decode_part(data: bytes, encoding: str, charset: str) -> str:
+    """Decode a fetched body part (possibly cut short by a partial fetch)"""
+    if encoding == "base64":
+        compact = re.sub(rb'\s+', b'', data)
+        data = base64.b64decode(compact[:len(compact) - len(compact) % 4] or b"")
+    elif encoding == "quoted-printable":
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset, errors="ignore")
+    except LookupError:
+        return data.decode("utf-8", errors="ignore")
@@ -0,0 +1,83 @@
+"""
+Inference Backends for EmailAce AI
+Builds transformer pipelines on eager PyTorch, int8-quantized PyTorch or ONNX Runtime
+"""
+
+import os
+from typing import Any, Tuple
+
+PYTORCH = "pytorch"
+INT8 = "int8"
+ONNX = "onnx"
+BACKENDS = (PYTORCH, INT8, ONNX)
+
+# Selected backend and where exported ONNX models are cached
+INFERENCE_BACKEND = os.getenv("AI_INFERENCE_BACKEND", PYTORCH).lower()
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./models/onnx")
+
+# Model classes per pipeline task
+_TASK_MODELS = {
+    "sentiment-analysis": ("AutoModelForSequenceClassification", "ORTModelForSequenceClassification"),
+    "summarization": ("AutoModelForSeq2SeqLM", "ORTModelForSeq2SeqLM"),
+}
+
+def get_backend() -> str:
+    """Get the configured backend, falling back to PyTorch for unknown values"""
+    if INFERENCE_BACKEND not in BACKENDS:
+        print(f"Unknown inference backend '{INFERENCE_BACKEND}', using {PYTORCH}")
+        return PYTORCH
+    return INFERENCE_BACKEND
+
+def onnx_model_dir(model_id: str) -> str:
+    """Directory an exported ONNX model is cached in"""
+    return os.path.join(ONNX_CACHE_DIR, model_id.replace("/", "__"))
+
+def load_pipeline(task: str, model_id: str, backend: str = PYTORCH, **pipeline_kwargs) -> Tuple[Any, str]:
+    """Build a pipeline for a task; returns it with the backend it actually runs on"""
+    from transformers import pipeline
+
+    if backend == INT8:
+        model, tokenizer = _load_int8(task, model_id)
+        return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs), INT8
+
+    if backend == ONNX:
+        try:
+            model, tokenizer = _load_onnx(task, model_id)
+            return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs), ONNX
+        except ImportError as e:
+            print(f"ONNX Runtime backend unavailable ({e}), using {PYTORCH}")
+
+    return pipeline(task, model=model_id, **pipeline_kwargs), PYTORCH
+
+def _load_int8(task: str, model_id: str):
+    """Load a PyTorch model with Linear layers dynamically quantized to int8"""
+    import torch
+    import transformers
+
+    model_class = getattr(transformers, _TASK_MODELS[task][0])
+    model = model_class.from_pretrained(model_id)
+    model.eval()
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_id)
+    return quantized, tokenizer
+
+def _load_onnx(task: str, model_id: str):
+    """Load an ONNX Runtime model, exporting and caching it on first use"""
+    import optimum.onnxruntime
+    from transformers import AutoTokenizer
+
+    model_class = getattr(optimum.onnxruntime, _TASK_MODELS[task][1])
+    model_dir = onnx_model_dir(model_id)
+
+    if os.path.isdir(model_dir):
+        model = model_class.from_pretrained(model_dir)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    else:
+        model = model_class.from_pretrained(model_id, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        os.makedirs(model_dir, exist_ok=True)
+        model.save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+        print(f"Exported {model_id} to ONNX at {model_dir}")
+
+    return model, tokenizer
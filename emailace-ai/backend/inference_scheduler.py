@@ -0,0 +1,110 @@
+"""
+Inference Scheduler for EmailAce AI
+Groups concurrent AI requests into micro-batches and runs them off the event loop
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+class InferenceScheduler:
+    """Dynamic micro-batching front end for AIProcessor.process_emails"""
+
+    def __init__(self, processor, max_batch_size: int = 32, max_wait_ms: float = 10):
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        # Models are driven from a single dedicated thread
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """Start the batch collector on the running event loop"""
+        if self._collector is not None and not self._collector.done():
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Stop the collector and fail any requests still waiting"""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, body: str, subject: str = "") -> Dict[str, Any]:
+        """Process one email; resolves once its micro-batch has run"""
+        return (await self.submit_many([{"body": body, "subject": subject}]))[0]
+
+    async def submit_many(self, emails: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Process many emails, letting the collector batch them with other requests"""
+        if not emails:
+            return []
+        self.start()
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for email in emails:
+            future = loop.create_future()
+            self._queue.put_nowait((email, future))
+            futures.append(future)
+
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self):
+        """Gather requests until the batch is full or max wait has passed, then run it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[Dict[str, str], asyncio.Future]] = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Drop requests whose callers have gone away
+            batch = [(email, future) for email, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            # New requests keep queueing while this batch runs, so the next one is larger
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    self.processor.process_emails,
+                    [email for email, _ in batch]
+                )
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,100 @@
+"""
+Knowledge Base Reloader for EmailAce AI
+Rebuilds the knowledge base from its JSON file in the background and swaps it in atomically
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from knowledge_base import KB_FILE, KnowledgeBase, get_knowledge_base, set_knowledge_base
+
+# Seconds between checks of KB_FILE for changes (0 disables the watcher)
+KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "5"))
+
+class KnowledgeBaseReloader:
+    """Reloads a knowledge base file, re-embedding only entries whose content changed"""
+
+    def __init__(self, file_path: str, interval: float = 5.0):
+        self.file_path = file_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._mtime = self._file_mtime()
+        self.last_reload: Dict[str, Any] = {}
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.file_path).st_mtime if self.file_path else None
+        except OSError:
+            return None
+
+    def reload(self) -> Dict[str, Any]:
+        """Build a new knowledge base off to the side, then swap it in"""
+        if not self.file_path or not os.path.exists(self.file_path):
+            raise FileNotFoundError(f"Knowledge base file not found: {self.file_path or '(KB_FILE not set)'}")
+
+        # One rebuild at a time; searches never wait on this lock
+        with self._lock:
+            start = time.perf_counter()
+            self._mtime = self._file_mtime()
+            previous = get_knowledge_base()
+
+            # Parse first so a broken file leaves the current knowledge base in place
+            KnowledgeBase.read_entries(self.file_path)
+
+            kb = KnowledgeBase(previous.model_name)
+            kb.share_query_cache(previous)
+            reused = kb.load_from_file(self.file_path, previous=previous)
+            # Encode changed entries and build the index before anyone can search it
+            kb.warm_up()
+            set_knowledge_base(kb)
+
+            self.last_reload = {
+                "entries": len(kb.entries),
+                "reused_embeddings": reused,
+                "seconds": round(time.perf_counter() - start, 3),
+                "reloaded_at": time.time()
+            }
+            print(f"🔄 Reloaded knowledge base: {self.last_reload['entries']} entries, "
+                  f"{reused} embeddings reused")
+            return self.last_reload
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last load"""
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        try:
+            self.reload()
+            return True
+        except Exception as e:
+            print(f"Knowledge base reload error: {e}")
+            # Don't retry a broken file until it changes again
+            self._mtime = mtime
+            return False
+
+    def start(self):
+        """Start polling the knowledge base file in a daemon thread"""
+        if not self.file_path or self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-reloader", daemon=True)
+        self._thread.start()
+        print(f"👀 Watching {self.file_path} for knowledge base changes")
+
+    def stop(self):
+        """Stop the watcher thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+# Global knowledge base reloader instance
+kb_reloader = KnowledgeBaseReloader(KB_FILE, KB_RELOAD_INTERVAL)
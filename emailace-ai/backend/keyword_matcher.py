@@ -0,0 +1,86 @@
+"""
+Keyword Matcher for EmailAce AI
+One compiled regular expression that finds every categorised keyword in a single pass over the text
+"""
+
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Category -> distinct keywords found in the text
+KeywordHits = Dict[str, Set[str]]
+
+class KeywordMatcher:
+    """Multi-pattern, case-insensitive keyword matcher"""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], word_boundaries: bool = False):
+        self.word_boundaries = word_boundaries
+        # Keyword -> categories it belongs to
+        self._categories: Dict[str, List[str]] = {}
+        for category, words in keywords.items():
+            for word in words:
+                categories = self._categories.setdefault(word.lower(), [])
+                if category not in categories:
+                    categories.append(category)
+
+        # Keywords share prefixes in a trie-shaped pattern, so a position that starts no keyword fails
+        # on its first character; the lookahead lets matches overlap, e.g. "time" inside "downtime"
+        words = list(self._categories)
+        self._pattern = re.compile("(?=(" + self._trie_pattern(words) + "))") if words else None
+
+        # Shorter keywords that also match wherever a keyword matches (its prefixes)
+        self._matches: Dict[str, List[Tuple[str, str]]] = {
+            word: [(prefix, category) for prefix in words if word.startswith(prefix)
+                   for category in self._categories[prefix]]
+            for word in words
+        }
+
+    @staticmethod
+    def _trie_pattern(words: List[str]) -> str:
+        """Regex alternation of the words, factored by common prefix; prefers the longest match"""
+        trie: Dict[str, dict] = {}
+        for word in words:
+            node = trie
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+
+        def build(node: Dict[str, dict]) -> str:
+            branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+            if not branches:
+                return ""
+            pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            # A keyword ends here: the longer ones are tried first (greedy), then this one
+            return "(?:" + pattern + ")?" if "" in node else pattern
+
+        return build(trie)
+
+    def find(self, text: str) -> KeywordHits:
+        """Return every keyword found in the text, grouped by category"""
+        hits: KeywordHits = {}
+        if self._pattern is None:
+            return hits
+        text_lower = text.lower()
+
+        for match in self._pattern.finditer(text_lower):
+            start = match.start()
+            for keyword, category in self._matches[match.group(1)]:
+                if self.word_boundaries and not self._on_boundaries(text_lower, start, start + len(keyword)):
+                    continue
+                hits.setdefault(category, set()).add(keyword)
+
+        return hits
+
+    @staticmethod
+    def _on_boundaries(text: str, start: int, end: int) -> bool:
+        """True if text[start:end] is not part of a longer word"""
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_")
+
+def merge_hits(*hits: KeywordHits) -> KeywordHits:
+    """Combine hits from several texts"""
+    merged: KeywordHits = {}
+    for item in hits:
+        for category, words in item.items():
+            merged.setdefault(category, set()).update(words)
+    return merged
@@ -5,11 +5,34 @@ Implements RAG (Retrieval-Augmented Generation) for context-aware responses
 
 import json
 import os
-from typing import List, Dict, Any, Optional
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from model_registry import model_registry
+from embedding_store import EmbeddingStore, content_hash
+from vector_index import ExactIndex, create_index, search_rows
+from bm25_index import BM25Index
+
+# Optional on-disk vector store for the default knowledge base
+KB_VECTOR_STORE = os.getenv("KB_VECTOR_STORE", "")
+
+# Optional JSON file the knowledge base is loaded (and hot-reloaded) from
+KB_FILE = os.getenv("KB_FILE", "")
+
+# Vector index: "exact", "ivf", or "auto" (exact until KB_ANN_THRESHOLD entries)
+KB_INDEX = os.getenv("KB_INDEX", "auto").lower()
+KB_ANN_THRESHOLD = int(os.getenv("KB_ANN_THRESHOLD", "20000"))
+KB_IVF_NPROBE = int(os.getenv("KB_IVF_NPROBE", "8"))
+
+# Query embeddings kept in the LRU cache
+KB_QUERY_CACHE_SIZE = int(os.getenv("KB_QUERY_CACHE_SIZE", "1024"))
+
+# Weight of the BM25 lexical score when ranking vector results (0 = vector only)
+KB_HYBRID_WEIGHT = float(os.getenv("KB_HYBRID_WEIGHT", "0"))
 
 @dataclass
 class KnowledgeEntry:
@@ -19,6 +42,7 @@ class KnowledgeEntry:
     content: str
     category: str
     tags: List[str]
+    # Precomputed vector; consumed when the entry is added (vectors then live in the KB matrix)
     embedding: Optional[np.ndarray] = None
 
 class KnowledgeBase:
@@ -26,106 +50,414 @@ class KnowledgeBase:
     
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         self.model_name = model_name
-        self.embedding_model = None
         self.entries: List[KnowledgeEntry] = []
-        self.embeddings: Optional[np.ndarray] = None
+        # Growable float32 matrix; row i is the embedding of entries[i]
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        # Entries added before the embedding model was loaded
+        self._pending: List[KnowledgeEntry] = []
+        # Guards entries, _pending and matrix growth; embedding runs on request, worker and warm-up threads
+        self._embed_lock = threading.RLock()
+        self.encode_batch_size = int(os.getenv("KB_ENCODE_BATCH_SIZE", "64"))
+        # On-disk vectors reused by content hash, and persisted when new ones are encoded
+        self.vector_store: Optional[EmbeddingStore] = None
+        self._stored_hashes: List[str] = []
+        self._stored_vectors: Optional[np.ndarray] = None
+        # Similarity index over the embedding matrix
+        self.index = create_index("ivf" if KB_INDEX == "ivf" else "exact", lambda: self.embeddings, KB_IVF_NPROBE)
+        # Lexical index over title, content and tags; also the fallback when embeddings are unavailable
+        self.lexical_index = BM25Index()
+        self.hybrid_weight = KB_HYBRID_WEIGHT
+        # Category and tag bitmaps (bit i set = entries[i] matches), for pre-filtered search
+        self._category_bitmaps: Dict[str, int] = {}
+        self._tag_bitmaps: Dict[str, int] = {}
+        # LRU of query embeddings keyed by normalized query hash
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
         
-        # Initialize embedding model
-        try:
-            self.embedding_model = SentenceTransformer(model_name)
-        except Exception as e:
-            print(f"Failed to load embedding model: {e}")
-            self.embedding_model = None
+        # Embedding model is loaded on first use
+        model_registry.register(self._model_key, self._load_embedding_model, version=model_name)
+    
+    @property
+    def _model_key(self) -> str:
+        return f"embeddings:{self.model_name}"
+    
+    def _load_embedding_model(self):
+        """Load the sentence-transformers embedding model"""
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name)
+    
+    @property
+    def embedding_model(self):
+        """Embedding model, loaded on first use (None if unavailable)"""
+        return model_registry.get(self._model_key)
+    
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """Embeddings of all embedded entries (a view, no copy)"""
+        # Size first: its rows are valid in this matrix and in any grown copy of it
+        size = self._size
+        matrix = self._matrix
+        if matrix is None:
+            return None
+        return matrix[:size]
     
     def add_entry(self, entry: KnowledgeEntry):
         """Add a knowledge entry"""
-        if self.embedding_model:
-            # Generate embedding
-            entry.embedding = self.embedding_model.encode(entry.content)
+        self.add_entries([entry])
+    
+    def attach_vector_store(self, path: str):
+        """Reuse vectors from an on-disk store and persist newly encoded ones to it"""
+        self.vector_store = EmbeddingStore(path, self.model_name)
+        self._stored_hashes, self._stored_vectors = self.vector_store.load()
+        if self._stored_vectors is not None:
+            print(f"Loaded {len(self._stored_hashes)} stored embeddings from {path}")
+    
+    def add_entries(self, entries: List[KnowledgeEntry]):
+        """Add many knowledge entries, embedding them in one batch"""
+        with self._embed_lock:
+            self._add_entries(entries)
+    
+    def _add_entries(self, entries: List[KnowledgeEntry]):
+        start = len(self.entries)
+        by_category: Dict[str, List[int]] = {}
+        by_tag: Dict[str, List[int]] = {}
+        for offset, entry in enumerate(entries):
+            self.lexical_index.add(start + offset, self._lexical_text(entry))
+            by_category.setdefault(entry.category, []).append(offset)
+            for tag in entry.tags:
+                by_tag.setdefault(tag, []).append(offset)
         
-        self.entries.append(entry)
+        # One bitmap per category / tag for the whole batch, merged with a single OR
+        for bitmaps, rows in ((self._category_bitmaps, by_category), (self._tag_bitmaps, by_tag)):
+            for key, offsets in rows.items():
+                bitmaps[key] = bitmaps.get(key, 0) | self._offsets_bitmap(offsets, len(entries)) << start
         
-        # Update embeddings matrix
-        if self.embedding_model and entry.embedding is not None:
-            if self.embeddings is None:
-                self.embeddings = entry.embedding.reshape(1, -1)
-            else:
-                self.embeddings = np.vstack([self.embeddings, entry.embedding.reshape(1, -1)])
+        if self._use_stored_matrix(entries):
+            return
+        
+        self._reuse_stored_vectors(entries)
+        self.entries.extend(entries)
+        self._pending.extend(entries)
+        
+        # Embed right away if no entry needs the model, or it is already loaded
+        if model_registry.is_loaded(self._model_key) or all(e.embedding is not None for e in self._pending):
+            self._embed_pending()
+    
+    @staticmethod
+    def _offsets_bitmap(offsets: List[int], count: int) -> int:
+        """Bitmap with the given bits set, built in one pass"""
+        bits = np.zeros(count, dtype=bool)
+        bits[offsets] = True
+        return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+    
+    @staticmethod
+    def _lexical_text(entry: KnowledgeEntry) -> str:
+        """Text indexed for lexical search; the title counts twice"""
+        return " ".join([entry.title, entry.title, entry.content, *entry.tags])
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Search for relevant knowledge entries"""
+    def _use_stored_matrix(self, entries: List[KnowledgeEntry]) -> bool:
+        """Map the stored vectors directly (zero copy) if they match the entries exactly"""
+        if self._stored_vectors is None or self.entries or not entries:
+            return False
+        if len(entries) > len(self._stored_hashes):
+            return False
+        if any(content_hash(e.content) != h for e, h in zip(entries, self._stored_hashes)):
+            return False
+        
+        # Read-only and shared between workers; the first append copies it into memory
+        self._matrix = self._stored_vectors[:len(entries)]
+        self._size = len(entries)
+        # The matrix holds the vectors now; per-entry ones would keep an earlier snapshot's mmap alive
+        for entry in entries:
+            entry.embedding = None
+        self.entries.extend(entries)
+        self._index_rows(0, self._size)
+        return True
+    
+    def _reuse_stored_vectors(self, entries: List[KnowledgeEntry]):
+        """Attach stored vectors to entries whose content has not changed"""
+        if self._stored_vectors is None:
+            return
+        rows = {h: row for row, h in enumerate(self._stored_hashes)}
+        for entry in entries:
+            row = rows.get(content_hash(entry.content))
+            if entry.embedding is None and row is not None:
+                entry.embedding = self._stored_vectors[row]
+    
+    def _embed_pending(self):
+        """Embed entries added before the embedding model was available"""
+        if not self._pending:
+            return
+        with self._embed_lock:
+            self._embed_pending_locked()
+    
+    def _embed_pending_locked(self):
+        # Another thread may have embedded them while this one waited for the lock
+        if not self._pending:
+            return
+        
+        vectors = [entry.embedding for entry in self._pending]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and not self.embedding_model:
+            return
+        pending, self._pending = self._pending, []
+        
+        # Encode everything without a precomputed vector in one call
+        if missing:
+            encoded = self.embedding_model.encode(
+                [pending[i].content for i in missing],
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True
+            )
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        
+        self._append_embeddings(np.asarray(vectors, dtype=np.float32))
+        for entry in pending:
+            entry.embedding = None
+        
+        if missing and self.vector_store is not None:
+            self.save_embeddings()
+    
+    def save_embeddings(self, path: Optional[str] = None):
+        """Write the embeddings of all entries to a vector store (the attached one by default)"""
+        store = EmbeddingStore(path, self.model_name) if path else self.vector_store
+        if store is None or self._pending or self.embeddings is None:
+            return
+        hashes = [content_hash(e.content) for e in self.entries]
+        store.save(hashes, self.embeddings)
+        self.index.save(self._index_path(store), hashes)
+    
+    @staticmethod
+    def _index_path(store: EmbeddingStore) -> str:
+        """File the vector index is persisted to next to a vector store"""
+        return f"{store.path}.index.npz"
+    
+    def _append_embeddings(self, vectors: np.ndarray):
+        """Append rows to the embedding matrix, doubling its capacity as needed"""
+        needed = self._size + len(vectors)
+        if self._matrix is None:
+            self._matrix = np.empty((max(needed, 16), vectors.shape[1]), dtype=np.float32)
+        elif needed > len(self._matrix):
+            grown = np.empty((max(needed, 2 * len(self._matrix)), self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        
+        self._matrix[self._size:needed] = vectors
+        start, self._size = self._size, needed
+        self._index_rows(start, len(vectors))
+    
+    def _index_rows(self, start: int, count: int):
+        """Add new matrix rows to the vector index, switching to IVF once the KB is large"""
+        if KB_INDEX == "auto" and isinstance(self.index, ExactIndex) and self._size >= KB_ANN_THRESHOLD:
+            self.index = create_index("ivf", lambda: self.embeddings, KB_IVF_NPROBE)
+            start, count = 0, self._size
+        
+        # A fresh index is restored from disk when a saved one is available
+        if start == 0 and self.vector_store is not None:
+            hashes = [content_hash(e.content) for e in self.entries[:self._size]]
+            if self.index.load(self._index_path(self.vector_store), hashes):
+                return
+        self.index.add(start, count)
+    
+    def warm_up(self):
+        """Load the embedding model and embed any pending entries"""
+        self._embed_pending()
+    
+    def search(self, query: str, top_k: int = 3, categories: Optional[List[str]] = None,
+               tags: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Search for relevant knowledge entries, optionally only in some categories / with some tags"""
+        return self.search_many([query], top_k, categories=[categories], tags=[tags])[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 3,
+                    categories: Optional[List[Optional[List[str]]]] = None,
+                    tags: Optional[List[Optional[List[str]]]] = None) -> List[List[Dict[str, Any]]]:
+        """Search for many queries with one batched encode; categories/tags are per-query filters"""
+        if not queries:
+            return []
+        # Rows each query may match (None = whole KB)
+        allowed = [
+            self._filter_bitmap(categories[i] if categories else None, tags[i] if tags else None)
+            for i in range(len(queries))
+        ]
+        
+        # Each distinct filter is unpacked once into a boolean mask over the rows
+        masks = {bitmap: self._bitmap_mask(bitmap) for bitmap in set(allowed) if bitmap is not None}
+        
+        self._embed_pending()
         if not self.embedding_model or self.embeddings is None:
             # Fallback to simple text search
-            return self._simple_search(query, top_k)
+            return [self._simple_search(query, top_k, masks.get(bitmap)) for query, bitmap in zip(queries, allowed)]
+        
+        # Generate query embeddings
+        query_embeddings = self.encode_queries(queries)
         
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode(query)
+        # Get top-k results from the vector index, or from the matching partition only
+        all_hits: List[List[Tuple[int, float]]] = [[] for _ in queries]
+        groups: Dict[Optional[int], List[int]] = {}
+        for i, bitmap in enumerate(allowed):
+            groups.setdefault(bitmap, []).append(i)
         
-        # Calculate similarities
-        similarities = cosine_similarity(
-            query_embedding.reshape(1, -1), 
-            self.embeddings
-        )[0]
+        for bitmap, members in groups.items():
+            mask = masks.get(bitmap)
+            if self.hybrid_weight > 0:
+                hits = [self._hybrid_rank(queries[i], query_embeddings[i], top_k, mask) for i in members]
+            elif mask is None:
+                hits = self.index.search_many(query_embeddings[members], top_k)
+            else:
+                hits = search_rows(self.embeddings, self._mask_rows(mask), query_embeddings[members], top_k)
+            for i, query_hits in zip(members, hits):
+                all_hits[i] = query_hits
         
-        # Get top-k results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        return [
+            [
+                self._result(idx, similarity)
+                for idx, similarity in hits
+                if similarity > 0.3  # Minimum similarity threshold
+            ]
+            for hits in all_hits
+        ]
+    
+    def _filter_bitmap(self, categories: Optional[List[str]], tags: Optional[List[str]]) -> Optional[int]:
+        """Entries in any of the categories and with any of the tags (None = no filter)"""
+        bitmap = None
+        if categories:
+            bitmap = 0
+            for category in categories:
+                bitmap |= self._category_bitmaps.get(category, 0)
+        if tags:
+            tag_bitmap = 0
+            for tag in tags:
+                tag_bitmap |= self._tag_bitmaps.get(tag, 0)
+            bitmap = tag_bitmap if bitmap is None else bitmap & tag_bitmap
+        return bitmap
+    
+    def _bitmap_mask(self, bitmap: int) -> np.ndarray:
+        """Boolean mask over all entries, True where the bit is set"""
+        packed = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+        mask = np.zeros(len(self.entries), dtype=bool)
+        bits = np.unpackbits(packed, bitorder="little")[:len(mask)].astype(bool)
+        mask[:len(bits)] = bits
+        return mask
+    
+    def _mask_rows(self, mask: np.ndarray) -> np.ndarray:
+        """Embedded rows allowed by a mask"""
+        return np.flatnonzero(mask[:self._size])
+    
+    @property
+    def categories(self) -> List[str]:
+        """Categories present in the knowledge base"""
+        return sorted(self._category_bitmaps)
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries, encoding only those not already in the LRU cache"""
+        keys = [self._query_key(query) for query in queries]
+        embeddings: List[Optional[np.ndarray]] = []
+        with self._query_cache_lock:
+            for key in keys:
+                embedding = self._query_cache.get(key)
+                if embedding is not None:
+                    self._query_cache.move_to_end(key)
+                embeddings.append(embedding)
         
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.3:  # Minimum similarity threshold
-                entry = self.entries[idx]
-                results.append({
-                    "id": entry.id,
-                    "title": entry.title,
-                    "content": entry.content,
-                    "category": entry.category,
-                    "tags": entry.tags,
-                    "similarity": float(similarities[idx])
-                })
+        # Identical queries in one batch are encoded once
+        missing: Dict[str, int] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], i)
+        
+        if missing:
+            encoded = self.embedding_model.encode(
+                [queries[i] for i in missing.values()],
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True
+            )
+            fresh = dict(zip(missing, np.asarray(encoded, dtype=np.float32)))
+            with self._query_cache_lock:
+                for key, embedding in fresh.items():
+                    self._query_cache[key] = embedding
+                    self._query_cache.move_to_end(key)
+                while len(self._query_cache) > KB_QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+            embeddings = [fresh[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
         
-        return results
+        return np.vstack(embeddings)
+    
+    def _query_key(self, query: str) -> str:
+        """Cache key for a query: whitespace-collapsed, lowercased text plus the model name"""
+        normalized = re.sub(r"\s+", " ", query).strip().lower()
+        return hashlib.sha256(f"{self.model_name}\n{normalized}".encode("utf-8", errors="ignore")).hexdigest()
     
-    def _simple_search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
-        """Simple text-based search fallback"""
-        query_lower = query.lower()
-        results = []
+    def _hybrid_rank(self, query: str, query_embedding: np.ndarray, top_k: int,
+                     mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Blend cosine similarity with normalized BM25 over both candidate sets"""
+        if mask is None:
+            cosine = dict(self.index.search(query_embedding, top_k * 4))
+        else:
+            cosine = dict(search_rows(self.embeddings, self._mask_rows(mask), query_embedding[None, :], top_k * 4)[0])
+        lexical = dict(self._lexical_hits(query, top_k * 4, mask))
+        best_lexical = max(lexical.values(), default=0.0) or 1.0
         
-        for entry in self.entries:
-            score = 0
-            content_lower = entry.content.lower()
-            title_lower = entry.title.lower()
-            
-            # Check title matches
-            if query_lower in title_lower:
-                score += 2
-            
-            # Check content matches
-            if query_lower in content_lower:
-                score += 1
-            
-            # Check tag matches
-            for tag in entry.tags:
-                if query_lower in tag.lower():
-                    score += 1.5
-            
-            if score > 0:
-                results.append({
-                    "id": entry.id,
-                    "title": entry.title,
-                    "content": entry.content,
-                    "category": entry.category,
-                    "tags": entry.tags,
-                    "similarity": score / 4.5  # Normalize to 0-1
-                })
+        # Lexical-only candidates still need a cosine score
+        missing = [idx for idx in lexical if idx not in cosine and idx < self._size]
+        if missing:
+            vectors = np.asarray(self.embeddings[missing], dtype=np.float32)
+            norms = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+            query_norm = max(float(np.linalg.norm(query_embedding)), 1e-12)
+            cosine.update(zip(missing, (vectors @ query_embedding / norms / query_norm).tolist()))
         
-        # Sort by score and return top-k
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        return results[:top_k]
+        weight = self.hybrid_weight
+        combined = {
+            idx: (1 - weight) * score + weight * lexical.get(idx, 0.0) / best_lexical
+            for idx, score in cosine.items()
+        }
+        return sorted(combined.items(), key=lambda item: item[1], reverse=True)[:top_k]
     
-    def get_context_for_query(self, query: str, max_context_length: int = 1000) -> str:
-        """Get relevant context for a query"""
-        results = self.search(query, top_k=3)
+    def _lexical_hits(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top BM25 matches, restricted to the rows allowed by a filter mask"""
+        if mask is None:
+            return self.lexical_index.search(query, top_k)
+        scores = [(idx, score) for idx, score in self.lexical_index.scores(query).items() if mask[idx]]
+        return sorted(scores, key=lambda item: item[1], reverse=True)[:top_k]
+    
+    def _result(self, idx: int, similarity: float) -> Dict[str, Any]:
+        """Search result for the entry at a row"""
+        entry = self.entries[idx]
+        return {
+            "id": entry.id,
+            "title": entry.title,
+            "content": entry.content,
+            "category": entry.category,
+            "tags": entry.tags,
+            "similarity": float(similarity)
+        }
+    
+    def _simple_search(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Lexical BM25 search fallback"""
+        hits = self._lexical_hits(query, top_k, mask)
+        if not hits:
+            return []
         
+        # Normalize to 0-1 relative to the best match
+        best = hits[0][1]
+        return [self._result(idx, score / best) for idx, score in hits]
+    
+    def get_context_for_query(self, query: str, max_context_length: int = 1000,
+                              categories: Optional[List[str]] = None) -> str:
+        """Get relevant context for a query"""
+        return self.get_context_for_queries([query], max_context_length, categories=[categories])[0]
+    
+    def get_context_for_queries(self, queries: List[str], max_context_length: int = 1000,
+                                categories: Optional[List[Optional[List[str]]]] = None) -> List[str]:
+        """Get relevant context for many queries in one batched search (categories are per query)"""
+        return [
+            self._format_context(results, max_context_length)
+            for results in self.search_many(queries, top_k=3, categories=categories)
+        ]
+    
+    def _format_context(self, results: List[Dict[str, Any]], max_context_length: int) -> str:
+        """Join search results into a context block of bounded length"""
         if not results:
             return "No relevant information found in knowledge base."
         
@@ -146,26 +478,57 @@ class KnowledgeBase:
         
         return "\n\n".join(context_parts)
     
-    def load_from_file(self, file_path: str):
-        """Load knowledge base from JSON file"""
+    def load_from_file(self, file_path: str, previous: Optional["KnowledgeBase"] = None) -> int:
+        """Load knowledge base from JSON file, reusing vectors stored next to it or held by a
+        previous knowledge base; returns how many entries reused an existing vector"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            self.attach_vector_store(self._vector_store_path(file_path))
+            entries = self.read_entries(file_path)
             
-            for item in data:
-                entry = KnowledgeEntry(
-                    id=item["id"],
-                    title=item["title"],
-                    content=item["content"],
-                    category=item["category"],
-                    tags=item["tags"]
-                )
-                self.add_entry(entry)
+            reused = 0
+            if previous is not None and previous.model_name == self.model_name:
+                vectors = previous.vectors_by_hash()
+                for entry in entries:
+                    entry.embedding = vectors.get(content_hash(entry.content))
+                    reused += entry.embedding is not None
             
-            print(f"Loaded {len(data)} knowledge entries from {file_path}")
+            self.add_entries(entries)
+            
+            print(f"Loaded {len(entries)} knowledge entries from {file_path}")
+            return reused
             
         except Exception as e:
             print(f"Failed to load knowledge base: {e}")
+            return 0
+    
+    @staticmethod
+    def read_entries(file_path: str) -> List[KnowledgeEntry]:
+        """Parse knowledge entries from a JSON file"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        return [
+            KnowledgeEntry(
+                id=item["id"],
+                title=item["title"],
+                content=item["content"],
+                category=item["category"],
+                tags=item["tags"]
+            )
+            for item in data
+        ]
+    
+    def vectors_by_hash(self) -> Dict[str, np.ndarray]:
+        """Vector of every embedded entry, keyed by content hash"""
+        if self.embeddings is None:
+            return {}
+        return {content_hash(entry.content): self.embeddings[row] for row, entry in enumerate(self.entries[:self._size])}
+    
+    def share_query_cache(self, other: "KnowledgeBase"):
+        """Keep using another knowledge base's query embeddings (they don't depend on KB content)"""
+        if other.model_name == self.model_name:
+            self._query_cache = other._query_cache
+            self._query_cache_lock = other._query_cache_lock
     
     def save_to_file(self, file_path: str):
         """Save knowledge base to JSON file"""
@@ -185,13 +548,28 @@ class KnowledgeBase:
             
             print(f"Saved {len(data)} knowledge entries to {file_path}")
             
+            # Save vectors alongside so the next load skips re-encoding
+            self._embed_pending()
+            self.save_embeddings(self._vector_store_path(file_path))
+            
         except Exception as e:
             print(f"Failed to save knowledge base: {e}")
 
+    @staticmethod
+    def _vector_store_path(file_path: str) -> str:
+        """Vector store prefix used for a KB JSON file"""
+        return os.path.splitext(file_path)[0] + ".vectors"
+
 # Initialize default knowledge base
 def create_default_knowledge_base() -> KnowledgeBase:
     """Create a default knowledge base with common support scenarios"""
     kb = KnowledgeBase()
+    if KB_FILE and os.path.exists(KB_FILE):
+        kb.load_from_file(KB_FILE)
+        return kb
+    
+    if KB_VECTOR_STORE:
+        kb.attach_vector_store(KB_VECTOR_STORE)
     
     # Add default entries
     default_entries = [
@@ -246,13 +624,21 @@ def create_default_knowledge_base() -> KnowledgeBase:
         )
     ]
     
-    for entry in default_entries:
-        kb.add_entry(entry)
+    kb.add_entries(default_entries)
     
     return kb
 
-# Global knowledge base instance
+# Global knowledge base instance; replaced wholesale on reload, so look it up per use
 knowledge_base = create_default_knowledge_base()
 
+def get_knowledge_base() -> KnowledgeBase:
+    """Current knowledge base snapshot"""
+    return knowledge_base
+
+def set_knowledge_base(kb: KnowledgeBase):
+    """Atomically replace the knowledge base; in-flight searches keep the old snapshot"""
+    global knowledge_base
+    knowledge_base = kb
+
 
 
@@ -0,0 +1,266 @@
+"""
+Mail Connection Pool for EmailAce AI
+Keeps logged-in IMAP and SMTP connections per account so requests skip the TLS handshake and login
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from async_email import EMAIL_TIMEOUT, AsyncEmailService, open_imap, open_smtp
+from email_service import EmailConfig
+
+# Open connections per account and protocol (in use + idle)
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "4"))
+# Idle connections older than this are logged out
+EMAIL_POOL_IDLE_TIMEOUT = float(os.getenv("EMAIL_POOL_IDLE_TIMEOUT", "300"))
+# Connections idle longer than this get a NOOP before they are handed out
+EMAIL_POOL_CHECK_AFTER = float(os.getenv("EMAIL_POOL_CHECK_AFTER", "5"))
+# Seconds between idle reaping passes
+EMAIL_POOL_REAP_INTERVAL = float(os.getenv("EMAIL_POOL_REAP_INTERVAL", "30"))
+
+class ConnectionPool:
+    """Bounded LIFO pool of connections to one server for one account"""
+
+    def __init__(self, name: str, connect: Callable[[], Awaitable[Any]], max_size: int = 4,
+                 idle_timeout: float = 300.0, check_after: float = 5.0, acquire_timeout: float = EMAIL_TIMEOUT):
+        self.name = name
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.acquire_timeout = acquire_timeout
+        # (connection, last released at); the most recently used end is warmest
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._available = asyncio.Condition()
+
+        self.acquires = 0
+        self.hits = 0
+        self.handshakes = 0
+        self.handshake_failures = 0
+        self.handshake_seconds = 0.0
+        self.handshake_max_seconds = 0.0
+        self.health_check_failures = 0
+        self.reaped = 0
+
+    async def acquire(self):
+        """A healthy connection, reusing an idle one when possible"""
+        self.acquires += 1
+        while True:
+            async with self._available:
+                while not self._idle and self._size >= self.max_size:
+                    await asyncio.wait_for(self._available.wait(), self.acquire_timeout)
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    connection = None
+
+            if connection is None:
+                return await self._open()
+            if await self._healthy(connection, released_at):
+                self.hits += 1
+                return connection
+            # Stale: drop it and try the next idle one (or reconnect)
+            await self._discard(connection)
+
+    async def release(self, connection, discard: bool = False):
+        """Return a connection; broken ones are closed instead of pooled"""
+        if discard or not connection.connected:
+            await self._discard(connection)
+            return
+        async with self._available:
+            self._idle.append((connection, time.monotonic()))
+            self._available.notify()
+
+    async def reap(self):
+        """Log out connections that have been idle too long"""
+        cutoff = time.monotonic() - self.idle_timeout
+        async with self._available:
+            expired = [connection for connection, released_at in self._idle if released_at < cutoff]
+            self._idle = deque((connection, released_at) for connection, released_at in self._idle if released_at >= cutoff)
+        for connection in expired:
+            self.reaped += 1
+            await self._discard(connection, graceful=True)
+
+    async def close(self):
+        async with self._available:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            await self._discard(connection, graceful=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pool": self.name,
+            "open": self._size,
+            "idle": len(self._idle),
+            "acquires": self.acquires,
+            "hit_rate": round(self.hits / self.acquires, 3) if self.acquires else None,
+            "handshakes": self.handshakes,
+            "handshake_failures": self.handshake_failures,
+            "handshake_avg_ms": round(1000 * self.handshake_seconds / self.handshakes, 1) if self.handshakes else None,
+            "handshake_max_ms": round(1000 * self.handshake_max_seconds, 1),
+            "health_check_failures": self.health_check_failures,
+            "reaped": self.reaped
+        }
+
+    async def _open(self):
+        start = time.perf_counter()
+        try:
+            connection = await self.connect()
+        except BaseException:
+            self.handshake_failures += 1
+            async with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+        elapsed = time.perf_counter() - start
+        self.handshakes += 1
+        self.handshake_seconds += elapsed
+        self.handshake_max_seconds = max(self.handshake_max_seconds, elapsed)
+        return connection
+
+    async def _healthy(self, connection, released_at: float) -> bool:
+        if not connection.connected:
+            return False
+        if time.monotonic() - released_at < self.check_after:
+            return True
+        try:
+            await connection.noop()
+            return True
+        except Exception:
+            self.health_check_failures += 1
+            return False
+
+    async def _discard(self, connection, graceful: bool = False):
+        try:
+            if graceful and connection.connected:
+                await (connection.logout() if hasattr(connection, "logout") else connection.quit())
+            else:
+                await connection.close()
+        except Exception:
+            pass
+        async with self._available:
+            self._size -= 1
+            self._available.notify()
+
+class MailPools:
+    """IMAP and SMTP pools per account, plus the idle reaper"""
+
+    def __init__(self, max_size: int = 4, idle_timeout: float = 300.0, check_after: float = 5.0,
+                 reap_interval: float = 30.0):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.reap_interval = reap_interval
+        self._pools: Dict[tuple, ConnectionPool] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def imap(self, config: EmailConfig) -> ConnectionPool:
+        return self._pool("imap", config.imap_server, config.imap_port, config)
+
+    def smtp(self, config: EmailConfig) -> ConnectionPool:
+        return self._pool("smtp", config.smtp_server, config.smtp_port, config)
+
+    def _pool(self, protocol: str, host: str, port: int, config: EmailConfig) -> ConnectionPool:
+        key = (protocol, host, port, config.username, config.use_ssl)
+        if key not in self._pools:
+            # Copy the settings now; provider configs are shared and re-read from the environment
+            config = EmailConfig(**vars(config))
+            self._pools[key] = ConnectionPool(
+                f"{protocol}://{config.username}@{host}:{port}",
+                (lambda: open_imap(config)) if protocol == "imap" else (lambda: open_smtp(config)),
+                max_size=self.max_size,
+                idle_timeout=self.idle_timeout,
+                check_after=self.check_after
+            )
+        return self._pools[key]
+
+    def start(self):
+        """Start reaping idle connections on the running event loop"""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def close(self):
+        """Stop the reaper and log out every idle connection"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        for pool in list(self._pools.values()):
+            await pool.close()
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            for pool in list(self._pools.values()):
+                try:
+                    await pool.reap()
+                except Exception as e:
+                    print(f"Mail pool reap error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-pool and overall hit rate and handshake times"""
+        pools = [pool.get_stats() for pool in self._pools.values()]
+        acquires = sum(pool.acquires for pool in self._pools.values())
+        hits = sum(pool.hits for pool in self._pools.values())
+        return {
+            "pools": pools,
+            "acquires": acquires,
+            "hit_rate": round(hits / acquires, 3) if acquires else None,
+            "handshakes": sum(pool.handshakes for pool in self._pools.values())
+        }
+
+class PooledEmailService(AsyncEmailService):
+    """AsyncEmailService that borrows connections from the account's pools; disconnect() returns them"""
+
+    def __init__(self, config: EmailConfig, pools: MailPools):
+        super().__init__(config)
+        self.pools = pools
+
+    async def connect_imap(self) -> bool:
+        """Borrow an IMAP connection (reconnecting if the pooled ones went stale)"""
+        pool = self.pools.imap(self.config)
+        if self.imap_connection:
+            await pool.release(self.imap_connection)
+            self.imap_connection = None
+        try:
+            self.imap_connection = await pool.acquire()
+            return True
+        except Exception as e:
+            print(f"IMAP connection failed: {e!r}")
+            return False
+
+    async def connect_smtp(self) -> bool:
+        """Borrow an SMTP connection (reconnecting if the pooled ones went stale)"""
+        pool = self.pools.smtp(self.config)
+        if self.smtp_connection:
+            await pool.release(self.smtp_connection)
+            self.smtp_connection = None
+        try:
+            self.smtp_connection = await pool.acquire()
+            return True
+        except Exception as e:
+            print(f"SMTP connection failed: {e!r}")
+            return False
+
+    async def disconnect(self):
+        """Hand connections back to the pools"""
+        if self.imap_connection:
+            await self.pools.imap(self.config).release(self.imap_connection)
+            self.imap_connection = None
+
+        if self.smtp_connection:
+            await self.pools.smtp(self.config).release(self.smtp_connection)
+            self.smtp_connection = None
+
+# Global mail connection pools
+mail_pools = MailPools(
+    max_size=EMAIL_POOL_SIZE,
+    idle_timeout=EMAIL_POOL_IDLE_TIMEOUT,
+    check_after=EMAIL_POOL_CHECK_AFTER,
+    reap_interval=EMAIL_POOL_REAP_INTERVAL
+)
@@ -0,0 +1,240 @@
+"""
+Mailbox Watcher for EmailAce AI
+IMAP IDLE listeners that store new mail and queue it the moment it arrives
+"""
+
+import asyncio
+import os
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from async_email import AsyncEmailService, open_imap
+from database import SessionLocal, Email, SyncState
+from email_service import get_email_config
+
+# provider:folder pairs to watch, e.g. "gmail:INBOX,outlook:INBOX" (empty = no watchers)
+EMAIL_WATCH = os.getenv("EMAIL_WATCH", "")
+# IDLE is re-issued this often; servers may drop IDLE after 30 minutes (RFC 2177)
+EMAIL_IDLE_SECONDS = float(os.getenv("EMAIL_IDLE_SECONDS", "1500"))
+# Seconds between NOOP polls on servers without IDLE
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "60"))
+# Reconnect backoff: base * 2^(attempt-1), capped
+EMAIL_WATCH_BACKOFF_BASE = float(os.getenv("EMAIL_WATCH_BACKOFF_BASE", "1"))
+EMAIL_WATCH_BACKOFF_MAX = float(os.getenv("EMAIL_WATCH_BACKOFF_MAX", "300"))
+
+def unsynced_headers(headers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop fetched headers whose Message-ID is already stored (one query per batch); blocks, so run it in a thread"""
+    message_ids = [header['message_id'] for header in headers if header['message_id']]
+    if not message_ids:
+        return headers
+    db = SessionLocal()
+    try:
+        known = {row.message_id for row in db.query(Email.message_id).filter(Email.message_id.in_(message_ids))}
+    finally:
+        db.close()
+    return [header for header in headers if header['message_id'] not in known]
+
+class MailboxWatcher:
+    """One IDLE connection on one account folder; new mail is stored as pending and queued by urgency"""
+
+    def __init__(self, provider: str, folder: str, ai_processor, queue,
+                 idle_seconds: float = 1500.0, poll_seconds: float = 60.0,
+                 backoff_base: float = 1.0, backoff_max: float = 300.0,
+                 since_days: int = 7, batch_limit: int = 50):
+        self.provider = provider
+        self.folder = folder
+        self.ai_processor = ai_processor
+        self.queue = queue
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.since_days = since_days
+        self.batch_limit = batch_limit
+        self.connected = False
+        self.ingested = 0
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        # Consecutive attempts that failed to connect or catch up, for the reconnect backoff
+        self._attempt = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.folder}"
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "watcher": self.name,
+            "connected": self.connected,
+            "ingested": self.ingested,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await self._watch()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.connected = False
+                self.last_error = repr(e)
+                self.reconnects += 1
+                self._attempt += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self._attempt - 1)) * random.uniform(0.5, 1.0)
+                print(f"Mail watcher {self.name} error: {e!r}; reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _watch(self):
+        """Catch up, then IDLE and ingest on every EXISTS until cancelled"""
+        config = get_email_config(self.provider)
+        if not config.username:
+            print(f"Mail watcher {self.name} disabled: no credentials configured")
+            return
+
+        # A dedicated connection: one in IDLE can't be lent to requests
+        client = await open_imap(config)
+        service = AsyncEmailService(config)
+        service.imap_connection = client
+        try:
+            supports_idle = "IDLE" in await client.capabilities()
+            self.connected = True
+            print(f"📬 Watching {self.name} ({'IDLE' if supports_idle else 'polling'})")
+
+            await self._ingest(service)
+            # Only a completed catch-up ends the backoff; a login that can't sync keeps backing off
+            self._attempt = 0
+            while True:
+                if supports_idle:
+                    updates = await client.idle(self.idle_seconds)
+                else:
+                    await asyncio.sleep(self.poll_seconds)
+                    updates = await client.command('NOOP')
+                if any(kind == b'EXISTS' for kind, _ in updates):
+                    await self._ingest(service)
+        finally:
+            self.connected = False
+            await client.logout()
+
+    async def _ingest(self, service: AsyncEmailService):
+        """Fetch everything after the folder's high-water mark, store it and queue it"""
+        while True:
+            uid_validity, last_uid = await asyncio.to_thread(self._load_state, service.config.username)
+            result = await service.sync_folder(
+                self.folder,
+                uid_validity=uid_validity,
+                last_uid=last_uid,
+                since_days=self.since_days,
+                limit=self.batch_limit,
+                screen=lambda headers: asyncio.to_thread(unsynced_headers, headers)
+            )
+            if result is None:
+                raise ConnectionError(f"sync of {self.name} failed")
+
+            stored = await asyncio.to_thread(self._store, service.config.username, result)
+            for email_id, priority, created_at in stored:
+                self.queue.add_email(email_id=email_id, priority=priority, created_at=created_at)
+            self.ingested += len(stored)
+            if stored:
+                print(f"📥 {self.name}: queued {len(stored)} new emails")
+
+            if not result['more']:
+                return
+
+    def _load_state(self, username: str) -> Tuple[Optional[int], int]:
+        db = SessionLocal()
+        try:
+            state = db.query(SyncState).filter(
+                SyncState.account == f"{self.provider}:{username}",
+                SyncState.folder == self.folder
+            ).first()
+            return (state.uid_validity, state.last_uid or 0) if state else (None, 0)
+        finally:
+            db.close()
+
+    def _store(self, username: str, result: Dict[str, Any]) -> List[Tuple[int, str, datetime]]:
+        """Insert new mail as pending with a keyword urgency estimate; full analysis happens in the queue workers"""
+        account = f"{self.provider}:{username}"
+        db = SessionLocal()
+        try:
+            state = db.query(SyncState).filter(SyncState.account == account, SyncState.folder == self.folder).first()
+            if state is None:
+                state = SyncState(account=account, folder=self.folder, last_uid=0)
+                db.add(state)
+
+            stored = []
+            for email_data in result['emails']:
+                priority, is_urgent = self.ai_processor.detect_urgency(email_data['body'] + " " + email_data['subject'])
+                new_email = Email(
+                    sender=email_data['sender'],
+                    subject=email_data['subject'],
+                    body=email_data['body'],
+                    date=datetime.fromisoformat(email_data['date'].replace('Z', '+00:00')),
+                    priority=priority,
+                    is_urgent=is_urgent,
+                    status="pending",
+                    message_id=email_data['message_id'] or None
+                )
+                # The unique Message-ID index settles races with /emails/sync
+                try:
+                    with db.begin_nested():
+                        db.add(new_email)
+                except IntegrityError:
+                    continue
+                stored.append((new_email.id, priority, new_email.date))
+
+            state.uid_validity = result['uid_validity']
+            state.last_uid = result['last_uid']
+            db.commit()
+            return stored
+        finally:
+            db.close()
+
+class MailWatchers:
+    """The configured mailbox watchers, started and stopped together"""
+
+    def __init__(self, watchers: List[MailboxWatcher]):
+        self.watchers = watchers
+
+    def start(self):
+        for watcher in self.watchers:
+            watcher.start()
+
+    async def stop(self):
+        await asyncio.gather(*(watcher.stop() for watcher in self.watchers))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"watchers": [watcher.get_stats() for watcher in self.watchers]}
+
+def create_mail_watchers(ai_processor, queue) -> MailWatchers:
+    """Watchers for the EMAIL_WATCH provider:folder list"""
+    watchers = []
+    for entry in filter(None, (part.strip() for part in EMAIL_WATCH.split(","))):
+        provider, _, folder = entry.partition(":")
+        watchers.append(MailboxWatcher(
+            provider.lower(),
+            folder or "INBOX",
+            ai_processor,
+            queue,
+            idle_seconds=EMAIL_IDLE_SECONDS,
+            poll_seconds=EMAIL_POLL_SECONDS,
+            backoff_base=EMAIL_WATCH_BACKOFF_BASE,
+            backoff_max=EMAIL_WATCH_BACKOFF_MAX
+        ))
+    return MailWatchers(watchers)
@@ -2,15 +2,30 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
+import os
 import uvicorn
 
 from database import create_tables
-from routes import router
+from routes import router, ai_processor, inference_scheduler, queue_workers, mail_watchers
 from seed_data import seed_database
+from model_registry import model_registry
+from knowledge_base import get_knowledge_base
+from kb_reloader import kb_reloader
+from mail_pool import mail_pools
 
 # Global variable to track if database is initialized
 db_initialized = False
 
+# Load AI models in the background at startup instead of on first request
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+
+def warm_up_models():
+    """Load all registered models and embed the knowledge base"""
+    model_registry.warm_up()
+    get_knowledge_base().warm_up()
+    print("✅ AI models loaded")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -23,11 +38,33 @@ async def lifespan(app: FastAPI):
     create_tables()
     print("✅ Database tables created")
     
-    # Seed database with sample data
+    # Seed database with analysed sample data in the background, so startup doesn't wait for the models
+    seed_task = None
     if not db_initialized:
-        seed_database()
+        seed_task = asyncio.create_task(asyncio.to_thread(seed_database, ai_processor))
         db_initialized = True
-        print("✅ Database seeded with sample emails")
+        print("⏳ Seeding sample emails in the background")
+    
+    # Start micro-batching inference scheduler
+    inference_scheduler.start()
+    
+    # Drain the priority queue in the background
+    queue_workers.start()
+    
+    # Pick up knowledge base file edits without restarting
+    kb_reloader.start()
+    
+    # Log out mail connections that sit idle in the pools
+    mail_pools.start()
+    
+    # Push new mail into the queue as soon as the server announces it
+    mail_watchers.start()
+    
+    # Warm up AI models without blocking startup
+    warm_up_task = None
+    if MODEL_WARMUP:
+        warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up_models))
+        print("⏳ Loading AI models in the background")
     
     print("🎯 Backend ready! Visit http://127.0.0.1:8000/docs for API docs")
     
@@ -35,6 +72,16 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down EmailAce AI Backend...")
+    await mail_watchers.stop()
+    # Workers finish their current batch before the scheduler goes away
+    await queue_workers.stop()
+    await inference_scheduler.stop()
+    kb_reloader.stop()
+    await mail_pools.close()
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+    if seed_task and not seed_task.done():
+        seed_task.cancel()
 
 # Create FastAPI app
 app = FastAPI(
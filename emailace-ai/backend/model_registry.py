@@ -0,0 +1,116 @@
+"""
+Model Registry for EmailAce AI
+Loads transformer pipelines lazily, on first use or from a background warm-up
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Model load states reported by the health check
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+LOADED = "loaded"
+FAILED = "failed"
+
+class ModelRegistry:
+    """Registry of lazily loaded models shared by the whole process"""
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._versions: Dict[str, str] = {}
+        self._models: Dict[str, Any] = {}
+        self._states: Dict[str, str] = {}
+        self._done: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], version: str = ""):
+        """Register a model loader; registering an existing name is a no-op"""
+        with self._lock:
+            if name in self._loaders:
+                return
+            self._loaders[name] = loader
+            self._versions[name] = version or name
+            self._states[name] = NOT_LOADED
+            self._done[name] = threading.Event()
+
+    def get(self, name: str) -> Optional[Any]:
+        """Get a model, loading it on first use. Returns None if loading failed"""
+        if self._states.get(name) == LOADED:
+            return self._models[name]
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model: {name}")
+            should_load = self._states[name] == NOT_LOADED
+            if should_load:
+                self._states[name] = LOADING
+
+        if should_load:
+            self._load(name)
+        else:
+            # Another thread is loading it
+            self._done[name].wait()
+
+        return self._models.get(name)
+
+    def _load(self, name: str):
+        """Run the loader for a model and record the outcome"""
+        try:
+            model = self._loaders[name]()
+            self._models[name] = model
+            self._states[name] = LOADED
+        except Exception as e:
+            print(f"Model '{name}' load error: {e}")
+            self._states[name] = FAILED
+        finally:
+            self._done[name].set()
+
+    def version(self, name: str) -> str:
+        """Get the version identifier of a model (as registered, or as set by its loader)"""
+        return self._versions.get(name, "")
+
+    def set_version(self, name: str, version: str):
+        """Record the version a model actually loaded as, e.g. after a backend fallback"""
+        self._versions[name] = version
+
+    def warm_up(self, names: Optional[List[str]] = None):
+        """Load the given models (all registered models by default)"""
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def start_warm_up(self, names: Optional[List[str]] = None) -> threading.Thread:
+        """Load models in a daemon thread and return it"""
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every registered model has finished loading (or failed)"""
+        if not self.is_ready():
+            # Make sure something is actually loading the missing models
+            missing = [name for name, state in self._states.items() if state == NOT_LOADED]
+            if missing:
+                self.start_warm_up(missing)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event in list(self._done.values()):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not event.wait(remaining):
+                return False
+        return True
+
+    def is_loaded(self, name: str) -> bool:
+        """True if a model has been loaded successfully"""
+        return self._states.get(name) == LOADED
+
+    def is_ready(self) -> bool:
+        """True once every registered model has finished loading (or failed)"""
+        return all(state in (LOADED, FAILED) for state in self._states.values())
+
+    def status(self) -> Dict[str, str]:
+        """Get load state of every registered model"""
+        return dict(self._states)
+
+# Global model registry instance
+model_registry = ModelRegistry()
@@ -49,5 +49,7 @@ class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
     database_connected: bool
+    models_ready: bool = False
+    model_status: Dict[str, str] = {}
 
 
@@ -4,7 +4,11 @@ Handles urgent email processing with proper prioritization
 """
 
 import heapq
-from typing import List, Dict, Any, Optional
+import itertools
+import os
+import threading
+import time
+from typing import Callable, List, Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
@@ -33,16 +37,60 @@ class EmailTask:
         # If same priority, older emails first
         return self.created_at < other.created_at
 
+def parse_priority(priority: str) -> Priority:
+    """Parse priority string to enum"""
+    priority_lower = priority.lower()
+    
+    if priority_lower in ["urgent", "critical", "emergency"]:
+        return Priority.URGENT
+    elif priority_lower in ["high", "important"]:
+        return Priority.HIGH
+    elif priority_lower in ["normal", "medium", "standard"]:
+        return Priority.NORMAL
+    else:
+        return Priority.LOW
+
+# Rebuild a bucket once its tombstones outnumber its live entries (and at least this many)
+COMPACT_MIN_TOMBSTONES = 64
+
 class EmailPriorityQueue:
-    """Priority queue for email processing"""
+    """Indexed priority queue for email processing: one heap per priority, one entry per email id"""
     
-    def __init__(self):
-        self.queue: List[EmailTask] = []
+    def __init__(self, lease_seconds: float = 300.0, policy=None, clock: Callable[[], float] = time.time):
+        if policy is None:
+            from queue_policy import create_policy
+            policy = create_policy()
+        # Decides which priority level is served next
+        self.policy = policy
+        self._clock = clock
+        # Per priority, a heap of [created_at timestamp, sequence, priority, task]; task is None once removed
+        self.buckets: Dict[Priority, List[list]] = {priority: [] for priority in Priority}
+        # email id -> its live heap entry
+        self._entries: Dict[int, list] = {}
+        # Live entries per priority, kept in step with every push, pop and removal
+        self._counts: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._tombstones: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        # Tasks handed out by get_next_email and not yet marked processed or failed
+        self.in_progress: Dict[int, EmailTask] = {}
+        # When each in-progress task was handed out; stale ones may be queued again
+        self._claimed_at: Dict[int, float] = {}
+        self.lease_seconds = lease_seconds
+        # Failed tasks waiting out their backoff: heap of (eligible at, sequence, email id)
+        self._retry_lane: List[tuple] = []
+        self._retrying: Dict[int, EmailTask] = {}
         self.processed_emails: set = set()
         self.failed_emails: set = set()
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, email_id: int) -> bool:
+        return email_id in self._entries
     
     def add_email(self, email_id: int, priority: str, created_at: datetime = None) -> bool:
-        """Add email to priority queue"""
+        """Add email to priority queue; re-adding a queued email only ever raises its priority"""
         if email_id in self.processed_emails or email_id in self.failed_emails:
             return False
         
@@ -52,62 +100,141 @@ class EmailPriorityQueue:
         # Convert string priority to enum
         priority_enum = self._parse_priority(priority)
         
-        task = EmailTask(
-            email_id=email_id,
-            priority=priority_enum,
-            created_at=created_at
-        )
-        
-        heapq.heappush(self.queue, task)
-        return True
+        with self._lock:
+            # Being worked on, unless whoever took it seems to have given up
+            claimed_at = self._claimed_at.get(email_id)
+            if claimed_at is not None and self._clock() - claimed_at < self.lease_seconds:
+                return False
+            if email_id in self._retrying:
+                return False
+            
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                if priority_enum.value >= entry[-1].priority.value:
+                    return False
+                task = self.remove(email_id)
+                task.priority = priority_enum
+                self._push(task)
+                return True
+            
+            task = EmailTask(
+                email_id=email_id,
+                priority=priority_enum,
+                created_at=created_at
+            )
+            self._push(task)
+            return True
+    
+    def update_priority(self, email_id: int, priority: str) -> bool:
+        """Change the priority of a queued email"""
+        with self._lock:
+            task = self.remove(email_id)
+            if task is None:
+                return False
+            task.priority = self._parse_priority(priority)
+            self._push(task)
+            return True
+    
+    def remove(self, email_id: int) -> Optional[EmailTask]:
+        """Remove a queued email (lazily: its heap entry becomes a tombstone)"""
+        with self._lock:
+            entry = self._entries.pop(email_id, None)
+            if entry is None:
+                return None
+            task, entry[-1] = entry[-1], None
+            priority = entry[2]
+            self._counts[priority] -= 1
+            self._tombstones[priority] += 1
+            self._maybe_compact(priority)
+            return task
     
     def get_next_email(self) -> Optional[EmailTask]:
-        """Get next email to process (highest priority)"""
-        while self.queue:
-            task = heapq.heappop(self.queue)
-            
-            if task.email_id in self.processed_emails:
-                continue  # Skip already processed emails
+        """Get next email to process, from the level the scheduling policy picks"""
+        with self._lock:
+            now = self._clock()
+            priority = self.policy.choose(self._heads(now), now)
+            if priority is None:
+                return None
             
+            self.policy.served(priority, self._peek_entry(priority)[0], now)
+            task = heapq.heappop(self.buckets[priority])[-1]
+            del self._entries[task.email_id]
+            self._counts[priority] -= 1
+            self.in_progress[task.email_id] = task
+            self._claimed_at[task.email_id] = now
             return task
-        
-        return None
+    
+    def claim_batch(self, count: int, lease_seconds: Optional[float] = None) -> List[EmailTask]:
+        """Take up to count tasks in scheduling order (the lease length is fixed per queue here)"""
+        with self._lock:
+            tasks = []
+            while len(tasks) < count:
+                task = self.get_next_email()
+                if task is None:
+                    break
+                tasks.append(task)
+            return tasks
+    
+    def peek(self, priority: Optional[Priority] = None) -> Optional[EmailTask]:
+        """Next email overall (or of one priority) without removing it"""
+        with self._lock:
+            if priority is None:
+                now = self._clock()
+                priority = self.policy.choose(self._heads(now), now)
+                if priority is None:
+                    return None
+            entry = self._peek_entry(priority)
+            return entry[-1] if entry is not None else None
+    
+    def _heads(self, now: float) -> Dict[Priority, float]:
+        """Creation time of the oldest live task of each non-empty level"""
+        self._release_retries(now)
+        heads = {}
+        for priority in Priority:
+            entry = self._peek_entry(priority)
+            if entry is not None:
+                heads[priority] = entry[0]
+        return heads
     
     def mark_processed(self, email_id: int) -> bool:
         """Mark email as successfully processed"""
-        self.processed_emails.add(email_id)
-        return True
+        with self._lock:
+            self.remove(email_id)
+            self.in_progress.pop(email_id, None)
+            self._claimed_at.pop(email_id, None)
+            self._retrying.pop(email_id, None)
+            self.processed_emails.add(email_id)
+            return True
     
     def mark_failed(self, email_id: int, retry: bool = True) -> bool:
         """Mark email as failed, optionally retry"""
-        if retry:
-            # Find the task and increment retry count
-            for task in self.queue:
-                if task.email_id == email_id:
-                    task.retry_count += 1
-                    if task.retry_count < task.max_retries:
-                        # Re-add to queue with higher priority
-                        task.priority = Priority.URGENT
-                        heapq.heappush(self.queue, task)
-                        return True
-                    break
-        
-        self.failed_emails.add(email_id)
-        return True
+        with self._lock:
+            # A task handed out and re-listed meanwhile may also be queued again
+            queued = self.remove(email_id)
+            task = self.in_progress.pop(email_id, None) or queued or self._retrying.pop(email_id, None)
+            self._claimed_at.pop(email_id, None)
+            if retry and task is not None:
+                task.retry_count += 1
+                if task.retry_count < task.max_retries:
+                    # Back off in the retry lane, then rejoin at the original priority
+                    eligible_at = self._clock() + self.policy.retry_delay(task.retry_count)
+                    self._retrying[email_id] = task
+                    heapq.heappush(self._retry_lane, (eligible_at, next(self._counter), email_id))
+                    return True
+            
+            self.failed_emails.add(email_id)
+            return True
     
     def get_queue_status(self) -> Dict[str, Any]:
-        """Get current queue status"""
-        urgent_count = sum(1 for task in self.queue if task.priority == Priority.URGENT)
-        high_count = sum(1 for task in self.queue if task.priority == Priority.HIGH)
-        normal_count = sum(1 for task in self.queue if task.priority == Priority.NORMAL)
-        low_count = sum(1 for task in self.queue if task.priority == Priority.LOW)
-        
+        """Get current queue status (constant time)"""
         return {
-            "total_pending": len(self.queue),
-            "urgent": urgent_count,
-            "high": high_count,
-            "normal": normal_count,
-            "low": low_count,
+            "total_pending": len(self._entries),
+            "urgent": self._counts[Priority.URGENT],
+            "high": self._counts[Priority.HIGH],
+            "normal": self._counts[Priority.NORMAL],
+            "low": self._counts[Priority.LOW],
+            "in_progress": len(self.in_progress),
+            "retrying": len(self._retrying),
             "processed": len(self.processed_emails),
             "failed": len(self.failed_emails)
         }
@@ -117,40 +244,70 @@ class EmailPriorityQueue:
         self.processed_emails.clear()
         self.failed_emails.clear()
     
+    def _push(self, task: EmailTask):
+        """Push a new heap entry for a task into its priority bucket and index it"""
+        entry = [self._timestamp(task.created_at), next(self._counter), task.priority, task]
+        self._entries[task.email_id] = entry
+        self._counts[task.priority] += 1
+        heapq.heappush(self.buckets[task.priority], entry)
+    
+    def _release_retries(self, now: float):
+        """Move retries whose backoff has passed back into their priority bucket"""
+        while self._retry_lane and self._retry_lane[0][0] <= now:
+            _, _, email_id = heapq.heappop(self._retry_lane)
+            task = self._retrying.pop(email_id, None)
+            if task is not None and email_id not in self._entries:
+                self._push(task)
+    
+    def _peek_entry(self, priority: Priority) -> Optional[list]:
+        """Oldest live entry of a bucket, discarding tombstones at the top"""
+        bucket = self.buckets[priority]
+        while bucket and bucket[0][-1] is None:
+            heapq.heappop(bucket)
+            self._tombstones[priority] -= 1
+        return bucket[0] if bucket else None
+    
+    def _maybe_compact(self, priority: Priority):
+        """Drop a bucket's tombstones by rebuilding it once they outnumber its live entries"""
+        if self._tombstones[priority] > max(COMPACT_MIN_TOMBSTONES, self._counts[priority]):
+            bucket = [entry for entry in self.buckets[priority] if entry[-1] is not None]
+            heapq.heapify(bucket)
+            self.buckets[priority] = bucket
+            self._tombstones[priority] = 0
+    
+    @staticmethod
+    def _timestamp(created_at: datetime) -> float:
+        """Sort key for creation time (mixes naive and timezone-aware datetimes safely)"""
+        return created_at.timestamp()
+    
     def _parse_priority(self, priority: str) -> Priority:
         """Parse priority string to enum"""
-        priority_lower = priority.lower()
-        
-        if priority_lower in ["urgent", "critical", "emergency"]:
-            return Priority.URGENT
-        elif priority_lower in ["high", "important"]:
-            return Priority.HIGH
-        elif priority_lower in ["normal", "medium", "standard"]:
-            return Priority.NORMAL
-        else:
-            return Priority.LOW
-    
-    def get_urgent_emails(self) -> List[EmailTask]:
-        """Get all urgent emails in the queue"""
-        urgent_emails = []
-        temp_queue = []
-        
-        # Extract urgent emails
-        while self.queue:
-            task = heapq.heappop(self.queue)
-            if task.priority == Priority.URGENT:
-                urgent_emails.append(task)
-            else:
-                temp_queue.append(task)
-        
-        # Restore non-urgent emails
-        for task in temp_queue:
-            heapq.heappush(self.queue, task)
-        
-        return urgent_emails
+        return parse_priority(priority)
+    
+    def get_urgent_emails(self, limit: Optional[int] = None) -> List[EmailTask]:
+        """Get urgent emails in the queue, oldest first, without touching the other buckets"""
+        with self._lock:
+            live = [entry for entry in self.buckets[Priority.URGENT] if entry[-1] is not None]
+            entries = heapq.nsmallest(limit, live) if limit is not None else sorted(live)
+            return [entry[-1] for entry in entries]
+
+# Queue backend: "memory" (per process) or "sqlite" (durable, shared by all workers)
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "memory").lower()
+QUEUE_DB_PATH = os.getenv("QUEUE_DB_PATH", "./emailace_queue.db")
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "300"))
+
+def create_email_queue():
+    """Create the configured queue backend, falling back to memory if SQLite is unusable"""
+    if QUEUE_BACKEND == "sqlite":
+        try:
+            from durable_queue import SQLiteEmailQueue
+            return SQLiteEmailQueue(QUEUE_DB_PATH, lease_seconds=QUEUE_LEASE_SECONDS)
+        except Exception as e:
+            print(f"Durable queue error, using in-memory queue: {e}")
+    return EmailPriorityQueue(lease_seconds=QUEUE_LEASE_SECONDS)
 
 # Global priority queue instance
-email_queue = EmailPriorityQueue()
+email_queue = create_email_queue()
 
 
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Queue scheduling simulation for EmailAce AI
+Replays Poisson email arrivals against the priority queue and reports wait times per priority
+"""
+
+import argparse
+import random
+from datetime import datetime
+from typing import Dict, List
+
+from priority_queue import EmailPriorityQueue, Priority
+from queue_policy import SchedulingPolicy, create_policy
+
+def _parse_mix(mix: str) -> Dict[Priority, float]:
+    """Parse "urgent=0.5,high=0.2,..." into arrival shares"""
+    shares = {}
+    for part in mix.split(","):
+        name, share = part.split("=")
+        shares[Priority[name.strip().upper()]] = float(share)
+    total = sum(shares.values())
+    return {priority: share / total for priority, share in shares.items()}
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def simulate(policy: SchedulingPolicy, rate: float, service_rate: float, duration: float,
+             mix: Dict[Priority, float], failure_rate: float, seed: int) -> Dict[Priority, Dict[str, float]]:
+    """Run one single-server simulation and collect wait times (arrival to first pickup)"""
+    rng = random.Random(seed)
+    random.seed(seed)  # retry jitter
+    clock = {"now": 0.0}
+    queue = EmailPriorityQueue(lease_seconds=float("inf"), policy=policy, clock=lambda: clock["now"])
+
+    priorities, weights = list(mix), list(mix.values())
+    arrivals: Dict[int, float] = {}
+    levels: Dict[int, Priority] = {}
+    waits: Dict[Priority, List[float]] = {priority: [] for priority in Priority}
+
+    next_arrival = rng.expovariate(rate)
+    server_free_at = 0.0
+    email_id = 0
+    while True:
+        if next_arrival <= server_free_at:
+            if next_arrival > duration:
+                break
+            clock["now"] = next_arrival
+            priority = rng.choices(priorities, weights)[0]
+            queue.add_email(email_id, priority.name.lower(), datetime.fromtimestamp(next_arrival))
+            arrivals[email_id], levels[email_id] = next_arrival, priority
+            email_id += 1
+            next_arrival += rng.expovariate(rate)
+            continue
+
+        clock["now"] = server_free_at
+        task = queue.get_next_email()
+        if task is None:
+            server_free_at = next_arrival
+            continue
+
+        if task.retry_count == 0:
+            waits[levels[task.email_id]].append(server_free_at - arrivals[task.email_id])
+        server_free_at += rng.expovariate(service_rate)
+        if rng.random() < failure_rate:
+            queue.mark_failed(task.email_id)
+        else:
+            queue.mark_processed(task.email_id)
+
+    report = {}
+    for priority in Priority:
+        if priority not in mix:
+            continue
+        served = waits[priority]
+        sla = policy.sla_seconds.get(priority, float("inf"))
+        arrived = sum(1 for level in levels.values() if level == priority)
+        report[priority] = {
+            "arrived": arrived,
+            "served": len(served),
+            "p50": _percentile(served, 50),
+            "p99": _percentile(served, 99),
+            "sla_miss": sum(wait > sla for wait in served) / len(served) if served else float("nan")
+        }
+    return report
+
+def main():
+    """Compare strict priority with the configured fair policy"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rate", type=float, default=1.0, help="email arrivals per second")
+    parser.add_argument("--service-rate", type=float, default=1.05, help="emails processed per second")
+    parser.add_argument("--duration", type=float, default=6 * 3600, help="simulated seconds")
+    parser.add_argument("--mix", default="urgent=0.5,high=0.2,normal=0.2,low=0.1",
+                        help="arrival share per priority")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="share of attempts that fail")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    mix = _parse_mix(args.mix)
+    print(f"📊 {args.rate:g} emails/s arriving, {args.service_rate:g} emails/s served, "
+          f"{args.duration / 3600:g} h simulated")
+
+    fair = create_policy()
+    fair.strict = False
+    strict = create_policy()
+    strict.strict = True
+
+    for name, policy in [("strict", strict), ("fair", fair)]:
+        print(f"\n{name} policy")
+        print(f"   {'priority':<8} {'arrived':>8} {'served':>8} {'p50 wait':>10} {'p99 wait':>10} {'SLA miss':>9}")
+        report = simulate(policy, args.rate, args.service_rate, args.duration, mix, args.failure_rate, args.seed)
+        for priority, row in report.items():
+            print(f"   {priority.name.lower():<8} {row['arrived']:>8} {row['served']:>8} "
+                  f"{row['p50']:>9.1f}s {row['p99']:>9.1f}s {row['sla_miss']:>8.1%}")
+
+if __name__ == "__main__":
+    main()
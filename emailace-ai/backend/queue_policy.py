@@ -0,0 +1,115 @@
+"""
+Queue Scheduling Policy for EmailAce AI
+Decides which priority level is served next: SLA deadlines, weighted fair sharing and aging
+"""
+
+import os
+import random
+from typing import Dict, List, Optional, Set
+
+from priority_queue import Priority
+
+def _per_priority(value: str, cast=float) -> Dict[Priority, float]:
+    """Parse "urgent,high,normal,low" comma-separated settings"""
+    parts = [cast(part) for part in value.split(",")]
+    return dict(zip(Priority, parts))
+
+# Share of throughput each level gets when several are waiting
+QUEUE_WEIGHTS = _per_priority(os.getenv("QUEUE_WEIGHTS", "64,16,4,1"))
+# Seconds after creation by which an email of each level should be picked up
+QUEUE_SLA_SECONDS = _per_priority(os.getenv("QUEUE_SLA_SECONDS", "300,3600,14400,86400"))
+# Every this many seconds of waiting promotes a level's weight by one level (never into urgent)
+QUEUE_AGING_SECONDS = float(os.getenv("QUEUE_AGING_SECONDS", "600"))
+# Retry backoff: base * 2^(attempt - 1), capped
+QUEUE_RETRY_BASE = float(os.getenv("QUEUE_RETRY_BASE", "5"))
+QUEUE_RETRY_MAX = float(os.getenv("QUEUE_RETRY_MAX", "300"))
+# "fair" (this policy) or "strict" (always the highest non-empty level)
+QUEUE_POLICY = os.getenv("QUEUE_POLICY", "fair").lower()
+
+class SchedulingPolicy:
+    """Picks the priority level to serve from the oldest waiting task of each level"""
+
+    def __init__(self, weights: Optional[Dict[Priority, float]] = None,
+                 sla_seconds: Optional[Dict[Priority, float]] = None,
+                 aging_seconds: float = 600.0, retry_base: float = 5.0, retry_max: float = 300.0,
+                 strict: bool = False):
+        self.weights = weights or {priority: 1.0 for priority in Priority}
+        self.sla_seconds = sla_seconds or {}
+        self.aging_seconds = aging_seconds
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.strict = strict
+        # Weighted fair queueing: each level's virtual finish time, advanced by 1/weight per task served
+        self._pass: Dict[Priority, float] = {priority: 0.0 for priority in Priority}
+        self._virtual_time = 0.0
+        # Levels that had waiting tasks when last asked
+        self._backlogged: Set[Priority] = set()
+
+    def deadline(self, priority: Priority, created_ts: float) -> float:
+        """When a task of this level breaches its SLA"""
+        return created_ts + self.sla_seconds.get(priority, float("inf"))
+
+    def choose(self, heads: Dict[Priority, float], now: float) -> Optional[Priority]:
+        """Level to serve next, given each non-empty level's oldest creation timestamp"""
+        if not heads:
+            return None
+        if self.strict:
+            return min(heads, key=lambda priority: priority.value)
+
+        # Levels that were idle rejoin at the current virtual time instead of bursting; levels that kept
+        # waiting keep their place, so they are served once the busier ones have used up their share
+        for priority in heads:
+            if priority not in self._backlogged:
+                self._pass[priority] = max(self._pass[priority], self._virtual_time)
+        self._backlogged = set(heads)
+
+        # The level whose next task would finish first in virtual time; lower levels always make
+        # progress, and aging or a missed SLA weights a level like the next one up
+        return min(heads, key=lambda priority: (
+            self._pass[priority] + self._stride(priority, heads[priority], now),
+            priority.value
+        ))
+
+    def served(self, priority: Priority, created_ts: float, now: float):
+        """Charge a level for one task"""
+        start = self._pass[priority]
+        self._virtual_time = max(self._virtual_time, start)
+        self._pass[priority] = start + self._stride(priority, created_ts, now)
+
+    def _stride(self, priority: Priority, created_ts: float, now: float) -> float:
+        """Virtual cost of serving the level's oldest task, lowered as it ages or misses its SLA"""
+        promotions = int((now - created_ts) // self.aging_seconds) if self.aging_seconds > 0 else 0
+        if now >= self.deadline(priority, created_ts):
+            promotions += 1
+        # Waiting only ever lifts a level to just below urgent, so urgent keeps its share
+        level = max(priority.value - max(promotions, 0), min(priority.value, Priority.HIGH.value))
+        return 1.0 / self.weights[Priority(level)]
+
+    def plan(self, heads: Dict[Priority, float], counts: Dict[Priority, int], count: int, now: float) -> List[Priority]:
+        """Levels for the next count tasks, when only each level's oldest task and size are known"""
+        heads, counts = dict(heads), dict(counts)
+        order = []
+        while len(order) < count and heads:
+            priority = self.choose(heads, now)
+            order.append(priority)
+            self.served(priority, heads[priority], now)
+            counts[priority] -= 1
+            if counts[priority] <= 0:
+                del heads[priority]
+        return order
+
+    def retry_delay(self, attempt: int) -> float:
+        """Backoff before a failed task is eligible again (with jitter)"""
+        delay = min(self.retry_max, self.retry_base * 2 ** max(attempt - 1, 0))
+        return delay * random.uniform(0.5, 1.0)
+
+def create_policy() -> SchedulingPolicy:
+    """Scheduling policy from the QUEUE_* environment settings"""
+    return SchedulingPolicy(
+        weights=QUEUE_WEIGHTS,
+        sla_seconds=QUEUE_SLA_SECONDS,
+        aging_seconds=QUEUE_AGING_SECONDS,
+        retry_base=QUEUE_RETRY_BASE,
+        retry_max=QUEUE_RETRY_MAX,
+        strict=QUEUE_POLICY == "strict"
+    )
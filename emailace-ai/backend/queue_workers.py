@@ -0,0 +1,235 @@
+"""
+Queue Workers for EmailAce AI
+Background workers that drain the email priority queue through the inference scheduler
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database import SessionLocal, Email
+from model_registry import model_registry
+from priority_queue import EmailTask
+
+class WorkerStats:
+    """Throughput counters for one worker"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.monotonic()
+        self.batches = 0
+        self.claimed = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "worker": self.name,
+            "batches": self.batches,
+            "claimed": self.claimed,
+            "processed": self.processed,
+            "failed": self.failed,
+            "emails_per_second": round(self.processed / uptime, 3),
+            "utilization": round(self.busy_seconds / uptime, 3)
+        }
+
+class QueueWorkerPool:
+    """N async workers that claim tasks in priority order, analyse them in batches and save the results"""
+
+    def __init__(self, scheduler, queue, workers: int = 2, batch_size: int = 8,
+                 poll_interval: float = 1.0, drain_timeout: float = 30.0):
+        self.scheduler = scheduler
+        self.queue = queue
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.stats: List[WorkerStats] = []
+        self._tasks: List[asyncio.Task] = []
+        self._stopping: Optional[asyncio.Event] = None
+        # Queue claims and database writes block, so they run on the pool's own threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        if self.workers <= 0 or self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="queue-worker")
+        self.stats = [WorkerStats(f"worker-{i}") for i in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._run(stats)) for stats in self.stats]
+        print(f"👷 Started {self.workers} queue workers")
+
+    async def stop(self):
+        """Let workers finish their current batch, then stop them"""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        done, pending = await asyncio.wait(self._tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-worker and total throughput"""
+        workers = [stats.to_dict() for stats in self.stats]
+        return {
+            "running": self.running,
+            "workers": workers,
+            "processed": sum(w["processed"] for w in workers),
+            "failed": sum(w["failed"] for w in workers),
+            "emails_per_second": round(sum(w["emails_per_second"] for w in workers), 3)
+        }
+
+    async def _blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _idle(self):
+        """Sleep for the poll interval, waking early on shutdown"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, stats: WorkerStats):
+        while not self._stopping.is_set():
+            # Don't lease tasks while models are still loading; waiting also starts
+            # loading them when warm-up is disabled
+            if not model_registry.is_ready():
+                await self._blocking(model_registry.wait_until_ready, self.poll_interval)
+                continue
+
+            try:
+                tasks = await self._blocking(self.queue.claim_batch, self.batch_size)
+            except Exception as e:
+                print(f"Queue claim error: {e}")
+                await self._idle()
+                continue
+
+            if not tasks:
+                await self._idle()
+                continue
+
+            start = time.monotonic()
+            stats.batches += 1
+            stats.claimed += len(tasks)
+            try:
+                await self._process(tasks, stats)
+            except Exception as e:
+                # Loading or acknowledging failed; hand the batch back so the worker keeps going
+                print(f"Queue worker error: {e}")
+                await self._release(tasks)
+                stats.failed += len(tasks)
+            finally:
+                stats.busy_seconds += time.monotonic() - start
+
+    async def _process(self, tasks: List[EmailTask], stats: WorkerStats):
+        """Analyse a batch of claimed tasks and write all results in one commit"""
+        emails = await self._blocking(self._load_emails, [task.email_id for task in tasks])
+
+        runnable, done, missing = [], [], []
+        for task in tasks:
+            email = emails.get(task.email_id)
+            if email is None:
+                missing.append(task.email_id)
+            elif email["status"] != "pending" or email["analyzed"]:
+                # Resolved, archived or already analysed since it was queued
+                done.append(task.email_id)
+            else:
+                runnable.append(task)
+
+        if done or missing:
+            await self._blocking(self._acknowledge, done, missing)
+            stats.failed += len(missing)
+
+        if not runnable:
+            return
+
+        try:
+            results = await self.scheduler.submit_many([
+                {"body": emails[task.email_id]["body"], "subject": emails[task.email_id]["subject"]}
+                for task in runnable
+            ])
+            await self._blocking(self._save_results, [
+                self._update(task.email_id, result) for task, result in zip(runnable, results)
+            ])
+        except Exception as e:
+            print(f"Queue worker error: {e}")
+            # The queue's retry lane applies the backoff
+            await self._release(runnable)
+            stats.failed += len(runnable)
+            return
+
+        await self._blocking(self._acknowledge, [task.email_id for task in runnable], [])
+        stats.processed += len(runnable)
+
+    async def _release(self, tasks: List[EmailTask]):
+        """Return claimed tasks to the queue's retry lane after an unexpected error"""
+        try:
+            await self._blocking(self._acknowledge, [], [task.email_id for task in tasks], True)
+        except Exception as e:
+            # Leases expire on their own if the queue is unreachable
+            print(f"Queue release error: {e}")
+
+    def _acknowledge(self, processed: List[int], failed: List[int], retry: bool = False):
+        """Report finished tasks to the queue"""
+        for email_id in processed:
+            self.queue.mark_processed(email_id)
+        for email_id in failed:
+            self.queue.mark_failed(email_id, retry=retry)
+
+    @staticmethod
+    def _load_emails(email_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Email.id, Email.subject, Email.body, Email.status, Email.analyzed_at
+            ).filter(Email.id.in_(email_ids)).all()
+            return {
+                row.id: {
+                    "subject": row.subject or "",
+                    "body": row.body or "",
+                    "status": row.status,
+                    "analyzed": row.analyzed_at is not None
+                }
+                for row in rows
+            }
+        finally:
+            db.close()
+
+    @staticmethod
+    def _update(email_id: int, ai_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Email column values for one analysis result"""
+        return {
+            "id": email_id,
+            "sentiment": ai_results["sentiment"],
+            "priority": ai_results["priority"],
+            "is_urgent": ai_results["is_urgent"],
+            "summary": ai_results["summary"],
+            "entities": json.dumps(ai_results["entities"]),
+            "draft_reply": ai_results["draft_reply"],
+            "analyzed_at": datetime.utcnow()
+        }
+
+    @staticmethod
+    def _save_results(updates: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            db.bulk_update_mappings(Email, updates)
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,111 @@
+"""
+Result Cache for EmailAce AI
+Bounded LRU cache of AI analysis results with an optional SQLite tier
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+class AnalysisCache:
+    """LRU cache of analysis results keyed by a content hash"""
+
+    def __init__(self, max_size: int = 1024, db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at TEXT NOT NULL)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Analysis cache database error: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(subject: str, body: str, versions: List[str]) -> str:
+        """Hash email content together with the model versions that analysed it"""
+        digest = hashlib.sha256()
+        for part in [subject, body, *versions]:
+            data = part.encode("utf-8", errors="ignore")
+            # Length prefix keeps ("ab", "c") and ("a", "bc") distinct
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached result, checking memory first and then SQLite"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    value = row[0]
+                    self._remember(key, value)
+
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # Results are stored serialized so callers always get a private copy
+        return json.loads(value)
+
+    def set(self, key: str, result: Dict[str, Any]):
+        """Store a result in memory and, if enabled, in SQLite"""
+        value = json.dumps(result)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO analysis_cache (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, value, datetime.utcnow().isoformat())
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Analysis cache write error: {e}")
+
+    def _remember(self, key: str, value: str):
+        """Insert into the memory tier, evicting the least recently used entry"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Clear both cache tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._memory),
+            "max_size": self.max_size,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -1,26 +1,71 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
+import asyncio
 import json
 from datetime import datetime
 import os
 
-from database import get_db, Email
+from database import get_db, Email, SyncState
 from models import EmailResponse, EmailDetail, ReplyRequest, ReplyResponse, AnalyticsResponse, HealthResponse
 from ai_processor import AIProcessor
-from email_service import get_email_service
+from async_email import get_async_email_service
+from mail_pool import mail_pools
+from mail_watcher import create_mail_watchers, unsynced_headers
 from priority_queue import email_queue
+from model_registry import model_registry
+from inference_scheduler import InferenceScheduler
+from kb_reloader import kb_reloader
+from queue_workers import QueueWorkerPool
 
 router = APIRouter()
 ai_processor = AIProcessor()
 
+# AI work from all requests is micro-batched on a dedicated inference thread
+inference_scheduler = InferenceScheduler(
+    ai_processor,
+    max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH", "32")),
+    max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+)
+
+# Background workers draining the priority queue (0 disables them)
+queue_workers = QueueWorkerPool(
+    inference_scheduler,
+    email_queue,
+    workers=int(os.getenv("QUEUE_WORKERS", "2")),
+    batch_size=int(os.getenv("QUEUE_WORKER_BATCH", "8")),
+    poll_interval=float(os.getenv("QUEUE_POLL_INTERVAL", "1"))
+)
+
+# IMAP IDLE listeners that store and queue new mail as it arrives (EMAIL_WATCH)
+mail_watchers = create_mail_watchers(ai_processor, email_queue)
+
+# How long model-dependent routes wait for models that are still loading
+MODEL_WAIT_TIMEOUT = float(os.getenv("MODEL_WAIT_TIMEOUT", "30"))
+
+async def wait_for_models():
+    """Wait for AI models to finish loading, or report that they are still loading"""
+    if model_registry.is_ready():
+        return
+    
+    ready = await asyncio.to_thread(model_registry.wait_until_ready, MODEL_WAIT_TIMEOUT)
+    if not ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI models are still loading, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+
 @router.get("/", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     return HealthResponse(
         status="Backend running 🚀",
         timestamp=datetime.utcnow(),
-        database_connected=True
+        database_connected=True,
+        models_ready=model_registry.is_ready(),
+        model_status=model_registry.status()
     )
 
 @router.get("/emails", response_model=List[EmailResponse])
@@ -33,9 +78,9 @@ async def get_emails(db: Session = Depends(get_db)):
         Email.date.desc()
     ).all()
     
-    # Add emails to priority queue if not already processed
+    # Queue pending emails that haven't been analysed yet
     for email in emails:
-        if email.status == "pending":
+        if email.status == "pending" and email.analyzed_at is None:
             email_queue.add_email(
                 email_id=email.id,
                 priority=email.priority,
@@ -70,7 +115,8 @@ async def generate_reply(
         )
     
     # Process email with AI
-    ai_results = ai_processor.process_email(email.body, email.subject)
+    await wait_for_models()
+    ai_results = await inference_scheduler.submit(email.body, email.subject)
     
     # Update email with new AI analysis
     email.sentiment = ai_results["sentiment"]
@@ -166,49 +212,73 @@ async def search_emails(query: str, db: Session = Depends(get_db)):
 @router.post("/emails/sync")
 async def sync_emails(db: Session = Depends(get_db)):
     """Sync emails from external email provider"""
+    await wait_for_models()
+    
     try:
-        # Get email service (default to Gmail)
-        email_service = get_email_service("gmail")
+        # Get email service (default to Gmail); mail I/O doesn't block other requests
+        email_service = get_async_email_service("gmail")
         
-        # Fetch emails from external provider
-        external_emails = email_service.fetch_emails(since_days=7, limit=20)
+        account = f"gmail:{email_service.config.username}"
+        sync_state = db.query(SyncState).filter(
+            SyncState.account == account,
+            SyncState.folder == "INBOX"
+        ).first()
+        if sync_state is None:
+            sync_state = SyncState(account=account, folder="INBOX", last_uid=0)
+            db.add(sync_state)
+        
+        # Fetch mail that arrived since the last sync; known Message-IDs are dropped (in a worker thread) before any body is downloaded
+        try:
+            result = await email_service.sync_folder(
+                "INBOX",
+                uid_validity=sync_state.uid_validity,
+                last_uid=sync_state.last_uid or 0,
+                since_days=7,
+                limit=20,
+                screen=lambda headers: asyncio.to_thread(unsynced_headers, headers)
+            )
+        finally:
+            # Back to the pool before AI processing, and also on errors or cancellation
+            await email_service.disconnect()
+        new_emails = result["emails"] if result else []
+        
+        # Process all new emails with AI in one batched pass
+        batch_results = await inference_scheduler.submit_many(new_emails)
+        analyzed_at = datetime.utcnow()
         
         synced_count = 0
-        for email_data in external_emails:
-            # Check if email already exists
-            existing_email = db.query(Email).filter(
-                Email.sender == email_data['sender'],
-                Email.subject == email_data['subject'],
-                Email.date == email_data['date']
-            ).first()
+        for email_data, ai_results in zip(new_emails, batch_results):
+            # Create new email record
+            new_email = Email(
+                sender=email_data['sender'],
+                subject=email_data['subject'],
+                body=email_data['body'],
+                date=datetime.fromisoformat(email_data['date'].replace('Z', '+00:00')),
+                sentiment=ai_results["sentiment"],
+                priority=ai_results["priority"],
+                status="pending",
+                is_urgent=ai_results["is_urgent"],
+                summary=ai_results["summary"],
+                entities=json.dumps(ai_results["entities"]),
+                draft_reply=ai_results["draft_reply"],
+                message_id=email_data['message_id'] or None,
+                # Already analysed, so GET /emails doesn't queue it for the workers again
+                analyzed_at=analyzed_at
+            )
             
-            if not existing_email:
-                # Process with AI
-                ai_results = ai_processor.process_email(
-                    email_data['body'], 
-                    email_data['subject']
-                )
-                
-                # Create new email record
-                new_email = Email(
-                    sender=email_data['sender'],
-                    subject=email_data['subject'],
-                    body=email_data['body'],
-                    date=datetime.fromisoformat(email_data['date'].replace('Z', '+00:00')),
-                    sentiment=ai_results["sentiment"],
-                    priority=ai_results["priority"],
-                    status="pending",
-                    is_urgent=ai_results["is_urgent"],
-                    summary=ai_results["summary"],
-                    entities=json.dumps(ai_results["entities"]),
-                    draft_reply=ai_results["draft_reply"]
-                )
-                
-                db.add(new_email)
-                synced_count += 1
+            # The unique Message-ID index settles races with a concurrent sync
+            try:
+                with db.begin_nested():
+                    db.add(new_email)
+            except IntegrityError:
+                continue
+            synced_count += 1
         
+        # Advance the high-water mark together with the emails it covers
+        if result:
+            sync_state.uid_validity = result["uid_validity"]
+            sync_state.last_uid = result["last_uid"]
         db.commit()
-        email_service.disconnect()
         
         return {
             "message": f"Successfully synced {synced_count} new emails",
@@ -237,17 +307,18 @@ async def send_email_reply(
             )
         
         # Get email service
-        email_service = get_email_service("gmail")
-        
-        # Send email
-        success = email_service.send_email(
-            to_email=email.sender,
-            subject=f"Re: {email.subject}",
-            body=reply_content,
-            reply_to=os.getenv("REPLY_EMAIL", email.sender)
-        )
+        email_service = get_async_email_service("gmail")
         
-        email_service.disconnect()
+        # Send email; the connection goes back to the pool even if sending fails
+        try:
+            success = await email_service.send_email(
+                to_email=email.sender,
+                subject=f"Re: {email.subject}",
+                body=reply_content,
+                reply_to=os.getenv("REPLY_EMAIL", email.sender)
+            )
+        finally:
+            await email_service.disconnect()
         
         if success:
             # Mark as resolved
@@ -285,16 +356,45 @@ async def get_next_email():
         }
     return {"message": "No emails in queue"}
 
+@router.get("/queue/workers")
+async def get_worker_status():
+    """Throughput of the background queue workers"""
+    return queue_workers.get_stats()
+
+@router.get("/email/pool")
+async def get_mail_pool_status():
+    """Connection reuse and handshake times of the IMAP/SMTP pools"""
+    return mail_pools.get_stats()
+
+@router.get("/email/watchers")
+async def get_mail_watcher_status():
+    """Connection state and ingest counts of the IMAP IDLE watchers"""
+    return mail_watchers.get_stats()
+
+@router.get("/queue/urgent")
+async def get_urgent_queue(limit: int = 20):
+    """List the oldest urgent emails in the queue without dequeuing them"""
+    return [
+        {
+            "email_id": task.email_id,
+            "created_at": task.created_at.isoformat(),
+            "retry_count": task.retry_count
+        }
+        for task in email_queue.get_urgent_emails(limit)
+    ]
+
 @router.post("/queue/process/{email_id}")
 async def process_email_from_queue(email_id: int, db: Session = Depends(get_db)):
     """Process an email from the queue"""
+    await wait_for_models()
+    
     try:
         email = db.query(Email).filter(Email.id == email_id).first()
         if not email:
             return {"error": "Email not found"}
         
         # Generate AI response
-        ai_results = ai_processor.process_email(email.body, email.subject)
+        ai_results = await inference_scheduler.submit(email.body, email.subject)
         
         # Update email with AI analysis
         email.sentiment = ai_results["sentiment"]
@@ -321,4 +421,15 @@ async def process_email_from_queue(email_id: int, db: Session = Depends(get_db))
             detail=f"Email processing failed: {str(e)}"
         )
 
-
+@router.post("/knowledge-base/reload")
+async def reload_knowledge_base():
+    """Reload the knowledge base file and swap it in without a restart"""
+    try:
+        return await asyncio.to_thread(kb_reloader.reload)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Knowledge base reload failed: {str(e)}"
+        )
@@ -3,8 +3,8 @@ from database import Email, SessionLocal
 from ai_processor import AIProcessor
 import json
 
-def seed_database():
-    """Seed the database with sample emails"""
+def seed_database(ai_processor: AIProcessor = None):
+    """Seed the database with analysed sample emails"""
     db = SessionLocal()
     
     # Check if emails already exist
@@ -14,8 +14,9 @@ def seed_database():
         db.close()
         return
     
-    # Initialize AI processor
-    ai_processor = AIProcessor()
+    # Models load through the registry on first use (or come from the warm-up)
+    if ai_processor is None:
+        ai_processor = AIProcessor()
     
     # Sample emails data
     sample_emails = [
@@ -81,11 +82,12 @@ def seed_database():
         }
     ]
     
-    # Process and insert emails
-    for email_data in sample_emails:
-        # Process with AI
-        ai_results = ai_processor.process_email(email_data["body"], email_data["subject"])
-        
+    # Process all emails with AI in one batched pass
+    batch_results = ai_processor.process_emails(sample_emails)
+    analyzed_at = datetime.utcnow()
+    
+    # Insert emails
+    for email_data, ai_results in zip(sample_emails, batch_results):
         # Create email object
         email = Email(
             sender=email_data["sender"],
@@ -98,7 +100,8 @@ def seed_database():
             is_urgent=ai_results["is_urgent"],
             summary=ai_results["summary"],
             entities=json.dumps(ai_results["entities"]),
-            draft_reply=ai_results["draft_reply"]
+            draft_reply=ai_results["draft_reply"],
+            analyzed_at=analyzed_at
         )
         
         db.add(email)
@@ -0,0 +1,33 @@
+"""
+Test configuration for EmailAce AI
+Puts the backend modules on the import path and provides shared fixtures
+"""
+
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def tls_contexts(tmp_path_factory):
+    """(server, client) SSL contexts for a throwaway self-signed 127.0.0.1 certificate"""
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is needed to create a test certificate")
+
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True
+    )
+
+    server = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server.load_cert_chain(cert, key)
+    client = ssl.create_default_context(cafile=cert)
+    return server, client
@@ -0,0 +1,291 @@
+"""
+Mail Server Stand-ins for EmailAce AI tests
+In-process IMAP and SMTP servers that speak just enough of each protocol for the async clients
+"""
+
+import asyncio
+import re
+import ssl
+from typing import Dict, List, Optional, Set, Tuple
+
+TEXT_PLAIN = b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" %d 1 NIL NIL NIL NIL)'
+
+def make_message(uid: int, body: str = "", subject: str = "") -> bytes:
+    """A small RFC 5322 message with a unique Message-ID"""
+    return (
+        f"From: Customer {uid} <customer{uid}@example.com>\r\n"
+        f"Subject: {subject or f'Help request {uid}'}\r\n"
+        f"Date: Mon, 01 Jan 2024 10:00:00 +0000\r\n"
+        f"Message-ID: <msg{uid}@example.com>\r\n"
+        f"\r\n"
+        f"{body or f'Body of message {uid}'}"
+    ).encode()
+
+def _uids(message_set: str, known: List[int]) -> List[int]:
+    uids = []
+    for part in message_set.split(","):
+        start, _, end = part.partition(":")
+        last = max(known, default=0) if end == "*" else int(end or start)
+        uids.extend(range(int(start), last + 1))
+    return [uid for uid in uids if uid in known]
+
+class IMAPStandIn:
+    """IMAP4rev1 server for one mailbox: LOGIN, SELECT, UID SEARCH/FETCH, IDLE, NOOP, LOGOUT
+
+    Message sequence numbers equal UIDs. With fetch_batch > 1, UID FETCH commands are only answered
+    once that many have arrived, so a client that waits for each reply before sending the next stalls.
+    Commands named in silent are read but never answered.
+    """
+
+    def __init__(self, messages: Dict[int, bytes], uid_validity: int = 1, fetch_batch: int = 1,
+                 silent: Optional[Set[str]] = None):
+        self.messages = dict(messages)
+        self.uid_validity = uid_validity
+        self.fetch_batch = fetch_batch
+        self.silent = silent or set()
+        self.commands: List[str] = []
+        self.connections = 0
+        self.idles = 0
+        self._new_mail = asyncio.Event()
+
+    async def start(self) -> Tuple[asyncio.AbstractServer, int]:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    def deliver(self, raw: bytes) -> int:
+        """Add a message and wake idling clients"""
+        uid = max(self.messages, default=0) + 1
+        self.messages[uid] = raw
+        self._new_mail.set()
+        return uid
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        writer.write(b"* OK IMAP4rev1 stand-in ready\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tag, name, args = self._split(line)
+                if name in self.silent:
+                    continue
+                if name == "UID" and args.upper().startswith("FETCH") and self.fetch_batch > 1:
+                    batch = [(tag, args)]
+                    while len(batch) < self.fetch_batch:
+                        more = await reader.readline()
+                        if not more:
+                            raise ConnectionError("client went away mid-pipeline")
+                        more_tag, _, more_args = self._split(more)
+                        batch.append((more_tag, more_args))
+                    for batch_tag, batch_args in batch:
+                        self._uid(writer, batch_tag, batch_args)
+                elif name == "IDLE":
+                    await self._idle(reader, writer, tag)
+                elif name == "LOGOUT":
+                    writer.write(f"* BYE\r\n{tag} OK LOGOUT completed\r\n".encode())
+                    await writer.drain()
+                    break
+                else:
+                    self._respond(writer, tag, name, args)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _split(self, line: bytes) -> Tuple[str, str, str]:
+        text = line.decode().rstrip("\r\n")
+        self.commands.append(text)
+        tag, _, rest = text.partition(" ")
+        name, _, args = rest.partition(" ")
+        return tag, name.upper(), args
+
+    def _respond(self, writer: asyncio.StreamWriter, tag: str, name: str, args: str):
+        if name == "CAPABILITY":
+            writer.write(f"* CAPABILITY IMAP4rev1 IDLE\r\n{tag} OK CAPABILITY completed\r\n".encode())
+        elif name == "LOGIN":
+            writer.write(f"{tag} OK LOGIN completed\r\n".encode())
+        elif name == "SELECT":
+            uid_next = max(self.messages, default=0) + 1
+            writer.write((
+                f"* {len(self.messages)} EXISTS\r\n"
+                f"* OK [UIDVALIDITY {self.uid_validity}] UIDs valid\r\n"
+                f"* OK [UIDNEXT {uid_next}] Predicted next UID\r\n"
+                f"{tag} OK [READ-WRITE] SELECT completed\r\n"
+            ).encode())
+        elif name == "NOOP":
+            writer.write(f"{tag} OK NOOP completed\r\n".encode())
+        elif name == "UID":
+            self._uid(writer, tag, args)
+        else:
+            writer.write(f"{tag} BAD unknown command\r\n".encode())
+
+    def _uid(self, writer: asyncio.StreamWriter, tag: str, args: str):
+        command, _, args = args.partition(" ")
+        known = sorted(self.messages)
+        if command.upper() == "SEARCH":
+            match = re.match(r"UID (\d+):\*", args)
+            uids = known
+            if match:
+                # "n:*" always matches the newest message, even below n
+                uids = [uid for uid in known if uid >= int(match.group(1))] or known[-1:]
+            writer.write(f"* SEARCH {' '.join(map(str, uids))}\r\n{tag} OK SEARCH completed\r\n".encode())
+            return
+
+        message_set, _, items = args.partition(" ")
+        for uid in _uids(message_set, known):
+            writer.write(self._fetch(uid, items))
+        writer.write(f"{tag} OK FETCH completed\r\n".encode())
+
+    def _fetch(self, uid: int, items: str) -> bytes:
+        raw = self.messages[uid]
+        header, _, body = raw.partition(b"\r\n\r\n")
+        if "HEADER.FIELDS" in items:
+            header += b"\r\n\r\n"
+            fields = re.search(r"BODY\.PEEK(\[HEADER\.FIELDS \([^)]*\)\])", items).group(1).encode()
+            return (
+                b"* %d FETCH (UID %d BODYSTRUCTURE " % (uid, uid) + TEXT_PLAIN % len(body)
+                + b" BODY" + fields + b" {%d}\r\n" % len(header) + header + b")\r\n"
+            )
+        if "RFC822" in items:
+            return b"* %d FETCH (UID %d RFC822 {%d}\r\n" % (uid, uid, len(raw)) + raw + b")\r\n"
+        match = re.search(r"BODY\.PEEK\[([\d.]+)\]<0\.(\d+)>", items)
+        part = body[:int(match.group(2))]
+        return (
+            b"* %d FETCH (UID %d BODY[%s]<0> {%d}\r\n" % (uid, uid, match.group(1).encode(), len(part))
+            + part + b" FLAGS (\\Seen))\r\n"
+        )
+
+    async def _idle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, tag: str):
+        self.idles += 1
+        self._new_mail.clear()
+        writer.write(b"+ idling\r\n")
+        await writer.drain()
+
+        done = asyncio.ensure_future(reader.readline())
+        new_mail = asyncio.ensure_future(self._new_mail.wait())
+        await asyncio.wait([done, new_mail], return_when=asyncio.FIRST_COMPLETED)
+        if new_mail.done():
+            writer.write(b"* %d EXISTS\r\n" % len(self.messages))
+            await writer.drain()
+        else:
+            new_mail.cancel()
+        line = await done
+        self.commands.append(line.decode().rstrip("\r\n"))
+        writer.write(f"{tag} OK IDLE terminated\r\n".encode())
+
+class SMTPStandIn:
+    """ESMTP server that records each accepted message
+
+    With pipelining, the envelope (MAIL, RCPT..., DATA) is only answered once DATA has arrived, so a
+    client that waits for each reply stalls. With a tls_context the server offers STARTTLS and only
+    advertises AUTH once the channel is encrypted.
+    """
+
+    def __init__(self, pipelining: bool = True, tls_context: Optional[ssl.SSLContext] = None,
+                 refused: Optional[Set[str]] = None):
+        self.pipelining = pipelining
+        self.tls_context = tls_context
+        self.refused = refused or set()
+        # (encrypted, command line)
+        self.commands: List[Tuple[bool, str]] = []
+        self.messages: List[bytes] = []
+        self._recipients = 0
+
+    async def start(self) -> Tuple[asyncio.AbstractServer, int]:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        encrypted = False
+        writer.write(b"220 stand-in ESMTP ready\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().rstrip("\r\n")
+                self.commands.append((encrypted, command))
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    extensions = ["stand-in"]
+                    if self.pipelining:
+                        extensions.append("PIPELINING")
+                    if self.tls_context and not encrypted:
+                        extensions.append("STARTTLS")
+                    else:
+                        extensions.append("AUTH PLAIN")
+                    writer.write("".join(
+                        f"250{' ' if i == len(extensions) - 1 else '-'}{extension}\r\n"
+                        for i, extension in enumerate(extensions)
+                    ).encode())
+                elif verb == "STARTTLS" and self.tls_context:
+                    writer.write(b"220 ready to start TLS\r\n")
+                    await writer.start_tls(self.tls_context)
+                    encrypted = True
+                    continue
+                elif verb == "AUTH":
+                    writer.write(b"235 authenticated\r\n")
+                elif verb == "MAIL":
+                    envelope = [command]
+                    if self.pipelining:
+                        while not envelope[-1].upper().startswith(("DATA", "RSET", "QUIT")):
+                            more = await reader.readline()
+                            if not more:
+                                raise ConnectionError("client went away mid-envelope")
+                            envelope.append(more.decode().rstrip("\r\n"))
+                            self.commands.append((encrypted, envelope[-1]))
+                    await self._envelope(reader, writer, envelope)
+                elif verb in ("RCPT", "DATA"):
+                    # Unpipelined envelope: answered line by line
+                    await self._envelope(reader, writer, [command])
+                elif verb in ("RSET", "NOOP"):
+                    await self._envelope(reader, writer, [command])
+                elif verb == "QUIT":
+                    writer.write(b"221 bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"502 not implemented\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _envelope(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, commands: List[str]):
+        for command in commands:
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "MAIL":
+                self._recipients = 0
+                writer.write(b"250 sender OK\r\n")
+            elif verb == "RCPT":
+                address = re.search(r"<([^>]*)>", command).group(1)
+                if address in self.refused:
+                    writer.write(b"550 no such user\r\n")
+                else:
+                    self._recipients += 1
+                    writer.write(b"250 recipient OK\r\n")
+            elif verb == "DATA":
+                if not self._recipients:
+                    writer.write(b"554 no valid recipients\r\n")
+                    continue
+                writer.write(b"354 end data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                data = b""
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError("client went away mid-message")
+                    if line == b".\r\n":
+                        break
+                    data += line
+                self.messages.append(data)
+                writer.write(b"250 queued\r\n")
+            else:
+                # RSET abandons the transaction, NOOP does nothing
+                if verb == "RSET":
+                    self._recipients = 0
+                writer.write(b"250 OK\r\n")
@@ -0,0 +1,287 @@
+import asyncio
+
+import pytest
+
+import async_email
+from async_email import AsyncEmailService, AsyncIMAPClient, AsyncSMTPClient, MailProtocolError, open_imap, open_smtp
+from email_service import EmailConfig
+from mail_standin import IMAPStandIn, SMTPStandIn, make_message
+
+def config(imap_port: int = 1, smtp_port: int = 1, use_ssl: bool = False) -> EmailConfig:
+    return EmailConfig("test", "127.0.0.1", imap_port, "127.0.0.1", smtp_port, "support@example.com", "secret", use_ssl=use_ssl)
+
+def test_sync_folder_pipelines_chunked_fetches_with_literals(monkeypatch):
+    # Bodies that look like IMAP syntax must survive as literal data
+    bodies = {
+        1: "Invoice total: {42}\r\nPlease refund (urgent) today",
+        2: "Line one\r\n* 7 FETCH (UID 7)\r\nA0001 OK fake",
+        3: "Plain question?",
+        4: "Closing paren ) and quote \" inside",
+        5: "Last one"
+    }
+    # Three chunks of at most two UIDs: the stand-in only answers once all three FETCHes arrived
+    monkeypatch.setattr(async_email, "EMAIL_FETCH_CHUNK_SIZE", 2)
+    server = IMAPStandIn({uid: make_message(uid, body) for uid, body in bodies.items()}, uid_validity=7, fetch_batch=3)
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            service = AsyncEmailService(config(imap_port=port), timeout=2)
+            try:
+                return await service.sync_folder("INBOX", limit=10)
+            finally:
+                await service.disconnect()
+
+    result = asyncio.run(main())
+
+    assert result["uid_validity"] == 7
+    assert result["last_uid"] == 5
+    assert {int(email["id"]): email["body"] for email in result["emails"]} == bodies
+    assert result["emails"][1]["message_id"] == "<msg2@example.com>"
+    fetches = [command for command in server.commands if " UID FETCH " in command]
+    assert len(fetches) == 6
+
+def test_sync_folder_resumes_after_last_uid():
+    server = IMAPStandIn({uid: make_message(uid) for uid in range(1, 6)}, uid_validity=3)
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            service = AsyncEmailService(config(imap_port=port), timeout=2)
+            try:
+                newer = await service.sync_folder("INBOX", uid_validity=3, last_uid=3)
+                nothing_new = await service.sync_folder("INBOX", uid_validity=3, last_uid=5)
+                renumbered = await service.sync_folder("INBOX", uid_validity=2, last_uid=5)
+                return newer, nothing_new, renumbered
+            finally:
+                await service.disconnect()
+
+    newer, nothing_new, renumbered = asyncio.run(main())
+
+    assert [email["id"] for email in newer["emails"]] == ["4", "5"]
+    assert nothing_new["emails"] == [] and nothing_new["last_uid"] == 5
+    # A new UIDVALIDITY starts over from the beginning
+    assert len(renumbered["emails"]) == 5
+
+def test_screen_runs_before_bodies_are_downloaded():
+    server = IMAPStandIn({uid: make_message(uid) for uid in range(1, 4)})
+
+    async def screen(headers):
+        return [header for header in headers if header["message_id"] != "<msg2@example.com>"]
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            service = AsyncEmailService(config(imap_port=port), timeout=2)
+            try:
+                return await service.sync_folder("INBOX", screen=screen)
+            finally:
+                await service.disconnect()
+
+    result = asyncio.run(main())
+
+    assert [email["id"] for email in result["emails"]] == ["1", "3"]
+    body_fetch = next(command for command in server.commands if "BODY.PEEK[1]" in command)
+    assert " UID FETCH 1,3 " in body_fetch
+
+def test_idle_returns_when_new_mail_arrives():
+    server = IMAPStandIn({1: make_message(1)})
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            client = await open_imap(config(imap_port=port), timeout=2)
+            try:
+                asyncio.get_running_loop().call_later(0.1, server.deliver, make_message(2))
+                updates = await client.idle(10)
+                # DONE was answered, so the connection takes commands again
+                await client.noop()
+                return updates
+            finally:
+                await client.logout()
+
+    updates = asyncio.run(main())
+
+    assert (b"EXISTS", [b"2"]) in updates
+    assert "DONE" in server.commands
+    assert server.idles == 1
+
+def test_idle_times_out_with_done():
+    server = IMAPStandIn({1: make_message(1)})
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            client = await open_imap(config(imap_port=port), timeout=2)
+            try:
+                updates = await client.idle(0.2)
+                connected = client.connected
+                await client.noop()
+                return updates, connected
+            finally:
+                await client.logout()
+
+    updates, connected = asyncio.run(main())
+
+    assert updates == []
+    assert connected
+    assert [command.split(" ")[-1] for command in server.commands[-4:]] == ["IDLE", "DONE", "NOOP", "LOGOUT"]
+
+@pytest.mark.parametrize("command", ["NOOP", "IDLE"])
+def test_cancelled_imap_exchange_closes_the_connection(command):
+    server = IMAPStandIn({1: make_message(1)}, silent={command})
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            client = await open_imap(config(imap_port=port), timeout=5)
+            exchange = asyncio.create_task(client.noop() if command == "NOOP" else client.idle(5))
+            await asyncio.sleep(0.1)
+            exchange.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await exchange
+            return client.connected
+
+    # The reply may still arrive later, so the stream can't be reused
+    assert asyncio.run(main()) is False
+
+def test_cancelled_smtp_reply_closes_the_connection():
+    async def silent_after_greeting(reader, writer):
+        writer.write(b"220 ready\r\n")
+        await reader.read()
+
+    async def main():
+        server = await asyncio.start_server(silent_after_greeting, "127.0.0.1", 0)
+        async with server:
+            client = AsyncSMTPClient("127.0.0.1", server.sockets[0].getsockname()[1], use_ssl=False, timeout=5)
+            connect = asyncio.create_task(client.connect())
+            await asyncio.sleep(0.1)
+            connect.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await connect
+            return client.connected
+
+    assert asyncio.run(main()) is False
+
+def test_imap_timeout_closes_the_connection():
+    server = IMAPStandIn({1: make_message(1)}, silent={"NOOP"})
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            client = await open_imap(config(imap_port=port), timeout=0.2)
+            with pytest.raises(asyncio.TimeoutError):
+                await client.noop()
+            return client.connected
+
+    assert asyncio.run(main()) is False
+
+def test_smtp_pipelines_the_envelope():
+    # The stand-in answers MAIL only after DATA arrived, so an unpipelined client would time out
+    server = SMTPStandIn(pipelining=True)
+
+    async def main():
+        smtp, port = await server.start()
+        async with smtp:
+            service = AsyncEmailService(config(smtp_port=port), timeout=2)
+            try:
+                return await service.send_email("customer@example.com", "Re: Help", ".starts with a dot\nsecond line")
+            finally:
+                await service.disconnect()
+
+    assert asyncio.run(main()) is True
+    assert len(server.messages) == 1
+    message = server.messages[0]
+    assert b"\r\n..starts with a dot\r\nsecond line\r\n" in message
+    assert b"To: customer@example.com" in message
+
+def test_smtp_without_pipelining_sends_one_command_at_a_time():
+    server = SMTPStandIn(pipelining=False)
+
+    async def main():
+        smtp, port = await server.start()
+        async with smtp:
+            client = await open_smtp(config(smtp_port=port), timeout=2)
+            try:
+                await client.sendmail("support@example.com", ["a@example.com", "b@example.com"], "Subject: hi\n\nbody")
+            finally:
+                await client.quit()
+
+    asyncio.run(main())
+
+    assert len(server.messages) == 1
+    assert [command.split(":")[0] for _, command in server.commands[2:6]] == ["MAIL FROM", "RCPT TO", "RCPT TO", "DATA"]
+
+def test_smtp_refused_recipient_resets_the_session():
+    server = SMTPStandIn(pipelining=True, refused={"nobody@example.com"})
+
+    async def main():
+        smtp, port = await server.start()
+        async with smtp:
+            client = await open_smtp(config(smtp_port=port), timeout=2)
+            try:
+                with pytest.raises(MailProtocolError):
+                    await client.sendmail("support@example.com", ["nobody@example.com"], "Subject: hi\n\nbody")
+                # The session is still usable after RSET
+                await client.sendmail("support@example.com", ["customer@example.com"], "Subject: hi\n\nbody")
+            finally:
+                await client.quit()
+
+    asyncio.run(main())
+
+    assert len(server.messages) == 1
+    assert (False, "RSET") in server.commands
+
+def test_smtp_starttls_upgrades_before_authenticating(monkeypatch, tls_contexts):
+    server_context, client_context = tls_contexts
+    monkeypatch.setattr(async_email.ssl, "create_default_context", lambda *args, **kwargs: client_context)
+    server = SMTPStandIn(pipelining=True, tls_context=server_context)
+
+    async def main():
+        smtp, port = await server.start()
+        async with smtp:
+            client = await open_smtp(config(smtp_port=port, use_ssl=True), timeout=2)
+            try:
+                extensions = dict(client.extensions)
+                await client.sendmail("support@example.com", ["customer@example.com"], "Subject: hi\n\nbody")
+                return extensions
+            finally:
+                await client.quit()
+
+    extensions = asyncio.run(main())
+
+    verbs = [(encrypted, command.split(" ")[0]) for encrypted, command in server.commands]
+    assert verbs[:3] == [(False, "EHLO"), (False, "STARTTLS"), (True, "EHLO")]
+    assert (True, "AUTH") in verbs and (False, "AUTH") not in verbs
+    # Extensions come from the EHLO sent over TLS
+    assert "auth" in extensions and "starttls" not in extensions
+    assert len(server.messages) == 1
+
+def test_smtp_refuses_to_continue_without_starttls():
+    server = SMTPStandIn(pipelining=True)
+
+    async def main():
+        smtp, port = await server.start()
+        async with smtp:
+            client = AsyncSMTPClient("127.0.0.1", port, use_ssl=True, timeout=2)
+            with pytest.raises(MailProtocolError):
+                await client.connect()
+            return client.connected
+
+    assert asyncio.run(main()) is False
+    assert not any(command.startswith("AUTH") for _, command in server.commands)
+
+def test_imap_client_rejects_a_bad_greeting():
+    async def bad_greeting(reader, writer):
+        writer.write(b"* BYE go away\r\n")
+        await writer.drain()
+
+    async def main():
+        server = await asyncio.start_server(bad_greeting, "127.0.0.1", 0)
+        async with server:
+            client = AsyncIMAPClient("127.0.0.1", server.sockets[0].getsockname()[1], use_ssl=False, timeout=2)
+            with pytest.raises(MailProtocolError):
+                await client.connect()
+            return client.connected
+
+    assert asyncio.run(main()) is False
@@ -0,0 +1,121 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from durable_queue import SQLiteEmailQueue
+from priority_queue import Priority
+from queue_policy import SchedulingPolicy
+
+START = datetime(2024, 1, 1, 9, 0)
+
+@pytest.fixture
+def queue(tmp_path):
+    # Strict order and no retry backoff keep claims deterministic
+    email_queue = SQLiteEmailQueue(str(tmp_path / "queue.db"), lease_seconds=60,
+                                   policy=SchedulingPolicy(strict=True, retry_base=0, retry_max=0))
+    yield email_queue
+    email_queue._db.close()
+
+def add(queue, email_id: int, priority: str, minutes: int = 0):
+    queue.add_email(email_id, priority, START + timedelta(minutes=minutes))
+
+def test_claim_batch_takes_priority_then_age_order(queue):
+    add(queue, 1, "low")
+    add(queue, 2, "normal", minutes=5)
+    add(queue, 3, "urgent", minutes=10)
+    add(queue, 4, "normal", minutes=1)
+
+    tasks = queue.claim_batch(3)
+
+    assert [task.email_id for task in tasks] == [3, 4, 2]
+    assert tasks[0].priority == Priority.URGENT
+    assert tasks[0].created_at == START + timedelta(minutes=10)
+    status = queue.get_queue_status()
+    assert status["in_progress"] == 3 and status["total_pending"] == 1
+
+def test_leased_tasks_are_not_claimed_twice(queue):
+    for email_id in range(1, 6):
+        add(queue, email_id, "normal", minutes=email_id)
+
+    first = queue.claim_batch(3)
+    second = queue.claim_batch(3)
+
+    assert [task.email_id for task in first] == [1, 2, 3]
+    assert [task.email_id for task in second] == [4, 5]
+    assert queue.claim_batch(3) == []
+
+def test_expired_lease_is_requeued_as_a_retry(queue):
+    add(queue, 1, "high")
+    assert [task.email_id for task in queue.claim_batch(1, lease_seconds=0.05)] == [1]
+    assert queue.claim_batch(1) == []
+
+    time.sleep(0.1)
+    retried = queue.claim_batch(1)
+
+    assert [task.email_id for task in retried] == [1]
+    assert retried[0].retry_count == 1
+    assert retried[0].priority == Priority.HIGH
+
+def test_lease_expiring_too_often_fails_the_task(queue):
+    add(queue, 1, "normal")
+    for _ in range(3):
+        queue.claim_batch(1, lease_seconds=0.01)
+        time.sleep(0.03)
+
+    assert queue.claim_batch(1) == []
+    assert queue.get_queue_status()["failed"] == 1
+
+def test_acknowledged_tasks_leave_the_queue(queue):
+    add(queue, 1, "normal")
+    add(queue, 2, "normal", minutes=1)
+    queue.claim_batch(2)
+
+    queue.mark_processed(1)
+    queue.mark_failed(2, retry=False)
+
+    status = queue.get_queue_status()
+    assert status["processed"] == 1 and status["failed"] == 1 and status["in_progress"] == 0
+    # Re-adding a finished email doesn't queue it again
+    assert not queue.add_email(1, "urgent")
+
+def test_failed_task_with_retry_is_claimable_again(queue):
+    add(queue, 1, "normal")
+    queue.claim_batch(1)
+
+    queue.mark_failed(1, retry=True)
+
+    retried = queue.claim_batch(1)
+    assert [task.email_id for task in retried] == [1]
+    assert retried[0].retry_count == 1
+
+def test_retry_backoff_delays_the_next_claim(tmp_path):
+    backoff = SQLiteEmailQueue(str(tmp_path / "backoff.db"), policy=SchedulingPolicy(retry_base=60, retry_max=60))
+    backoff.add_email(1, "normal", START)
+    backoff.claim_batch(1)
+
+    backoff.mark_failed(1, retry=True)
+
+    assert backoff.claim_batch(1) == []
+    assert backoff.get_queue_status()["retrying"] == 1
+    backoff._db.close()
+
+def test_readding_a_queued_email_only_raises_its_priority(queue):
+    add(queue, 1, "normal")
+
+    assert queue.add_email(1, "urgent", START)
+    assert not queue.add_email(1, "low", START)
+    assert queue.claim_batch(1)[0].priority == Priority.URGENT
+
+def test_claims_survive_reopening_the_database(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first = SQLiteEmailQueue(path, policy=SchedulingPolicy(strict=True))
+    first.add_email(1, "urgent", START)
+    first.add_email(2, "low", START)
+    first.claim_batch(1)
+    first._db.close()
+
+    reopened = SQLiteEmailQueue(path, policy=SchedulingPolicy(strict=True))
+    assert [task.email_id for task in reopened.claim_batch(5)] == [2]
+    assert reopened.get_queue_status()["in_progress"] == 2
+    reopened._db.close()
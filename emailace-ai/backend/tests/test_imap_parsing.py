@@ -0,0 +1,59 @@
+import base64
+
+from imap_parsing import Literal, chunked, decode_part, find_text_part, message_set, parse_fetch_response
+
+def test_message_set_compresses_runs():
+    assert message_set([5, 1, 2, 3, 8, 10, 11, 12, 3]) == "1:3,5,8,10:12"
+    assert message_set([b"7", "9", 8]) == "7:9"
+    assert message_set([]) == ""
+
+def test_chunked():
+    assert list(chunked([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+    assert list(chunked([], 3)) == []
+
+def test_parse_fetch_response_with_literals():
+    header = b"Subject: (not a list)\r\nMessage-ID: <a@b>\r\n\r\n"
+    response = [
+        (b'1 (UID 41 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 12 1 NIL NIL NIL NIL) '
+         b'BODY[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)] {%d}' % len(header), header),
+        b')',
+        (b'2 (UID 42 BODY[1]<0> {9}', b'{3}\r\n)"x"'),
+        b' FLAGS (\\Seen))'
+    ]
+
+    messages = parse_fetch_response(response)
+
+    assert messages[1]["UID"] == 41
+    assert messages[1]["BODY[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)]"] == header
+    assert isinstance(messages[1]["BODY[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)]"], Literal)
+    assert messages[1]["BODYSTRUCTURE"][:2] == ["TEXT", "PLAIN"]
+    # Partial fetches drop the <origin> suffix
+    assert messages[2]["BODY[1]"] == b'{3}\r\n)"x"'
+    assert messages[2]["FLAGS"] == ["\\Seen"]
+
+def test_parse_fetch_response_quoted_strings_and_nil():
+    messages = parse_fetch_response([b'3 (UID 7 ENVELOPE ("a \\"quoted\\" word" NIL))'])
+    assert messages[3]["ENVELOPE"] == ['a "quoted" word', None]
+
+def test_find_text_part_single_part():
+    structure = ["TEXT", "PLAIN", ["CHARSET", "ISO-8859-1"], None, None, "QUOTED-PRINTABLE", 120, 4]
+    assert find_text_part(structure) == ("1", "quoted-printable", "ISO-8859-1")
+
+def test_find_text_part_nested_multipart_skips_html_and_attachments():
+    html = ["TEXT", "HTML", ["CHARSET", "utf-8"], None, None, "7BIT", 300, 10]
+    attachment = ["TEXT", "PLAIN", ["NAME", "notes.txt"], None, None, "BASE64", 40, 1, None,
+                  ["ATTACHMENT", ["FILENAME", "notes.txt"]]]
+    plain = ["TEXT", "PLAIN", ["CHARSET", "utf-8"], None, None, "BASE64", 40, 1]
+    structure = [[html, "ALTERNATIVE"], attachment, [[plain, "MIXED"], "RELATED"], "MIXED"]
+
+    assert find_text_part(structure) == ("3.1.1", "base64", "utf-8")
+    assert find_text_part([[html, "ALTERNATIVE"], "MIXED"]) is None
+    assert find_text_part(None) is None
+
+def test_decode_part():
+    encoded = base64.b64encode("Grüße aus München".encode("utf-8"))
+    assert decode_part(encoded, "base64", "utf-8") == "Grüße aus München"
+    # A partial fetch can cut base64 mid-quantum
+    assert decode_part(encoded[:-3], "base64", "utf-8").startswith("Grüße aus M")
+    assert decode_part(b"caf=E9 =\r\nau lait", "quoted-printable", "latin-1") == "café au lait"
+    assert decode_part(b"plain", "7bit", "no-such-charset") == "plain"
@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+from email_service import EmailConfig
+from mail_pool import ConnectionPool, MailPools, PooledEmailService
+from mail_standin import IMAPStandIn, SMTPStandIn, make_message
+
+class FakeConnection:
+    """Stands in for a logged-in IMAP client"""
+
+    def __init__(self, number: int):
+        self.number = number
+        self.connected = True
+        self.noops = 0
+        self.logged_out = False
+        self.fail_noop = False
+
+    async def noop(self):
+        self.noops += 1
+        if self.fail_noop:
+            raise ConnectionError("stale")
+
+    async def logout(self):
+        self.logged_out = True
+        self.connected = False
+
+    async def close(self):
+        self.connected = False
+
+def make_pool(**kwargs):
+    opened = []
+
+    async def connect():
+        connection = FakeConnection(len(opened) + 1)
+        opened.append(connection)
+        return connection
+
+    options = {"max_size": 2, "idle_timeout": 60, "check_after": 60, "acquire_timeout": 0.2}
+    options.update(kwargs)
+    return ConnectionPool("imap://test", connect, **options), opened
+
+def test_released_connection_is_reused():
+    async def main():
+        pool, opened = make_pool()
+        first = await pool.acquire()
+        await pool.release(first)
+        second = await pool.acquire()
+        return pool, opened, first, second
+
+    pool, opened, first, second = asyncio.run(main())
+
+    assert second is first
+    assert len(opened) == 1
+    assert pool.get_stats()["hit_rate"] == 0.5
+
+def test_acquire_waits_for_a_release_at_max_size():
+    async def main():
+        pool, opened = make_pool(acquire_timeout=2)
+        first = await pool.acquire()
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await pool.release(first)
+        return await waiter, first, opened
+
+    handed_over, first, opened = asyncio.run(main())
+
+    assert handed_over is first
+    assert len(opened) == 2
+
+def test_acquire_times_out_when_the_pool_stays_full():
+    async def main():
+        pool, _ = make_pool(max_size=1)
+        await pool.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.acquire()
+
+    asyncio.run(main())
+
+def test_broken_connection_is_discarded_on_release():
+    async def main():
+        pool, opened = make_pool()
+        connection = await pool.acquire()
+        connection.connected = False
+        await pool.release(connection)
+        replacement = await pool.acquire()
+        return pool, opened, replacement
+
+    pool, opened, replacement = asyncio.run(main())
+
+    assert replacement is opened[1]
+    assert pool.get_stats()["open"] == 1
+
+def test_stale_idle_connection_fails_its_health_check():
+    async def main():
+        pool, opened = make_pool(check_after=0)
+        connection = await pool.acquire()
+        await pool.release(connection)
+        connection.fail_noop = True
+        return pool, opened, await pool.acquire()
+
+    pool, opened, replacement = asyncio.run(main())
+
+    assert replacement is opened[1]
+    assert opened[0].noops == 1
+    assert pool.health_check_failures == 1
+
+def test_reap_logs_out_idle_connections():
+    async def main():
+        pool, opened = make_pool(idle_timeout=0.05)
+        old = await pool.acquire()
+        fresh = await pool.acquire()
+        await pool.release(old)
+        await asyncio.sleep(0.1)
+        await pool.release(fresh)
+        await pool.reap()
+        return pool, old, fresh
+
+    pool, old, fresh = asyncio.run(main())
+
+    assert old.logged_out and not fresh.logged_out
+    stats = pool.get_stats()
+    assert stats["reaped"] == 1 and stats["idle"] == 1 and stats["open"] == 1
+
+def test_failed_handshake_frees_its_slot():
+    attempts = []
+
+    async def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("refused")
+        return FakeConnection(len(attempts))
+
+    async def main():
+        pool = ConnectionPool("imap://test", connect, max_size=1, acquire_timeout=0.2)
+        with pytest.raises(ConnectionError):
+            await pool.acquire()
+        return pool, await pool.acquire()
+
+    pool, connection = asyncio.run(main())
+
+    assert connection.number == 2
+    assert pool.handshake_failures == 1
+
+def test_pooled_service_reuses_logins_against_stand_in_servers():
+    imap_server = IMAPStandIn({uid: make_message(uid) for uid in range(1, 4)})
+    smtp_server = SMTPStandIn()
+
+    async def main():
+        imap, imap_port = await imap_server.start()
+        smtp, smtp_port = await smtp_server.start()
+        async with imap, smtp:
+            config = EmailConfig("test", "127.0.0.1", imap_port, "127.0.0.1", smtp_port, "u", "p", use_ssl=False)
+            pools = MailPools(max_size=2)
+            try:
+                for _ in range(3):
+                    service = PooledEmailService(config, pools)
+                    assert len((await service.sync_folder("INBOX"))["emails"]) == 3
+                    assert await service.send_email("customer@example.com", "Re: Help", "On it")
+                    await service.disconnect()
+                return pools.get_stats()
+            finally:
+                await pools.close()
+
+    stats = asyncio.run(main())
+
+    assert imap_server.connections == 1
+    assert stats["handshakes"] == 2
+    assert len(smtp_server.messages) == 3
+    logins = [command for _, command in smtp_server.commands if command.startswith("AUTH")]
+    assert len(logins) == 1
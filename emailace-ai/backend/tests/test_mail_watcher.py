@@ -0,0 +1,54 @@
+import asyncio
+
+import mail_watcher
+from email_service import EmailConfig
+from mail_watcher import MailboxWatcher
+from mail_standin import IMAPStandIn, make_message
+
+def run_watcher(monkeypatch, ingest, until):
+    """Run a watcher against the IMAP stand-in with the given _ingest until until(watcher) holds"""
+    server = IMAPStandIn({1: make_message(1)})
+
+    async def main():
+        imap, port = await server.start()
+        async with imap:
+            config = EmailConfig("test", "127.0.0.1", port, "127.0.0.1", 1, "u", "p", use_ssl=False)
+            monkeypatch.setattr(mail_watcher, "get_email_config", lambda provider: config)
+            watcher = MailboxWatcher("test", "INBOX", None, None, idle_seconds=0.05, backoff_base=0.001)
+            monkeypatch.setattr(watcher, "_ingest", lambda service: ingest(watcher))
+            watcher.start()
+            try:
+                while not until(watcher):
+                    await asyncio.sleep(0.01)
+            finally:
+                await watcher.stop()
+            return watcher
+
+    return asyncio.run(asyncio.wait_for(main(), 5)), server
+
+def test_failing_catch_up_keeps_backing_off(monkeypatch):
+    attempts = []
+
+    async def failing_ingest(watcher):
+        attempts.append(watcher._attempt)
+        raise ConnectionError("sync failed")
+
+    watcher, server = run_watcher(monkeypatch, failing_ingest, until=lambda watcher: len(attempts) >= 5)
+
+    # Each login worked, yet the backoff kept growing because the sync never did
+    assert attempts[:5] == [0, 1, 2, 3, 4]
+    assert server.connections >= 5
+
+def test_completed_catch_up_resets_the_backoff(monkeypatch):
+    attempts = []
+
+    async def flaky_ingest(watcher):
+        attempts.append(watcher._attempt)
+        if len(attempts) < 3:
+            raise ConnectionError("sync failed")
+
+    watcher, server = run_watcher(monkeypatch, flaky_ingest, until=lambda watcher: len(attempts) >= 3)
+
+    assert attempts == [0, 1, 2]
+    assert watcher._attempt == 0
+    assert watcher.reconnects == 2
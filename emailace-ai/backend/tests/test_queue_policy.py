@@ -0,0 +1,53 @@
+from priority_queue import Priority
+from queue_policy import SchedulingPolicy
+
+URGENT, HIGH, NORMAL, LOW = Priority.URGENT, Priority.HIGH, Priority.NORMAL, Priority.LOW
+WEIGHTS = {URGENT: 8, HIGH: 4, NORMAL: 2, LOW: 1}
+
+def policy(**kwargs) -> SchedulingPolicy:
+    # Aging and SLAs off unless a test turns them on
+    options = {"weights": WEIGHTS, "aging_seconds": 0}
+    options.update(kwargs)
+    return SchedulingPolicy(**options)
+
+def test_plan_strict_serves_highest_level_first():
+    order = policy(strict=True).plan({HIGH: 0, LOW: 0, URGENT: 0}, {HIGH: 2, LOW: 1, URGENT: 1}, 10, now=0)
+    # Strict never serves a level while a higher one is waiting
+    assert order == [URGENT, HIGH, HIGH, LOW]
+
+def test_plan_shares_throughput_by_weight():
+    order = policy().plan({URGENT: 0, LOW: 0}, {URGENT: 100, LOW: 100}, 18, now=0)
+    assert order.count(URGENT) == 16
+    assert order.count(LOW) == 2
+
+def test_plan_stops_when_levels_run_out():
+    order = policy().plan({HIGH: 0, NORMAL: 0}, {HIGH: 1, NORMAL: 2}, 10, now=0)
+    assert sorted(order, key=lambda priority: priority.value) == [HIGH, NORMAL, NORMAL]
+
+def test_plan_returns_nothing_for_an_empty_queue():
+    assert policy().plan({}, {}, 5, now=0) == []
+
+def test_missed_sla_raises_a_levels_share():
+    heads, counts = {HIGH: 0, NORMAL: 0}, {HIGH: 100, NORMAL: 100}
+    on_time = policy(sla_seconds={NORMAL: 1000}).plan(heads, counts, 12, now=10)
+    overdue = policy(sla_seconds={NORMAL: 1000}).plan(heads, counts, 12, now=2000)
+    assert overdue.count(NORMAL) > on_time.count(NORMAL)
+
+def test_aging_never_promotes_into_urgent():
+    heads, counts = {URGENT: 10_000, LOW: 0}, {URGENT: 100, LOW: 100}
+    order = policy(aging_seconds=1).plan(heads, counts, 12, now=10_000)
+    # Fully aged low mail is weighted like high, urgent keeps its larger share
+    assert order.count(URGENT) == 8
+    assert order.count(LOW) == 4
+
+def test_idle_level_does_not_burst_when_it_rejoins():
+    fair = policy()
+    fair.plan({NORMAL: 0}, {NORMAL: 50}, 50, now=0)
+    order = fair.plan({URGENT: 0, NORMAL: 0}, {URGENT: 100, NORMAL: 100}, 10, now=0)
+    assert order.count(URGENT) >= 7
+
+def test_retry_delay_backs_off_with_cap():
+    backoff = policy(retry_base=2, retry_max=10)
+    assert 1 <= backoff.retry_delay(1) <= 2
+    assert 4 <= backoff.retry_delay(3) <= 8
+    assert 5 <= backoff.retry_delay(10) <= 10
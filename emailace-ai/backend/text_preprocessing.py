@@ -0,0 +1,134 @@
+"""
+Text Preprocessing for EmailAce AI
+Strips quoted replies and signatures and fits email text to model token budgets
+"""
+
+import re
+from typing import Any, List, Optional, Tuple
+
+# Lines that start a quoted reply chain; everything from here on is dropped
+REPLY_HEADER_PATTERNS = [
+    re.compile(r'^\s*On\b.{0,200}\bwrote:\s*$', re.IGNORECASE),
+    re.compile(r'^\s*-{2,}\s*(?:Original|Forwarded) Message\s*-{2,}\s*$', re.IGNORECASE),
+    re.compile(r'^\s*Begin forwarded message:\s*$', re.IGNORECASE),
+    re.compile(r'^\s*_{10,}\s*$'),
+]
+
+# "From:" only starts a quoted reply inside an Outlook-style header block
+FROM_HEADER = re.compile(r'^\s*From:\s.+$', re.IGNORECASE)
+REPLY_HEADER_FIELD = re.compile(r'^\s*(?:Sent|Date|To|Cc|Subject):\s', re.IGNORECASE)
+
+# Lines that start a signature block
+SIGNATURE_PATTERNS = [
+    re.compile(r'^--\s*$'),
+    re.compile(r'^\s*Sent from my \w+', re.IGNORECASE),
+    re.compile(r'^\s*Get Outlook for \w+', re.IGNORECASE),
+]
+
+# Sign-offs that start a signature when only a few short lines follow them
+CLOSING_PATTERN = re.compile(
+    r'^\s*(?:best|kind|warm)?\s*(?:regards|thanks|thank you|cheers|sincerely|best)[,!.]?\s*$',
+    re.IGNORECASE
+)
+MAX_SIGNATURE_LINES = 5
+# A sign-off only counts when it is among the last few lines of the message
+SIGNOFF_WINDOW = 6
+# If signature stripping would keep less than this share of the text, it was body, not a signature
+MIN_KEPT_FRACTION = 0.5
+
+# Rough characters-per-token ratio, used when no tokenizer is available and to
+# avoid tokenizing huge bodies that will be truncated anyway
+CHARS_PER_TOKEN = 4
+
+def strip_quoted_reply(text: str) -> str:
+    """Remove quoted reply chains (> lines, 'On ... wrote:' and forwarded headers)"""
+    kept = []
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if any(pattern.match(line) for pattern in REPLY_HEADER_PATTERNS):
+            break
+        if FROM_HEADER.match(line) and any(REPLY_HEADER_FIELD.match(field) for field in lines[i + 1:i + 4]):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+def strip_signature(text: str) -> str:
+    """Remove a trailing signature block"""
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if any(pattern.match(line) for pattern in SIGNATURE_PATTERNS):
+            return "\n".join(lines[:i])
+
+    # A sign-off near the end followed only by a handful of name-like lines (name, title, phone)
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    for i in reversed(content[-SIGNOFF_WINDOW:]):
+        if CLOSING_PATTERN.match(lines[i]):
+            trailing = [line for line in lines[i + 1:] if line.strip()]
+            if len(trailing) <= MAX_SIGNATURE_LINES and all(_name_like(line) for line in trailing):
+                return "\n".join(lines[:i])
+            break
+
+    return text
+
+def _name_like(line: str) -> bool:
+    """Short line without sentence punctuation, like a name, title or phone number"""
+    line = line.strip()
+    return len(line) <= 40 and len(line.split()) <= 5 and not line.endswith(('.', '?', '!', ':'))
+
+def clean_email_body(text: str) -> str:
+    """Strip quoted replies and signatures and collapse whitespace"""
+    unquoted = strip_quoted_reply(text)
+    cleaned = strip_signature(unquoted)
+    if len(cleaned.strip()) < MIN_KEPT_FRACTION * len(unquoted.strip()):
+        cleaned = unquoted
+    cleaned = re.sub(r'[ \t]+', ' ', cleaned)
+    cleaned = re.sub(r'\n\s*\n+', '\n\n', cleaned).strip()
+    # Never hand the models an empty string for a message that was all quote
+    return cleaned or text.strip()
+
+def token_budget(tokenizer: Optional[Any], default: int = 512, reserved: int = 2) -> int:
+    """Usable input tokens for a model, leaving room for special tokens"""
+    max_length = getattr(tokenizer, "model_max_length", None) or default
+    # Some tokenizers report a huge sentinel when no limit is configured
+    return min(max_length, default) - reserved
+
+def _token_spans(text: str, tokenizer: Optional[Any]) -> Optional[List[Tuple[int, int]]]:
+    """Character span of every token, or None if the tokenizer can't provide them"""
+    if tokenizer is None:
+        return None
+    try:
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [tuple(span) for span in encoding["offset_mapping"]]
+    except Exception:
+        return None
+
+def fit_to_token_budget(text: str, tokenizer: Optional[Any], max_tokens: int) -> str:
+    """Cut text at the last whole token that fits within max_tokens"""
+    # Only tokenize what could possibly fit
+    text = text[:max_tokens * CHARS_PER_TOKEN * 2]
+    spans = _token_spans(text, tokenizer)
+    if spans is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    if len(spans) <= max_tokens:
+        return text
+    return text[:spans[max_tokens - 1][1]]
+
+def chunk_by_tokens(text: str, tokenizer: Optional[Any], max_tokens: int, max_chunks: int) -> List[str]:
+    """Split text into at most max_chunks pieces of up to max_tokens tokens each"""
+    text = text[:max_tokens * max_chunks * CHARS_PER_TOKEN * 2]
+    spans = _token_spans(text, tokenizer)
+    if spans is None:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[start:start + size] for start in range(0, len(text), size)][:max_chunks] or [text]
+
+    chunks = []
+    for start in range(0, len(spans), max_tokens):
+        window = spans[start:start + max_tokens]
+        chunk = text[window[0][0]:window[-1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+        if len(chunks) == max_chunks:
+            break
+    return chunks or [text]
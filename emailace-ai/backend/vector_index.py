@@ -0,0 +1,238 @@
+"""
+Vector Index for EmailAce AI
+Cosine-similarity indexes behind KnowledgeBase.search: exact for small KBs, IVF for large ones
+"""
+
+import os
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_store import rows_fingerprint
+
+# (row, cosine similarity) pairs, best first
+SearchResults = List[Tuple[int, float]]
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k scores, best first, without a full sort"""
+    if top_k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+def search_rows(vectors: np.ndarray, rows: np.ndarray, queries: np.ndarray, top_k: int) -> List[SearchResults]:
+    """Exact top_k over a subset of rows (a partition), with one matrix product for all queries"""
+    if not len(rows):
+        return [[] for _ in queries]
+    scores = _normalize(queries) @ _normalize(vectors[rows]).T
+    return [[(int(rows[i]), float(row[i])) for i in _top_k(row, top_k)] for row in scores]
+
+class ExactIndex:
+    """Brute-force cosine search over the KB matrix using a cached norm per row"""
+
+    def __init__(self, get_vectors: Callable[[], Optional[np.ndarray]]):
+        self._get_vectors = get_vectors
+        self._norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._norms)
+
+    def add(self, start: int, count: int):
+        """Index rows [start, start + count) of the KB matrix"""
+        rows = self._get_vectors()[start:start + count]
+        norms = np.maximum(np.linalg.norm(rows, axis=1), 1e-12).astype(np.float32)
+        self._norms = np.concatenate([self._norms[:start], norms])
+
+    def search(self, query: np.ndarray, top_k: int) -> SearchResults:
+        """Return the top_k most similar rows"""
+        vectors = self._get_vectors()
+        if vectors is None or not len(self._norms):
+            return []
+        query = _normalize(query)
+        scores = (vectors[:len(self._norms)] @ query) / self._norms
+        return [(int(i), float(scores[i])) for i in _top_k(scores, top_k)]
+
+    def search_many(self, queries: np.ndarray, top_k: int, chunk_size: int = 64) -> List[SearchResults]:
+        """Top_k rows for many queries, scored with one matrix product per chunk of queries"""
+        vectors = self._get_vectors()
+        if vectors is None or not len(self._norms):
+            return [[] for _ in queries]
+
+        vectors = vectors[:len(self._norms)]
+        queries = _normalize(queries)
+        results = []
+        for start in range(0, len(queries), chunk_size):
+            scores = (queries[start:start + chunk_size] @ vectors.T) / self._norms
+            for row in scores:
+                results.append([(int(i), float(row[i])) for i in _top_k(row, top_k)])
+        return results
+
+    def save(self, path: str, row_hashes: List[str]):
+        """Nothing to persist; norms are rebuilt from the vectors"""
+
+    def load(self, path: str, row_hashes: List[str]) -> bool:
+        return False
+
+class IVFIndex:
+    """Inverted-file index: k-means centroids, each owning a contiguous block of normalized vectors"""
+
+    def __init__(self, get_vectors: Callable[[], Optional[np.ndarray]], nprobe: int = 8,
+                 train_sample: int = 20000, kmeans_iterations: int = 10):
+        self._get_vectors = get_vectors
+        self.nprobe = nprobe
+        self.train_sample = train_sample
+        self.kmeans_iterations = kmeans_iterations
+        self.centroids: Optional[np.ndarray] = None
+        # Per list: normalized vectors, their KB rows, and how many slots are used
+        self._list_vectors: List[np.ndarray] = []
+        self._list_rows: List[np.ndarray] = []
+        self._list_sizes: List[int] = []
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def add(self, start: int, count: int):
+        """Index rows [start, start + count), training or retraining when needed"""
+        total = start + count
+        if self.centroids is None or total > 4 * self._trained_size:
+            # Lists get unbalanced as the KB grows; retrain on the whole matrix
+            self._train(self._get_vectors()[:total])
+            self._assign(0, total)
+        else:
+            self._assign(start, count)
+
+    def _train(self, vectors: np.ndarray):
+        """Run k-means over a sample of the vectors"""
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        sample_size = min(len(vectors), self.train_sample)
+        sample = _normalize(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        self.centroids = centroids
+        self._trained_size = len(vectors)
+        self._list_vectors = [np.empty((16, vectors.shape[1]), dtype=np.float32) for _ in range(nlist)]
+        self._list_rows = [np.empty(16, dtype=np.int64) for _ in range(nlist)]
+        self._list_sizes = [0] * nlist
+        self._assignments = np.empty(0, dtype=np.int32)
+
+    def _assign(self, start: int, count: int, labels: Optional[np.ndarray] = None):
+        """Append rows to their nearest list (or to the given lists)"""
+        vectors = _normalize(self._get_vectors()[start:start + count])
+        if labels is None:
+            labels = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+        for c in np.unique(labels):
+            members = np.nonzero(labels == c)[0]
+            self._append_to_list(int(c), vectors[members], members + start)
+
+        self._assignments = np.concatenate([self._assignments[:start], labels])
+
+    def _append_to_list(self, c: int, vectors: np.ndarray, rows: np.ndarray):
+        """Append to one inverted list, doubling its capacity as needed"""
+        size = self._list_sizes[c]
+        needed = size + len(vectors)
+        if needed > len(self._list_vectors[c]):
+            capacity = max(needed, 2 * len(self._list_vectors[c]))
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            grown[:size] = self._list_vectors[c][:size]
+            grown_rows = np.empty(capacity, dtype=np.int64)
+            grown_rows[:size] = self._list_rows[c][:size]
+            self._list_vectors[c], self._list_rows[c] = grown, grown_rows
+
+        self._list_vectors[c][size:needed] = vectors
+        self._list_rows[c][size:needed] = rows
+        self._list_sizes[c] = needed
+
+    def search(self, query: np.ndarray, top_k: int) -> SearchResults:
+        """Score only the nprobe lists closest to the query"""
+        return self.search_many(np.asarray(query)[None, :], top_k)[0]
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> List[SearchResults]:
+        """Top_k rows for many queries; centroids are scored with one matrix product"""
+        if self.centroids is None:
+            return [[] for _ in queries]
+        queries = _normalize(queries)
+        centroid_scores = queries @ self.centroids.T
+
+        results = []
+        for query, scores in zip(queries, centroid_scores):
+            rows, row_scores = [], []
+            for c in _top_k(scores, self.nprobe):
+                size = self._list_sizes[c]
+                if size:
+                    row_scores.append(self._list_vectors[c][:size] @ query)
+                    rows.append(self._list_rows[c][:size])
+            if not rows:
+                results.append([])
+                continue
+            row_scores = np.concatenate(row_scores)
+            rows = np.concatenate(rows)
+            results.append([(int(rows[i]), float(row_scores[i])) for i in _top_k(row_scores, top_k)])
+        return results
+
+    def save(self, path: str, row_hashes: List[str]):
+        """Persist centroids and list assignments; vectors are rebuilt from the KB matrix"""
+        if self.centroids is None:
+            return
+        try:
+            # Fingerprint of the indexed rows, so a reordered or edited KB never reuses stale lists
+            fingerprint = rows_fingerprint(row_hashes[:len(self._assignments)])
+            with open(f"{path}.tmp", 'wb') as f:
+                np.savez(f, centroids=self.centroids, assignments=self._assignments,
+                         trained_size=np.array([self._trained_size]), fingerprint=np.array([fingerprint]))
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            print(f"Failed to save vector index: {e}")
+
+    def load(self, path: str, row_hashes: List[str]) -> bool:
+        """Restore a saved index if its rows are still the first rows of the KB, then index the rest"""
+        if not os.path.exists(path):
+            return False
+        try:
+            data = np.load(path)
+            vectors = self._get_vectors()
+            assignments = data["assignments"]
+            if vectors is None or data["centroids"].shape[1] != vectors.shape[1] or len(assignments) > len(vectors):
+                return False
+            if "fingerprint" not in data or str(data["fingerprint"][0]) != rows_fingerprint(row_hashes[:len(assignments)]):
+                print(f"Vector index {path} was built for different entries, rebuilding it")
+                return False
+
+            centroids = data["centroids"]
+            self._list_vectors = [np.empty((16, centroids.shape[1]), dtype=np.float32) for _ in centroids]
+            self._list_rows = [np.empty(16, dtype=np.int64) for _ in centroids]
+            self._list_sizes = [0] * len(centroids)
+            self._assignments = np.empty(0, dtype=np.int32)
+            self.centroids = centroids
+            self._trained_size = int(data["trained_size"][0])
+
+            self._assign(0, len(assignments), labels=assignments.astype(np.int32))
+            if len(assignments) < len(vectors):
+                self.add(len(assignments), len(vectors) - len(assignments))
+            return True
+        except Exception as e:
+            print(f"Failed to load vector index: {e}")
+            return False
+
+def create_index(kind: str, get_vectors: Callable[[], Optional[np.ndarray]], nprobe: int = 8):
+    """Build an empty index of the given kind ("exact" or "ivf")"""
+    if kind == "ivf":
+        return IVFIndex(get_vectors, nprobe=nprobe)
+    return ExactIndex(get_vectors)